@@ -0,0 +1,346 @@
+"""
+Localisation de l'échiquier et redressement de la perspective
+
+Les quatre coins de l'échiquier sont cherchés avant la détection :
+0. Image entière : captures et diagrammes cadrés sur le plateau (test quasi gratuit)
+1. Contours : plus grand quadrilatère convexe (bord du plateau)
+2. Lignes : droites horizontales/verticales de la grille (captures d'écran, diagrammes)
+3. Points-clés appris (optionnel) : modèle YOLO pose à 4 points (BOARD_KEYPOINT_MODEL)
+
+Chaque candidat est validé en vérifiant que le plateau redressé présente bien
+une grille de 8 cases. L'échiquier est ensuite redressé en une image carrée
+canonique (avec une marge pour les pièces hautes), plus petite que la photo
+d'origine : la détection traite moins de pixels, et les cases sont déduites
+par l'homographie au lieu de diviser l'image entière par 8.
+"""
+
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from metrics import metrics
+
+# Redressement activé par défaut sur /predict (sinon paramètre rectify=true)
+RECTIFY_BOARD = os.environ.get('RECTIFY_BOARD', 'false').lower() == 'true'
+# Côté de l'image redressée, utilisé aussi comme imgsz de la détection
+RECTIFIED_IMGSZ = int(os.environ.get('RECTIFIED_IMGSZ', 416))
+# Marge autour du plateau, en cases (les pièces hautes dépassent de leur case)
+RECTIFY_MARGIN_SQUARES = float(os.environ.get('RECTIFY_MARGIN_SQUARES', 0.5))
+# Modèle YOLO pose à 4 points-clés (haut-gauche, haut-droit, bas-droit, bas-gauche)
+BOARD_KEYPOINT_MODEL = os.environ.get('BOARD_KEYPOINT_MODEL')
+
+# Côté maximal de l'image de travail pour la localisation
+LOCATE_MAX_SIDE = 800
+# Surface minimale du plateau (fraction de l'image)
+MIN_BOARD_AREA = 0.15
+# Rapport pic/fond minimal du spectre à 8 cycles sur le plateau redressé
+MIN_GRID_SCORE = 3.0
+GRID_CHECK_SIZE = 128
+
+# Imagettes par case (classifieur de cases) : côté d'une case et contexte autour, en cases
+SQUARE_PX = 24
+SQUARE_CONTEXT = 0.25
+
+_keypoint_model = None
+_keypoint_lock = threading.Lock()
+
+
+class BoardLocation:
+    """Coins de l'échiquier dans l'image et homographie image -> cases"""
+
+    def __init__(self, corners, method, grid_score):
+        # Coins ordonnés : haut-gauche, haut-droit, bas-droit, bas-gauche
+        self.corners = np.float32(corners)
+        self.method = method
+        self.grid_score = grid_score
+        # Homographie vers le repère de l'échiquier : (0, 0) coin a8, (8, 8) coin h1
+        self.homography = cv2.getPerspectiveTransform(
+            self.corners, np.float32([[0, 0], [8, 0], [8, 8], [0, 8]])
+        )
+
+    def to_dict(self):
+        return {
+            'corners': [[round(float(x), 1), round(float(y), 1)] for x, y in self.corners],
+            'method': self.method,
+            'grid_score': round(self.grid_score, 2),
+            'homography': [[round(float(v), 6) for v in row] for row in self.homography]
+        }
+
+
+def order_corners(points):
+    """Ordonne 4 points : haut-gauche, haut-droit, bas-droit, bas-gauche"""
+    points = np.float32(points).reshape(4, 2)
+    sums = points.sum(axis=1)
+    diffs = points[:, 1] - points[:, 0]
+    return np.float32([
+        points[np.argmin(sums)],
+        points[np.argmin(diffs)],
+        points[np.argmax(sums)],
+        points[np.argmax(diffs)]
+    ])
+
+
+def _quad_area(corners):
+    return float(cv2.contourArea(np.float32(corners).reshape(-1, 1, 2)))
+
+
+def grid_score(gray, corners):
+    """
+    Vérifie qu'un quadrilatère délimite une grille 8x8
+
+    Le plateau est redressé en vignette; le profil des gradients doit présenter
+    un pic à 8 cycles (un bord de case tous les 1/8 de côté) sur les deux axes.
+
+    Returns:
+        float: Score du plus faible des deux axes (0 si le pic n'est pas à 8 cycles)
+    """
+    size = GRID_CHECK_SIZE
+    target = np.float32([[0, 0], [size, 0], [size, size], [0, size]])
+    warp = cv2.getPerspectiveTransform(np.float32(corners), target)
+    thumbnail = cv2.warpPerspective(gray, warp, (size, size)).astype(np.float32)
+
+    scores = []
+    for axis, (dx, dy) in ((0, (1, 0)), (1, (0, 1))):
+        profile = np.abs(cv2.Sobel(thumbnail, cv2.CV_32F, dx, dy, ksize=3)).mean(axis=axis)
+        profile = profile - profile.mean()
+        spectrum = np.abs(np.fft.rfft(profile * np.hanning(len(profile))))
+        if int(np.argmax(spectrum[4:13])) + 4 != 8:
+            return 0.0
+        scores.append(float(spectrum[8] / (np.median(spectrum[1:]) + 1e-6)))
+    return min(scores)
+
+
+def _fit_grid(profile, size):
+    """
+    Cherche la grille régulière de 9 bords (période, décalage) qui maximise
+    le profil de gradient; retourne (début, fin) de la grille en pixels
+    """
+    positions = np.arange(len(profile))
+    best, best_score = (0.0, float(size)), -1.0
+    for period in np.arange(0.7 * size / 8, (size - 1) / 8, 0.25):
+        offsets = np.arange(0, size - 1 - 8 * period, 0.5)
+        lines = offsets[:, None] + period * np.arange(9)[None, :]
+        scores = np.interp(lines, positions, profile).sum(axis=1)
+        i = int(np.argmax(scores))
+        if scores[i] > best_score:
+            best_score = scores[i]
+            best = (offsets[i], offsets[i] + 8 * period)
+    return best
+
+
+def refine_corners(gray, corners, size=256):
+    """
+    Ajuste un quadrilatère sur la grille intérieure des cases
+
+    Le contour trouvé inclut souvent le cadre du plateau (coordonnées,
+    bordure en bois) : on redresse, on cale une grille régulière 8x8 sur les
+    bords des cases, puis on reporte ses coins dans l'image.
+    """
+    target = np.float32([[0, 0], [size, 0], [size, size], [0, size]])
+    warp = cv2.getPerspectiveTransform(np.float32(corners), target)
+    thumbnail = cv2.warpPerspective(gray, warp, (size, size)).astype(np.float32)
+
+    profile_x = np.abs(cv2.Sobel(thumbnail, cv2.CV_32F, 1, 0, ksize=3)).mean(axis=0)
+    profile_y = np.abs(cv2.Sobel(thumbnail, cv2.CV_32F, 0, 1, ksize=3)).mean(axis=1)
+    x0, x1 = _fit_grid(profile_x, size)
+    y0, y1 = _fit_grid(profile_y, size)
+
+    inner = np.float32([[x0, y0], [x1, y0], [x1, y1], [x0, y1]]).reshape(-1, 1, 2)
+    return cv2.perspectiveTransform(inner, np.linalg.inv(warp)).reshape(4, 2)
+
+
+def _full_image_candidates(gray):
+    """L'image entière (diagrammes et captures d'écran cadrés sur l'échiquier)"""
+    height, width = gray.shape
+    return [np.float32([[0, 0], [width, 0], [width, height], [0, height]])]
+
+
+def _contour_candidates(gray):
+    """Quadrilatères convexes issus des contours, du plus grand au plus petit"""
+    edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    min_area = MIN_BOARD_AREA * gray.shape[0] * gray.shape[1]
+    candidates = []
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:10]:
+        if cv2.contourArea(contour) < min_area:
+            break
+        hull = cv2.convexHull(contour)
+        approx = cv2.approxPolyDP(hull, 0.02 * cv2.arcLength(hull, True), True)
+        if len(approx) == 4:
+            candidates.append(order_corners(approx))
+    return candidates
+
+
+def _line_candidates(gray):
+    """Rectangle englobant les droites horizontales et verticales de la grille"""
+    edges = cv2.Canny(gray, 50, 150)
+    height, width = gray.shape
+    min_length = 0.3 * min(height, width)
+    lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=80,
+                            minLineLength=min_length, maxLineGap=10)
+    if lines is None:
+        return []
+
+    xs, ys = [], []
+    for x1, y1, x2, y2 in lines.reshape(-1, 4).astype(np.float32):
+        if abs(y2 - y1) <= 0.05 * abs(x2 - x1):  # Horizontale
+            ys.append((y1 + y2) / 2)
+            xs.extend((x1, x2))
+        elif abs(x2 - x1) <= 0.05 * abs(y2 - y1):  # Verticale
+            xs.append((x1 + x2) / 2)
+            ys.extend((y1, y2))
+    if len(xs) < 4 or len(ys) < 4:
+        return []
+
+    x0, x1, y0, y1 = min(xs), max(xs), min(ys), max(ys)
+    if (x1 - x0) * (y1 - y0) < MIN_BOARD_AREA * height * width:
+        return []
+    return [np.float32([[x0, y0], [x1, y0], [x1, y1], [x0, y1]])]
+
+
+def _keypoint_candidates(image_bgr):
+    """Coins prédits par le modèle de points-clés (si BOARD_KEYPOINT_MODEL est défini)"""
+    global _keypoint_model
+    if not BOARD_KEYPOINT_MODEL:
+        return []
+    with _keypoint_lock:
+        if _keypoint_model is None:
+            from ultralytics import YOLO
+            print(f"📦 Chargement du modèle de coins: {BOARD_KEYPOINT_MODEL}")
+            _keypoint_model = YOLO(BOARD_KEYPOINT_MODEL)
+    result = _keypoint_model.predict(source=image_bgr, save=False, verbose=False)[0]
+    if result.keypoints is None or len(result.keypoints) == 0:
+        return []
+    best = int(result.boxes.conf.argmax()) if result.boxes is not None else 0
+    points = result.keypoints.xy[best].cpu().numpy()
+    if len(points) < 4:
+        return []
+    return [np.float32(points[:4])]
+
+
+def locate_board(image_bgr, min_grid_score=MIN_GRID_SCORE):
+    """
+    Cherche les quatre coins de l'échiquier
+
+    Args:
+        image_bgr: Image BGR (ou niveaux de gris)
+        min_grid_score: Score minimal de la grille sur le plateau redressé
+
+    Returns:
+        BoardLocation ou None si aucun plateau n'est trouvé
+    """
+    started = time.perf_counter()
+    gray = image_bgr if image_bgr.ndim == 2 else cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+    scale = min(1.0, LOCATE_MAX_SIDE / max(gray.shape))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+
+    location = None
+    for method, find in (('full', _full_image_candidates), ('contour', _contour_candidates),
+                         ('lines', _line_candidates)):
+        for corners in find(small):
+            score = grid_score(small, corners)
+            if score >= min_grid_score:
+                corners = refine_corners(small, corners)
+                location = BoardLocation(corners / scale, method, score)
+                break
+        if location:
+            break
+
+    if location is None:
+        for corners in _keypoint_candidates(image_bgr):
+            if _quad_area(corners) > 0:
+                location = BoardLocation(order_corners(corners), 'keypoints', grid_score(gray, corners))
+                break
+
+    metrics.observe('board.locate', (time.perf_counter() - started) * 1000)
+    metrics.incr(f'board.{location.method}' if location else 'board.not_found')
+    return location
+
+
+def crop_transform(size=RECTIFIED_IMGSZ, margin_squares=RECTIFY_MARGIN_SQUARES):
+    """Transformation repère échiquier (0..8) -> pixels de l'image redressée"""
+    square = size / (8 + 2 * margin_squares)
+    offset = margin_squares * square
+    return np.float64([[square, 0, offset], [0, square, offset], [0, 0, 1]])
+
+
+def rectify_board(image_bgr, location, size=RECTIFIED_IMGSZ, margin_squares=RECTIFY_MARGIN_SQUARES):
+    """
+    Redresse l'échiquier en une image carrée canonique
+
+    Returns:
+        tuple: (image redressée BGR size x size, homographie image -> image redressée)
+    """
+    warp = crop_transform(size, margin_squares) @ location.homography
+    crop = cv2.warpPerspective(image_bgr, warp, (size, size), flags=cv2.INTER_AREA,
+                               borderMode=cv2.BORDER_REPLICATE)
+    return crop, warp
+
+
+def map_detections(detections, warp):
+    """
+    Reporte des détections de l'image redressée dans l'image d'origine
+
+    Chaque boîte est remplacée par le rectangle englobant ses quatre coins
+    transformés par l'homographie inverse.
+    """
+    if not detections:
+        return detections
+    inverse = np.linalg.inv(warp)
+    corners = np.float32([
+        [[d['bbox']['x1'], d['bbox']['y1']], [d['bbox']['x2'], d['bbox']['y1']],
+         [d['bbox']['x2'], d['bbox']['y2']], [d['bbox']['x1'], d['bbox']['y2']]]
+        for d in detections
+    ]).reshape(-1, 1, 2)
+    mapped = cv2.perspectiveTransform(corners, inverse).reshape(-1, 4, 2)
+
+    result = []
+    for det, points in zip(detections, mapped):
+        x1, y1 = points.min(axis=0).tolist()
+        x2, y2 = points.max(axis=0).tolist()
+        result.append({
+            **det,
+            'bbox': {
+                'x1': round(x1, 2),
+                'y1': round(y1, 2),
+                'x2': round(x2, 2),
+                'y2': round(y2, 2),
+                'width': round(x2 - x1, 2),
+                'height': round(y2 - y1, 2)
+            }
+        })
+    return result
+
+
+def square_crops(image_bgr, location, square_px=SQUARE_PX, context=SQUARE_CONTEXT):
+    """
+    Découpe les 64 cases de l'échiquier redressé
+
+    Chaque imagette couvre sa case plus `context` case de chaque côté (la base
+    d'une pièce haute reste visible). Ordre : a8, b8, ..., h8, a7, ..., h1.
+
+    Returns:
+        np.ndarray: (64, côté, côté, 3) uint8, côté = square_px * (1 + 2 * context)
+    """
+    margin = int(round(context * square_px))
+    side = 8 * square_px + 2 * margin
+    crop = square_px + 2 * margin
+    warp = np.float64([[square_px, 0, margin], [0, square_px, margin], [0, 0, 1]]) @ location.homography
+    canvas = cv2.warpPerspective(image_bgr, warp, (side, side), flags=cv2.INTER_AREA,
+                                 borderMode=cv2.BORDER_REPLICATE)
+    windows = np.lib.stride_tricks.sliding_window_view(canvas, (crop, crop, 3))
+    return np.ascontiguousarray(windows[::square_px, ::square_px, 0].reshape(64, crop, crop, 3))
+
+
+def square_corners(location):
+    """Coins (4 points) de chacune des 64 cases dans l'image d'origine, même ordre que square_crops"""
+    grid = np.float32([[(c + dx, r + dy) for dx, dy in ((0, 0), (1, 0), (1, 1), (0, 1))]
+                       for r in range(8) for c in range(8)])
+    inverse = np.linalg.inv(location.homography)
+    return cv2.perspectiveTransform(grid.reshape(-1, 1, 2), inverse).reshape(64, 4, 2)
+
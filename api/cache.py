@@ -0,0 +1,57 @@
+"""
+Cache des résultats de prédiction indexé par empreinte du contenu
+
+La clé est celle de singleflight.request_key (SHA-256 des octets de l'image +
+modèle + conf) : une même image envoyée en upload, en base64 ou par URL
+réutilise le même résultat tant qu'il n'a pas expiré.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import metrics
+
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 512))
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get('RESULT_CACHE_TTL_SECONDS', 600))
+
+
+class ResultCache:
+    """Cache LRU borné avec expiration (TTL)"""
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl_seconds=RESULT_CACHE_TTL_SECONDS,
+                 name='result_cache'):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        metrics.gauge(f'{name}.entries', lambda: len(self._entries))
+
+    def get(self, key):
+        """Retourne la valeur en cache, ou None si absente ou expirée"""
+        if self.max_entries <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                value = entry[1]
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                value = None
+        metrics.incr(f'{self.name}.hits' if value is not None else f'{self.name}.misses')
+        return value
+
+    def put(self, key, value):
+        """Ajoute une valeur; les entrées les moins récemment utilisées sont évincées"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,101 @@
+"""
+Cascade de résolutions : passe rapide à basse résolution, pleine résolution si nécessaire
+
+Un diagramme net de 416 px n'a pas besoin d'une entrée 640 : une première
+passe à CASCADE_LOW_IMGSZ suffit le plus souvent. Le résultat est contrôlé
+par des critères simples; s'il n'est pas concluant, la détection est relancée
+à pleine résolution :
+- nombre de pièces (au moins 2, au plus 32)
+- un roi de chaque couleur
+- confiance moyenne et part des détections peu confiantes
+- aucun conflit de case (deux pièces sur une même case)
+"""
+
+import os
+
+from fen import build_fen, placement_to_symbols
+from metrics import metrics
+
+CASCADE_ENABLED = os.environ.get('CASCADE_ENABLED', 'false').lower() == 'true'
+CASCADE_LOW_IMGSZ = int(os.environ.get('CASCADE_LOW_IMGSZ', 320))
+CASCADE_FULL_IMGSZ = int(os.environ.get('CASCADE_FULL_IMGSZ', 640))
+# Confiance moyenne minimale de la passe rapide
+CASCADE_MIN_CONFIDENCE = float(os.environ.get('CASCADE_MIN_CONFIDENCE', 0.6))
+# Part maximale des détections sous LOW_CONFIDENCE
+CASCADE_MAX_UNCERTAIN = float(os.environ.get('CASCADE_MAX_UNCERTAIN', 0.2))
+
+LOW_CONFIDENCE = 0.5
+MIN_PIECES = 2
+MAX_PIECES = 32
+
+
+class CascadeResult:
+    """Détections retenues, FEN et résolution choisie"""
+
+    def __init__(self, detections, fen_result, imgsz, escalated, reasons):
+        self.detections = detections
+        self.fen_result = fen_result
+        self.imgsz = imgsz
+        self.escalated = escalated
+        self.reasons = reasons
+
+    def to_dict(self):
+        return {'imgsz': self.imgsz, 'escalated': self.escalated, 'reasons': self.reasons}
+
+
+def inconclusive_reasons(detections, fen_result):
+    """Critères non satisfaits par une passe (liste vide si le résultat est concluant)"""
+    reasons = []
+    if not MIN_PIECES <= len(detections) <= MAX_PIECES:
+        reasons.append('piece_count')
+    symbols = placement_to_symbols(fen_result.fen)
+    if symbols.count('K') != 1 or symbols.count('k') != 1:
+        reasons.append('kings')
+    if detections:
+        confidences = [d['confidence'] for d in detections]
+        if sum(confidences) / len(confidences) < CASCADE_MIN_CONFIDENCE:
+            reasons.append('confidence')
+        if sum(c < LOW_CONFIDENCE for c in confidences) > CASCADE_MAX_UNCERTAIN * len(confidences):
+            reasons.append('uncertain')
+    if fen_result.conflicts:
+        reasons.append('conflicts')
+    return reasons
+
+
+def run_cascade(detect, image_width, image_height, homography=None, low_imgsz=CASCADE_LOW_IMGSZ,
+                full_imgsz=CASCADE_FULL_IMGSZ):
+    """
+    Détection en cascade
+
+    Args:
+        detect: Fonction imgsz -> détections (coordonnées de l'image d'origine)
+        image_width: Largeur de l'image
+        image_height: Hauteur de l'image
+        homography: Homographie image -> échiquier (optionnel)
+        low_imgsz: Résolution de la passe rapide
+        full_imgsz: Résolution de la seconde passe
+
+    Returns:
+        CascadeResult
+    """
+    detections = detect(low_imgsz)
+    fen_result = build_fen(detections, image_width, image_height, homography)
+    reasons = inconclusive_reasons(detections, fen_result)
+    metrics.incr('cascade.runs')
+    if not reasons or low_imgsz >= full_imgsz:
+        return CascadeResult(detections, fen_result, low_imgsz, False, reasons)
+
+    metrics.incr('cascade.escalated')
+    for reason in reasons:
+        metrics.incr(f'cascade.reason.{reason}')
+    detections = detect(full_imgsz)
+    fen_result = build_fen(detections, image_width, image_height, homography)
+    return CascadeResult(detections, fen_result, full_imgsz, True, reasons)
+
+
+def _escalation_rate():
+    runs = metrics.counter('cascade.runs')
+    return round(metrics.counter('cascade.escalated') / runs, 4) if runs else 0.0
+
+
+metrics.gauge('cascade.escalation_rate', _escalation_rate)
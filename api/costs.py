@@ -0,0 +1,138 @@
+"""
+Coûts mesurés des modèles et routage selon un budget de latence
+
+Les coûts viennent du benchmark (python src/benchmark.py --write-costs) :
+model_costs.json, copié avec le code de l'API, donne pour chaque modèle et
+backend la latence par image (p50/p95 par imgsz), le pic de mémoire et le
+temps de chargement, ainsi que la précision de MODEL_CONFIG.yaml.
+
+Une requête avec `budget_ms` ne lance que les modèles qui tiennent dans ce
+budget :
+- modèle seul : gardé s'il tient, sinon le modèle chargé le plus précis qui
+  tient (le plus rapide si aucun ne tient)
+- ensemble : membres ajoutés du plus précis au moins précis tant que la
+  somme des latences (une passe par modèle) reste dans le budget
+Sans coût mesuré pour un modèle, la requête n'est pas routée.
+"""
+
+import json
+import os
+from pathlib import Path
+
+from metrics import metrics
+
+MODEL_COSTS_PATH = os.environ.get('MODEL_COSTS_PATH', str(Path(__file__).parent / 'model_costs.json'))
+# Backend des poids servis par l'API (format chargé par YOLO)
+SERVING_BACKEND = os.environ.get('SERVING_BACKEND', 'pytorch')
+# Percentile de latence comparé au budget
+COST_PERCENTILE = os.environ.get('COST_PERCENTILE', 'p95')
+DEFAULT_IMGSZ = 640
+# Métrique de précision qui ordonne les modèles
+ACCURACY_METRIC = 'mAP50-95'
+
+
+class RoutingPlan:
+    """Modèles retenus pour une requête et latence estimée"""
+
+    def __init__(self, model, members, estimated_ms, budget_ms, fits, reason):
+        self.model = model
+        self.members = members
+        self.estimated_ms = estimated_ms
+        self.budget_ms = budget_ms
+        self.fits = fits
+        self.reason = reason
+
+    def to_dict(self):
+        return {
+            'model': self.model,
+            'members': self.members,
+            'estimated_ms': self.estimated_ms,
+            'budget_ms': self.budget_ms,
+            'within_budget': self.fits,
+            'reason': self.reason,
+        }
+
+
+class ModelCosts:
+    """Coûts mesurés par modèle ('gear', 'haki', 'kaido') pour le backend servi"""
+
+    def __init__(self, data=None, backend=SERVING_BACKEND, percentile=COST_PERCENTILE):
+        self.models = (data or {}).get('models', {})
+        self.backend = backend
+        self.percentile = percentile
+
+    @classmethod
+    def load(cls, path=MODEL_COSTS_PATH, **kwargs):
+        if not os.path.exists(path):
+            print(f"⚠️ Coûts des modèles introuvables ({path}) - budget_ms ignoré")
+            return cls(**kwargs)
+        with open(path) as f:
+            costs = cls(json.load(f), **kwargs)
+        print(f"✅ Coûts mesurés chargés pour: {', '.join(sorted(costs.models)) or 'aucun modèle'}")
+        return costs
+
+    def measured(self, name):
+        return (self.models.get(name) or {}).get('backends', {}).get(self.backend)
+
+    def latency(self, name, imgsz=None):
+        """
+        Latence par image estimée (ms), None si le modèle n'a pas été mesuré
+
+        Mesure à l'imgsz le plus proche, mise à l'échelle de la surface d'entrée.
+        """
+        measured = (self.measured(name) or {}).get('latency_ms') or {}
+        if not measured:
+            return None
+        imgsz = imgsz or DEFAULT_IMGSZ
+        nearest = min(measured, key=lambda size: abs(int(size) - imgsz))
+        return round(measured[nearest][self.percentile] * (imgsz / int(nearest)) ** 2, 2)
+
+    def accuracy(self, name):
+        return (self.models.get(name) or {}).get('metrics', {}).get(ACCURACY_METRIC, 0.0)
+
+    def plan(self, requested_model, budget_ms, available, imgsz=None):
+        """
+        Modèles à lancer pour tenir le budget
+
+        Args:
+            requested_model: 'gear', 'haki', 'kaido' ou 'ensemble'
+            budget_ms: Budget de latence de la requête
+            available: Modèles chargés, dans l'ordre de l'ensemble
+            imgsz: Taille d'entrée de la détection (défaut DEFAULT_IMGSZ)
+
+        Returns:
+            RoutingPlan: `model` se passe tel quel à run_detection
+        """
+        ensemble = requested_model == 'ensemble'
+        requested = list(available) if ensemble else [requested_model]
+        costs = {name: self.latency(name, imgsz) for name in available}
+
+        if any(costs.get(name) is None for name in requested):
+            return RoutingPlan(requested_model, requested, None, budget_ms, None, 'no_cost_data')
+
+        if ensemble:
+            members, total = [], 0.0
+            for name in sorted(available, key=self.accuracy, reverse=True):
+                if total + costs[name] <= budget_ms:
+                    members.append(name)
+                    total += costs[name]
+            reason = 'within_budget' if len(members) == len(available) else 'ensemble_reduced'
+        elif costs[requested_model] <= budget_ms:
+            members, reason = [requested_model], 'within_budget'
+        else:
+            fitting = [name for name in available if costs[name] is not None and costs[name] <= budget_ms]
+            members = [max(fitting, key=self.accuracy)] if fitting else []
+            reason = 'model_substituted'
+
+        if not members:
+            measured = [name for name in available if costs[name] is not None]
+            members, reason = [min(measured, key=costs.get)], 'over_budget'
+        members = [name for name in available if name in members]
+        metrics.incr(f'routing.{reason}')
+
+        if ensemble and len(members) == len(available):
+            model = 'ensemble'
+        else:
+            model = '+'.join(members)
+        estimated = round(sum(costs[name] for name in members), 2)
+        return RoutingPlan(model, members, estimated, budget_ms, estimated <= budget_ms, reason)
@@ -0,0 +1,242 @@
+"""
+Construction des FEN à partir des détections (vectorisée, par lots)
+
+Toutes les détections d'un lot d'images sont placées sur leurs cases en une
+seule opération NumPy :
+- repère de l'échiquier : image entière, rectangle de l'échiquier (board_bbox)
+  ou homographie issue de la localisation du plateau
+- case d'une pièce : centre de la boîte, ou base de la pièce moins une
+  demi-case pour les pièces hautes qui débordent sur la case du dessus
+- conflits : si plusieurs pièces tombent sur la même case, la plus confiante
+  est conservée et les autres sont signalées
+"""
+
+import re
+
+import numpy as np
+
+# Mapping des noms de pièces vers notation FEN
+PIECE_SYMBOLS = {
+    'white-king': 'K', 'white-queen': 'Q', 'white-rook': 'R',
+    'white-bishop': 'B', 'white-knight': 'N', 'white-pawn': 'P',
+    'black-king': 'k', 'black-queen': 'q', 'black-rook': 'r',
+    'black-bishop': 'b', 'black-knight': 'n', 'black-pawn': 'p',
+    # Variantes possibles
+    'king': 'K', 'queen': 'Q', 'rook': 'R',
+    'bishop': 'B', 'knight': 'N', 'pawn': 'P',
+    'black king': 'k', 'black queen': 'q', 'black rook': 'r',
+    'black bishop': 'b', 'black knight': 'n', 'black pawn': 'p',
+}
+
+# Métadonnées par défaut : blancs jouent, tous les roques possibles, etc.
+FEN_SUFFIX = ' w KQkq - 0 1'
+
+_EMPTY_RUN = re.compile('1+')
+
+
+class FenResult:
+    """FEN d'une image, placement des pièces et conflits de cases"""
+
+    def __init__(self, fen, squares, conflicts):
+        self.fen = fen
+        self.squares = squares  # Case (0..63, ordre a8..h1) de chaque détection, -1 si ignorée
+        self.conflicts = conflicts
+
+    def to_dict(self):
+        return {'fen': self.fen, 'conflicts': self.conflicts}
+
+
+def square_name(square):
+    """Nom algébrique d'une case (0 -> 'a8', 63 -> 'h1')"""
+    return 'abcdefgh'[square % 8] + str(8 - square // 8)
+
+
+def board_transform(image_width, image_height, homography=None, board_bbox=None):
+    """
+    Transformation image -> repère de l'échiquier ((0, 0) coin a8, (8, 8) coin h1)
+
+    Args:
+        image_width: Largeur de l'image
+        image_height: Hauteur de l'image
+        homography: Homographie 3x3 image -> échiquier (prioritaire)
+        board_bbox: (x1, y1, x2, y2) de l'échiquier dans l'image
+
+    Returns:
+        np.ndarray: Matrice 3x3
+    """
+    if homography is not None:
+        return np.asarray(homography, dtype=np.float64)
+    x1, y1, x2, y2 = board_bbox if board_bbox is not None else (0, 0, image_width, image_height)
+    sx, sy = 8 / (x2 - x1), 8 / (y2 - y1)
+    return np.float64([[sx, 0, -x1 * sx], [0, sy, -y1 * sy], [0, 0, 1]])
+
+
+def _boxes(detections):
+    """Boîtes (N, 4) et confiances (N,) d'une liste de détections"""
+    boxes = np.float64([[d['bbox']['x1'], d['bbox']['y1'], d['bbox']['x2'], d['bbox']['y2']]
+                        for d in detections]).reshape(-1, 4)
+    confidences = np.float64([d['confidence'] for d in detections])
+    return boxes, confidences
+
+
+def assign_squares(boxes, transforms, base_rule=True):
+    """
+    Case de chaque boîte
+
+    Args:
+        boxes: (N, 4) x1, y1, x2, y2
+        transforms: (N, 3, 3) transformation image -> échiquier de chaque boîte
+                    (ou (3, 3) commune à toutes les boîtes)
+        base_rule: Pièces hautes placées par leur base (base - 1/2 case si plus bas
+                   que le centre), pour une homographie d'échiquier en perspective;
+                   sinon centre de la boîte. Booléen ou (N,) par boîte
+
+    Returns:
+        np.ndarray: (N,) indices de case 0..63 (ordre a8..h1)
+    """
+    center_x = (boxes[:, 0] + boxes[:, 2]) / 2
+    center_y = (boxes[:, 1] + boxes[:, 3]) / 2
+    # Centre et base de chaque boîte en coordonnées homogènes : (N, 2, 3)
+    points = np.stack([
+        np.stack([center_x, center_y, np.ones_like(center_x)], axis=1),
+        np.stack([center_x, boxes[:, 3], np.ones_like(center_x)], axis=1)
+    ], axis=1)
+    transforms = np.broadcast_to(transforms, (len(boxes), 3, 3))
+    mapped = np.einsum('nij,nkj->nki', transforms, points)
+    mapped = mapped[:, :, :2] / mapped[:, :, 2:3]
+
+    cols = np.clip(np.floor(mapped[:, 0, 0]), 0, 7).astype(np.int64)
+    row_y = np.where(base_rule, np.maximum(mapped[:, 0, 1], mapped[:, 1, 1] - 0.5), mapped[:, 0, 1])
+    rows = np.clip(np.floor(row_y), 0, 7).astype(np.int64)
+    return rows * 8 + cols
+
+
+def detection_squares(detections, transform):
+    """Case (0..63) de chaque détection pour une transformation image -> échiquier"""
+    if not detections:
+        return []
+    boxes, _ = _boxes(detections)
+    return assign_squares(boxes, transform).tolist()
+
+
+def symbols_to_placement(symbols):
+    """Partie placement de la FEN à partir des 64 symboles ('1' pour une case vide)"""
+    rows = (''.join(symbols[r * 8:(r + 1) * 8]) for r in range(8))
+    return '/'.join(_EMPTY_RUN.sub(lambda m: str(len(m.group())), row) for row in rows)
+
+
+def placement_to_symbols(fen):
+    """64 symboles (ordre a8..h1, '1' pour une case vide) d'une FEN ou de sa partie placement"""
+    placement = fen.split()[0].replace('/', '')
+    return list(re.sub('[2-8]', lambda m: '1' * int(m.group()), placement))
+
+
+def build_fens(batch_detections, image_sizes, homographies=None, board_bboxes=None):
+    """
+    Construit les FEN d'un lot d'images en une passe
+
+    Args:
+        batch_detections: Liste des détections de chaque image
+        image_sizes: (largeur, hauteur) de chaque image
+        homographies: Homographie de chaque image, ou None (optionnel)
+        board_bboxes: Rectangle de l'échiquier de chaque image, ou None (optionnel)
+
+    Returns:
+        list: Un FenResult par image
+    """
+    count = len(batch_detections)
+    homographies = homographies if homographies is not None else [None] * count
+    board_bboxes = board_bboxes if board_bboxes is not None else [None] * count
+
+    transforms = np.stack([
+        board_transform(width, height, homography, bbox)
+        for (width, height), homography, bbox in zip(image_sizes, homographies, board_bboxes)
+    ]) if count else np.zeros((0, 3, 3))
+
+    # Détections reconnues de tout le lot, aplaties
+    flat, image_index, symbols = [], [], []
+    for i, detections in enumerate(batch_detections):
+        for det in detections:
+            symbol = PIECE_SYMBOLS.get(det['class'].lower())
+            if symbol:
+                flat.append(det)
+                image_index.append(i)
+                symbols.append(symbol)
+
+    squares = np.full(len(flat), -1, dtype=np.int64)
+    kept = np.zeros(len(flat), dtype=bool)
+    if flat:
+        image_index = np.array(image_index)
+        boxes, confidences = _boxes(flat)
+        # Règle de la base seulement avec une vraie homographie; image entière
+        # ou rectangle de l'échiquier : centre de la boîte
+        perspective = np.array([homography is not None for homography in homographies])
+        squares = assign_squares(boxes, transforms[image_index], perspective[image_index])
+
+        # Par case : la détection la plus confiante l'emporte
+        keys = image_index * 64 + squares
+        order = np.lexsort((-confidences, keys))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = keys[order][1:] != keys[order][:-1]
+        kept[order[first]] = True
+
+    grids = np.full((count, 64), '1', dtype='<U1')
+    if flat:
+        grids[image_index[kept], squares[kept]] = np.array(symbols)[kept]
+
+    # Conflits : détections écartées, regroupées par case
+    conflicts = [{} for _ in range(count)]
+    dropped = np.flatnonzero(~kept)
+    winners = {(int(image_index[k]), int(squares[k])): k for k in np.flatnonzero(kept)} if len(dropped) else {}
+    for j in dropped:
+        i, square = int(image_index[j]), int(squares[j])
+        if square not in conflicts[i]:
+            winner = flat[winners[(i, square)]]
+            conflicts[i][square] = {'square': square_name(square), 'kept': _summary(winner), 'dropped': []}
+        conflicts[i][square]['dropped'].append(_summary(flat[j]))
+
+    results = []
+    offset = 0
+    for i, detections in enumerate(batch_detections):
+        # Cases des détections de l'image i, dans l'ordre d'origine (-1 si classe inconnue)
+        image_squares = []
+        for det in detections:
+            if PIECE_SYMBOLS.get(det['class'].lower()):
+                image_squares.append(int(squares[offset]))
+                offset += 1
+            else:
+                image_squares.append(-1)
+        results.append(FenResult(
+            symbols_to_placement(grids[i]) + FEN_SUFFIX,
+            image_squares,
+            [conflicts[i][square] for square in sorted(conflicts[i])]
+        ))
+    return results
+
+
+def _summary(det):
+    return {'id': det.get('id'), 'class': det['class'], 'confidence': det['confidence']}
+
+
+def build_fen(detections, image_width, image_height, homography=None, board_bbox=None):
+    """FenResult d'une seule image (voir build_fens)"""
+    return build_fens([detections], [(image_width, image_height)], [homography], [board_bbox])[0]
+
+
+def pieces_to_fen(detections, image_width, image_height, homography=None, board_bbox=None):
+    """
+    Convertit les détections de pièces en notation FEN
+
+    Args:
+        detections: Liste des détections avec position et classe
+        image_width: Largeur de l'image
+        image_height: Hauteur de l'image
+        homography: Homographie image -> repère de l'échiquier (0..8), issue de
+                    la localisation du plateau (optionnel)
+        board_bbox: Rectangle (x1, y1, x2, y2) de l'échiquier (optionnel, sinon
+                    l'échiquier est supposé occuper toute l'image)
+
+    Returns:
+        str: Notation FEN de la position
+    """
+    return build_fen(detections, image_width, image_height, homography, board_bbox).fen
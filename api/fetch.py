@@ -0,0 +1,262 @@
+"""
+Téléchargement des images par URL (paramètre image_url)
+
+- Client HTTP avec pool de connexions réutilisées (requests.Session)
+- Délais de connexion/lecture et durée totale bornés
+- Connexion à l'adresse validée par check_url (pas de seconde résolution DNS)
+- Taille maximale : le corps est lu par blocs et transmis directement à
+  l'ingestion (rejet précoce du format et des dimensions, décodage au fil de l'eau)
+- Téléchargements en arrière-plan (pool de threads) pour recouvrir le temps
+  réseau avec le travail des modèles dans les jobs
+"""
+
+import ipaddress
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ingest import CHUNK_SIZE, MAX_UPLOAD_BYTES, ImageIngestor, IngestError
+from metrics import metrics
+
+FETCH_CONNECT_TIMEOUT = float(os.environ.get('FETCH_CONNECT_TIMEOUT', 3.0))
+FETCH_READ_TIMEOUT = float(os.environ.get('FETCH_READ_TIMEOUT', 10.0))
+FETCH_TOTAL_TIMEOUT = float(os.environ.get('FETCH_TOTAL_TIMEOUT', 20.0))
+FETCH_POOL_SIZE = int(os.environ.get('FETCH_POOL_SIZE', 16))
+FETCH_WORKERS = int(os.environ.get('FETCH_WORKERS', 8))
+FETCH_MAX_REDIRECTS = 3
+# Autoriser les adresses privées/locales (développement, tests avec un serveur local)
+FETCH_ALLOW_PRIVATE = os.environ.get('FETCH_ALLOW_PRIVATE', 'false').lower() == 'true'
+
+
+def check_url(url, allow_private=FETCH_ALLOW_PRIVATE):
+    """
+    Valide une URL d'image (http/https, hôte public)
+
+    Les adresses privées, locales et link-local (ex: serveur de métadonnées
+    Cloud Run 169.254.169.254) sont refusées sauf si allow_private est activé.
+
+    Returns:
+        str: Adresse IP validée à laquelle se connecter (None si allow_private)
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise IngestError('URL invalide', 'Seules les URLs http(s) absolues sont acceptées', 400)
+    if allow_private:
+        return None
+
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(parsed.hostname, parsed.port or 443)]
+    except socket.gaierror:
+        raise IngestError('URL invalide', f'Hôte introuvable: {parsed.hostname}', 400)
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved or ip.is_multicast:
+            raise IngestError('URL refusée', f'Adresse non publique: {parsed.hostname}', 400)
+    return addresses[0]
+
+
+def _response_socket(response):
+    """
+    Socket d'une réponse requests en flux (None s'il n'est pas accessible)
+
+    La connexion urllib3 garde son socket tant qu'elle peut être réutilisée;
+    sinon (Connection: close) seul le fichier de la réponse http.client le garde.
+    """
+    sock = getattr(getattr(response.raw, 'connection', None), 'sock', None)
+    if sock is None:
+        fp = getattr(getattr(response.raw, '_fp', None), 'fp', None)
+        sock = getattr(getattr(fp, 'raw', None), '_sock', None)
+    return sock if isinstance(sock, socket.socket) else None
+
+
+class PinnedAdapter(HTTPAdapter):
+    """
+    Adaptateur qui se connecte à l'adresse validée par check_url
+
+    Sans épinglage, l'hôte serait résolu une seconde fois à la connexion : un
+    DNS complice (DNS rebinding) pourrait renvoyer une adresse privée après la
+    vérification. Une requête portant `pinned_address` part vers cette adresse,
+    sans proxy; l'en-tête Host, le SNI et la vérification du certificat gardent
+    le nom d'hôte d'origine.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._local = threading.local()
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        address = getattr(request, 'pinned_address', None)
+        if address is None:
+            return super().send(request, **kwargs)
+        kwargs['proxies'] = None
+        self._local.address = address
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            self._local.address = None
+
+    def _pinned_pool(self, url):
+        """Pool de connexions vers l'adresse épinglée (None sans épinglage)"""
+        address = getattr(self._local, 'address', None)
+        if address is None:
+            return None
+        parsed = urlparse(url)
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        pool_kwargs = {}
+        if parsed.scheme == 'https':
+            pool_kwargs = {'server_hostname': parsed.hostname, 'assert_hostname': parsed.hostname}
+        return self.poolmanager.connection_from_host(address, port, parsed.scheme, pool_kwargs=pool_kwargs)
+
+    def get_connection(self, url, proxies=None):
+        # requests < 2.32
+        return self._pinned_pool(url) or super().get_connection(url, proxies)
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        # requests >= 2.32
+        return (self._pinned_pool(request.url)
+                or super().get_connection_with_tls_context(request, verify, proxies=proxies, cert=cert))
+
+
+class ImageFetcher:
+    """Client de téléchargement d'images avec pool de connexions"""
+
+    def __init__(self, pool_size=FETCH_POOL_SIZE, workers=FETCH_WORKERS, max_bytes=MAX_UPLOAD_BYTES,
+                 connect_timeout=FETCH_CONNECT_TIMEOUT, read_timeout=FETCH_READ_TIMEOUT,
+                 total_timeout=FETCH_TOTAL_TIMEOUT, allow_private=FETCH_ALLOW_PRIVATE):
+        self.max_bytes = max_bytes
+        self.timeout = (connect_timeout, read_timeout)
+        self.total_timeout = total_timeout
+        self.allow_private = allow_private
+
+        self.session = requests.Session()
+        adapter = PinnedAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = 'Senchess-AI/1.0 (+image_url)'
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='senchess-fetch')
+
+    def fetch(self, url, decode=True):
+        """
+        Télécharge une image et l'ingère au fil de l'eau
+
+        Args:
+            url: URL http(s) de l'image
+            decode: Décoder l'image (sinon retourner les octets bruts dans .data)
+
+        Returns:
+            IngestedImage
+        """
+        started = time.perf_counter()
+        deadline = started + self.total_timeout
+        expired = threading.Event()
+        watchdog = None
+        try:
+            with self._open(url, deadline) as response:
+                # Le délai total est imposé au socket : un serveur qui envoie le corps
+                # octet par octet (sous le délai de lecture) est coupé à l'échéance
+                watchdog = self._watchdog(response, deadline, expired)
+                if response.status_code != 200:
+                    raise IngestError(
+                        'Téléchargement impossible',
+                        f'Le serveur a répondu HTTP {response.status_code}',
+                        502
+                    )
+
+                content_length = response.headers.get('Content-Length')
+                if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+                    raise IngestError(
+                        'Fichier trop volumineux',
+                        f'Taille maximale: {self.max_bytes // (1024 * 1024)} Mo',
+                        413
+                    )
+
+                ingestor = ImageIngestor(max_bytes=self.max_bytes, decode=decode)
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if expired.is_set() or time.perf_counter() > deadline:
+                        raise self._total_timeout_error()
+                    ingestor.feed(chunk)
+                if expired.is_set():
+                    raise self._total_timeout_error()
+                ingested = ingestor.finish()
+        except IngestError:
+            metrics.incr('fetch.errors')
+            raise
+        except requests.Timeout:
+            metrics.incr('fetch.errors')
+            raise IngestError('Délai dépassé', 'Le serveur de l\'image ne répond pas', 504)
+        except requests.RequestException as e:
+            metrics.incr('fetch.errors')
+            if expired.is_set():
+                raise self._total_timeout_error()
+            raise IngestError('Téléchargement impossible', str(e), 502)
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+
+        metrics.observe('fetch.download', (time.perf_counter() - started) * 1000)
+        metrics.incr('fetch.bytes', ingested.nbytes)
+        return ingested
+
+    def _total_timeout_error(self):
+        return IngestError('Délai dépassé', f'Téléchargement plus long que {self.total_timeout:.0f}s', 504)
+
+    @staticmethod
+    def _watchdog(response, deadline, expired):
+        """
+        Coupe le socket de la réponse à l'échéance (lecture bloquée débloquée)
+
+        Returns:
+            threading.Timer à annuler en fin de lecture (None sans socket accessible)
+        """
+        sock = _response_socket(response)
+        if sock is None:
+            return None
+
+        def cut():
+            expired.set()
+            try:
+                # socket.socket.shutdown : ne touche pas à l'état TLS lu par l'autre thread
+                socket.socket.shutdown(sock, socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+        timer = threading.Timer(max(0.0, deadline - time.perf_counter()), cut)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def _open(self, url, deadline=None):
+        """Requête GET en flux; chaque redirection est revalidée par check_url"""
+        connect_timeout, read_timeout = self.timeout
+        for _ in range(FETCH_MAX_REDIRECTS + 1):
+            if deadline is not None:
+                # En-têtes attendus au plus jusqu'à l'échéance du téléchargement
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise self._total_timeout_error()
+                timeout = (min(connect_timeout, remaining), min(read_timeout, remaining))
+            else:
+                timeout = self.timeout
+            address = check_url(url, self.allow_private)
+            request = self.session.prepare_request(requests.Request('GET', url))
+            if address is not None:
+                # Connexion à l'adresse vérifiée, Host d'origine
+                request.pinned_address = address
+                request.headers['Host'] = urlparse(url).netloc.rpartition('@')[2]
+            response = self.session.send(request, stream=True, timeout=timeout, allow_redirects=False)
+            if not response.is_redirect:
+                return response
+            url = urljoin(url, response.headers['Location'])
+            response.close()
+        raise IngestError('Téléchargement impossible', 'Trop de redirections', 502)
+
+    def submit(self, url, decode=True):
+        """Lance le téléchargement en arrière-plan et retourne un Future"""
+        return self._executor.submit(self.fetch, url, decode)
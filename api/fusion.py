@@ -0,0 +1,75 @@
+"""
+Fusion vectorisée des détections (NMS)
+
+Les recouvrements de toutes les paires de boîtes sont calculés en une seule
+opération NumPy; seule la sélection gloutonne parcourt les boîtes, chaque
+étape supprimant d'un coup toutes les boîtes trop proches de la boîte gardée.
+Utilisé pour fusionner les tuiles (api/tiling.py) et pour comparer d'autres
+fusions d'ensemble hors ligne (src/prediction_cache.py). L'ensemble servi par
+l'API passe par inference.merge_ensemble_detections.
+"""
+
+import numpy as np
+
+
+def detection_arrays(detections):
+    """Boîtes (N, 4) x1, y1, x2, y2 et confiances (N,) d'une liste de détections"""
+    boxes = np.float64([[d['bbox']['x1'], d['bbox']['y1'], d['bbox']['x2'], d['bbox']['y2']]
+                        for d in detections]).reshape(-1, 4)
+    scores = np.float64([d['confidence'] for d in detections])
+    return boxes, scores
+
+
+def pairwise_iou(boxes_a, boxes_b):
+    """IoU de toutes les paires : (N, M)"""
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def nms(boxes, scores, iou_threshold=0.5, classes=None):
+    """
+    Suppression des non-maxima
+
+    Args:
+        boxes: (N, 4) x1, y1, x2, y2
+        scores: (N,) confiances
+        iou_threshold: IoU au-delà de laquelle la boîte la moins confiante est supprimée
+        classes: (N,) classes; si fourni, seules les boîtes de même classe se suppriment
+
+    Returns:
+        np.ndarray: Indices des boîtes gardées, par confiance décroissante
+    """
+    order = np.argsort(-scores, kind='stable')
+    overlaps = pairwise_iou(boxes[order], boxes[order]) > iou_threshold
+    if classes is not None:
+        classes = np.asarray(classes)[order]
+        overlaps &= classes[:, None] == classes[None, :]
+
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= overlaps[i]
+    return order[keep]
+
+
+def fuse_detections(detections, iou_threshold=0.5, class_agnostic=True):
+    """
+    Fusionne des détections redondantes (tuiles qui se recouvrent, plusieurs passes)
+
+    Returns:
+        list: Détections gardées, par confiance décroissante, IDs réassignés
+    """
+    if not detections:
+        return []
+    boxes, scores = detection_arrays(detections)
+    classes = None if class_agnostic else [d['class'] for d in detections]
+    kept = nms(boxes, scores, iou_threshold, classes)
+    return [{**detections[i], 'id': n + 1} for n, i in enumerate(kept)]
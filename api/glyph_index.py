@@ -0,0 +1,215 @@
+"""
+Voie rapide sans réseau de neurones pour les diagrammes 2D : index de glyphes
+
+Les diagrammes générés par un même site ou thème réutilisent exactement les
+mêmes glyphes de pièces. Chaque case de l'échiquier redressé reçoit une
+empreinte perceptuelle (dHash); l'empreinte est cherchée dans un index
+empreinte -> état de la case, construit à partir de data/chess_decoder_1000
+(src/build_glyph_index.py) et enrichi par les prédictions confiantes de Haki.
+Seules les cases inconnues nécessitent une passe Haki.
+
+Recherche : correspondance exacte (dictionnaire), puis plus proche voisin en
+distance de Hamming pour les cases restantes (rendu légèrement différent).
+"""
+
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from metrics import metrics
+
+# Index enrichi à l'exécution (chargé en priorité s'il existe, sauvegardé périodiquement)
+GLYPH_INDEX_PATH = os.environ.get('GLYPH_INDEX_PATH', '/tmp/glyph_index.npz')
+# Confiance minimale d'une prédiction Haki pour enrichir l'index
+GLYPH_LEARN_CONF = float(os.environ.get('GLYPH_LEARN_CONF', 0.9))
+# Distance de Hamming maximale (sur 144 bits) pour une correspondance approchée
+GLYPH_MAX_DISTANCE = int(os.environ.get('GLYPH_MAX_DISTANCE', 8))
+GLYPH_SAVE_EVERY = int(os.environ.get('GLYPH_SAVE_EVERY', 256))
+# Votes concordants minimum pour qu'une empreinte soit considérée comme connue
+GLYPH_MIN_VOTES = int(os.environ.get('GLYPH_MIN_VOTES', 3))
+# Part minimale des votes pour qu'une empreinte soit considérée comme connue
+GLYPH_MIN_VOTE_SHARE = float(os.environ.get('GLYPH_MIN_VOTE_SHARE', 0.9))
+
+# dHash sur une grille HASH_SIZE x (HASH_SIZE + 1) par case
+HASH_SIZE = 12
+
+CLASSES = [
+    'empty', 'white-king', 'white-queen', 'white-rook', 'white-bishop', 'white-knight', 'white-pawn',
+    'black-king', 'black-queen', 'black-rook', 'black-bishop', 'black-knight', 'black-pawn'
+]
+
+# Nombre de bits à 1 de chaque octet
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def square_hashes(image_bgr, location, hash_size=HASH_SIZE):
+    """
+    Empreintes dHash des 64 cases (ordre a8, b8, ..., h1)
+
+    L'échiquier est redressé une seule fois (32 px par case), réduit par moyenne
+    de zones à la taille de la grille de hachage, puis découpé en 64 cases.
+
+    Returns:
+        np.ndarray: (64, octets) uint8
+    """
+    gray = image_bgr if image_bgr.ndim == 2 else cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+    rows, cols = hash_size, hash_size + 1
+    board = cv2.warpPerspective(gray, np.float64([[32, 0, 0], [0, 32, 0], [0, 0, 1]]) @ location.homography,
+                                (256, 256), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    cells = cv2.resize(board, (8 * cols, 8 * rows), interpolation=cv2.INTER_AREA).astype(np.int16)
+    cells = cells.reshape(8, rows, 8, cols).transpose(0, 2, 1, 3).reshape(64, rows, cols)
+    bits = cells[:, :, 1:] > cells[:, :, :-1]
+    return np.packbits(bits.reshape(64, -1), axis=1)
+
+
+class GlyphIndex:
+    """
+    Index empreinte -> votes par état de case (vide + 12 pièces)
+
+    Thread-safe : les recherches et l'apprentissage peuvent venir de
+    plusieurs requêtes simultanées. `save_path` reçoit la sauvegarde
+    périodique des empreintes apprises (None : pas de sauvegarde automatique).
+    """
+
+    def __init__(self, max_distance=GLYPH_MAX_DISTANCE, hash_size=HASH_SIZE, save_path=GLYPH_INDEX_PATH):
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.save_path = save_path
+        self._lock = threading.Lock()
+        self._votes = {}
+        self._matrix = None  # Empreintes connues (reconstruites après apprentissage)
+        self._unsaved = 0
+        metrics.gauge('glyphs.entries', lambda: len(self._votes))
+
+    def __len__(self):
+        return len(self._votes)
+
+    def load(self, path):
+        """Charge un index sauvegardé (.npz); retourne False si le fichier est absent"""
+        if not path or not os.path.exists(path):
+            return False
+        data = np.load(path)
+        classes = [str(name) for name in data['classes']]
+        remap = np.array([CLASSES.index(name) for name in classes])
+        with self._lock:
+            self.hash_size = int(data['hash_size'])
+            for key, votes in zip(data['keys'], data['votes']):
+                merged = np.zeros(len(CLASSES), dtype=np.int32)
+                merged[remap] = votes
+                self._votes[key.tobytes()] = merged
+            self._matrix = None
+        return True
+
+    def save(self, path):
+        """Sauvegarde atomique de l'index (.npz)"""
+        with self._lock:
+            keys = np.frombuffer(b''.join(self._votes), dtype=np.uint8).reshape(len(self._votes), -1)
+            votes = np.stack(list(self._votes.values())) if self._votes else np.zeros((0, len(CLASSES)))
+            self._unsaved = 0
+        tmp_path = f'{path}.tmp.npz'
+        np.savez_compressed(tmp_path, keys=keys, votes=votes, classes=np.array(CLASSES),
+                            hash_size=self.hash_size)
+        os.replace(tmp_path, path)
+
+    def _known(self):
+        """
+        Matrice des empreintes connues (reconstruite après apprentissage)
+
+        Une empreinte est connue à partir de GLYPH_MIN_VOTES votes pour le même
+        état, représentant au moins GLYPH_MIN_VOTE_SHARE des votes.
+        """
+        if self._matrix is None:
+            keys, labels, shares = [], [], []
+            for key, votes in self._votes.items():
+                share = votes.max() / votes.sum()
+                if votes.max() >= GLYPH_MIN_VOTES and share >= GLYPH_MIN_VOTE_SHARE:
+                    keys.append(key)
+                    labels.append(int(votes.argmax()))
+                    shares.append(share)
+            nbytes = (self.hash_size * self.hash_size + 7) // 8
+            self._matrix = (
+                np.frombuffer(b''.join(keys), dtype=np.uint8).reshape(len(keys), nbytes),
+                np.array(labels, dtype=np.int64),
+                np.array(shares, dtype=np.float32),
+                {key: i for i, key in enumerate(keys)}
+            )
+        return self._matrix
+
+    def lookup(self, hashes):
+        """
+        Cherche l'état de chaque case
+
+        Returns:
+            tuple: (noms des états, None si inconnu; confiances (N,))
+        """
+        started = time.perf_counter()
+        with self._lock:
+            keys, labels, shares, positions = self._known()
+
+        names = [None] * len(hashes)
+        confidences = np.zeros(len(hashes), dtype=np.float32)
+        missing = []
+        for i, key in enumerate(hashes):
+            position = positions.get(key.tobytes())
+            if position is None:
+                missing.append(i)
+            else:
+                names[i] = CLASSES[labels[position]]
+                confidences[i] = shares[position]
+
+        if missing and len(keys):
+            # Distance de Hamming vers toutes les empreintes connues (table de popcount),
+            # pour les seules cases absentes du dictionnaire
+            for i in missing:
+                distances = _POPCOUNT[hashes[i] ^ keys].sum(axis=1, dtype=np.int32)
+                nearest = int(np.argmin(distances))
+                distance = distances[nearest]
+                if distance > self.max_distance:
+                    continue
+                # Refus si une autre classe est presque aussi proche
+                others = distances[labels != labels[nearest]]
+                if len(others) and others.min() <= distance + 2:
+                    continue
+                names[i] = CLASSES[labels[nearest]]
+                confidences[i] = shares[nearest] * (1 - distance / (2 * self.max_distance + 1))
+
+        hits = sum(name is not None for name in names)
+        metrics.observe('glyphs.lookup', (time.perf_counter() - started) * 1000)
+        metrics.incr('glyphs.hits', hits)
+        metrics.incr('glyphs.misses', len(names) - hits)
+        return names, confidences
+
+    def learn(self, hashes, names, weight=1):
+        """
+        Ajoute des empreintes étiquetées (vote pour l'état donné)
+
+        Args:
+            hashes: Empreintes (N, octets)
+            names: État de chaque case
+            weight: Votes par empreinte (GLYPH_MIN_VOTES pour une annotation sûre)
+
+        Returns:
+            int: Nombre d'empreintes nouvelles
+        """
+        added = 0
+        with self._lock:
+            for key, name in zip(hashes, names):
+                key = key.tobytes()
+                votes = self._votes.get(key)
+                if votes is None:
+                    votes = self._votes[key] = np.zeros(len(CLASSES), dtype=np.int32)
+                    added += 1
+                votes[CLASSES.index(name)] += weight
+            self._matrix = None
+            self._unsaved += len(names)
+            should_save = self._unsaved >= GLYPH_SAVE_EVERY
+        metrics.incr('glyphs.learned', len(names))
+        if should_save and self.save_path:
+            try:
+                self.save(self.save_path)
+            except OSError as e:
+                print(f"⚠️ Sauvegarde de l'index de glyphes impossible: {e}")
+        return added
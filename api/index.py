@@ -3,30 +3,78 @@ API Flask pour la détection de pièces d'échecs avec YOLO
 Déployée sur Google Cloud Run avec CI/CD automatique
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Request, Response, request, jsonify
 from flask_cors import CORS
 import os
-import io
-import base64
+import hashlib
 import numpy as np
-from PIL import Image
 import cv2
 from ultralytics import YOLO
 from pathlib import Path
 import tempfile
 
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from board import (RECTIFIED_IMGSZ, RECTIFY_BOARD, RECTIFY_MARGIN_SQUARES, locate_board, map_detections,
+                   rectify_board)
+from cache import ResultCache
+from cascade import CASCADE_ENABLED, CASCADE_LOW_IMGSZ, run_cascade
+from costs import ModelCosts
+from fen import build_fen, build_fens, detection_squares
+from fetch import ImageFetcher, check_url
+from glyph_index import CLASSES as GLYPH_CLASSES
+from glyph_index import GLYPH_INDEX_PATH, GLYPH_LEARN_CONF, GlyphIndex, square_hashes
+from inference import decode_image, merge_ensemble_detections, predict_batch_with_model
+from ingest import MAX_REQUEST_BYTES, IngestError, ingest_chunks, iter_base64, iter_stream
+from jobs import (JOBS_BATCH_SIZE, JOBS_MAX_IMAGES, JOBS_MAX_REQUEST_BYTES, JOBS_TTL_SECONDS,
+                  JobRunner, JobStore)
+from metrics import metrics
+from mosaic import MOSAIC_CELL, MOSAIC_ENABLED, MOSAIC_GRID, MosaicBatcher, fits_mosaic
+from prefilter import PREFILTER_ENABLED, check_board
+from scheduler import InferenceScheduler
+from singleflight import SingleFlight, request_key
+from square_classifier import SquareClassifier, squares_to_detections
+from tiling import TILE_MAX_BOARD_PX, TILING_ENABLED, board_side, detect_tiled, needs_tiling
+from stream import StreamSession, acquire_connection, release_connection, send_message
+from tracking import classifier_detector, rectified_detector
+
+try:
+    from flask_sock import Sock
+except ImportError:  # Endpoint /stream désactivé
+    Sock = None
+
+class SenchessRequest(Request):
+    """Requête Flask dont la taille maximale dépend de l'endpoint"""
+    
+    @property
+    def max_content_length(self):
+        # Un corps plus gros que la limite est refusé (413) avant d'être lu
+        if self.endpoint == 'create_job':
+            return JOBS_MAX_REQUEST_BYTES
+        return MAX_REQUEST_BYTES
+
 app = Flask(__name__)
+app.request_class = SenchessRequest
 CORS(app)  # Permettre les requêtes cross-origin
+sock = Sock(app) if Sock is not None else None
 
 # Configuration des modèles
 HUGGINGFACE_REPO = os.environ.get('HUGGINGFACE_REPO_ID', 'MedouneSGB/senchess-models')
 MODEL_TYPE = os.environ.get('MODEL_TYPE', 'gear')  # 'gear', 'haki', 'kaido', ou 'ensemble'
 USE_HUGGINGFACE = os.environ.get('USE_HUGGINGFACE', 'true').lower() == 'true'
+# Moteur par défaut : 'detection' (YOLO), 'squares' (classifieur de cases)
+# ou 'glyphs' (index de glyphes des diagrammes, Haki pour les cases inconnues)
+ENGINE = os.environ.get('ENGINE', 'detection')
+# Seuil de Haki sur les cases inconnues (très bas : donne le meilleur score de chaque case)
+GLYPH_HAKI_CONF = 0.01
+# Score Haki maximal d'une case apprise comme vide
+GLYPH_EMPTY_MAX_CONF = float(os.environ.get('GLYPH_EMPTY_MAX_CONF', 0.05))
 
 # Variables globales pour les modèles
 model_gear = None
 model_haki = None
 model_kaido = None
+square_classifier = None
 
 def download_model_from_huggingface(model_name):
     """Télécharge un modèle depuis Hugging Face Hub"""
@@ -53,7 +101,7 @@ def download_model_from_huggingface(model_name):
 
 def load_model():
     """Charge le(s) modèle(s) YOLO"""
-    global model_gear, model_haki, model_yonko
+    global model_gear, model_haki, model_kaido
     
     try:
         if USE_HUGGINGFACE:
@@ -108,89 +156,46 @@ def load_model():
         print(f"❌ Erreur lors du chargement du modèle: {e}")
         model_gear = None
         model_haki = None
-        model_yonko = None
+        model_kaido = None
 
-def pieces_to_fen(detections, image_width, image_height):
-    """
-    Convertit les détections de pièces en notation FEN
+def load_square_classifier():
+    """Charge le classifieur de cases (moteur 'squares'), s'il est disponible"""
+    global square_classifier
     
-    Args:
-        detections: Liste des détections avec position et classe
-        image_width: Largeur de l'image
-        image_height: Hauteur de l'image
-    
-    Returns:
-        str: Notation FEN de la position
-    """
-    # Créer une grille 8x8 vide
-    board = [['' for _ in range(8)] for _ in range(8)]
-    
-    # Mapping des noms de pièces vers notation FEN
-    piece_mapping = {
-        'white-king': 'K', 'white-queen': 'Q', 'white-rook': 'R',
-        'white-bishop': 'B', 'white-knight': 'N', 'white-pawn': 'P',
-        'black-king': 'k', 'black-queen': 'q', 'black-rook': 'r',
-        'black-bishop': 'b', 'black-knight': 'n', 'black-pawn': 'p',
-        # Variantes possibles
-        'king': 'K', 'queen': 'Q', 'rook': 'R',
-        'bishop': 'B', 'knight': 'N', 'pawn': 'P',
-        'black king': 'k', 'black queen': 'q', 'black rook': 'r',
-        'black bishop': 'b', 'black knight': 'n', 'black pawn': 'p',
-    }
+    if USE_HUGGINGFACE:
+        weights = download_model_from_huggingface('square_classifier_v1.0.pt')
+    else:
+        weights = 'models/square_classifier/weights/best.pt'
     
-    # Calculer la taille d'une case
-    cell_width = image_width / 8
-    cell_height = image_height / 8
+    if not weights or not os.path.exists(weights):
+        print("⚠️ Classifieur de cases non disponible - moteur 'squares' désactivé")
+        return
     
-    # Placer chaque pièce détectée sur la grille
-    for det in detections:
-        piece_name = det['class'].lower()
-        
-        # Obtenir le symbole FEN
-        fen_symbol = piece_mapping.get(piece_name, '')
-        if not fen_symbol:
-            continue
-        
-        # Calculer la position centrale de la pièce
-        center_x = (det['bbox']['x1'] + det['bbox']['x2']) / 2
-        center_y = (det['bbox']['y1'] + det['bbox']['y2']) / 2
-        
-        # Convertir en coordonnées d'échiquier (0-7)
-        col = int(center_x / cell_width)
-        row = int(center_y / cell_height)
-        
-        # S'assurer que les coordonnées sont valides
-        col = max(0, min(7, col))
-        row = max(0, min(7, row))
-        
-        # Placer la pièce (noter que row 0 = haut de l'image = rang 8 aux échecs)
-        board[row][col] = fen_symbol
-    
-    # Construire la chaîne FEN
-    fen_rows = []
-    for row in board:
-        fen_row = ''
-        empty_count = 0
-        
-        for cell in row:
-            if cell == '':
-                empty_count += 1
-            else:
-                if empty_count > 0:
-                    fen_row += str(empty_count)
-                    empty_count = 0
-                fen_row += cell
-        
-        if empty_count > 0:
-            fen_row += str(empty_count)
-        
-        fen_rows.append(fen_row)
+    try:
+        square_classifier = SquareClassifier(weights)
+        print("✅ Classifieur de cases chargé")
+    except Exception as e:
+        print(f"❌ Erreur lors du chargement du classifieur de cases: {e}")
+        square_classifier = None
+
+def load_glyph_index():
+    """Charge l'index de glyphes : index enrichi à l'exécution, sinon index de base"""
+    if glyph_index.load(GLYPH_INDEX_PATH):
+        print(f"✅ Index de glyphes chargé depuis {GLYPH_INDEX_PATH} ({len(glyph_index)} empreintes)")
+        return
     
-    # Joindre avec '/' et ajouter les métadonnées FEN par défaut
-    fen = '/'.join(fen_rows)
-    fen += ' w KQkq - 0 1'  # Métadonnées: blancs jouent, tous les roques possibles, etc.
+    if USE_HUGGINGFACE:
+        path = download_model_from_huggingface('glyph_index_v1.0.npz')
+    else:
+        path = 'models/glyph_index/glyph_index.npz'
     
-    return fen
+    try:
+        if glyph_index.load(path):
+            print(f"✅ Index de glyphes chargé ({len(glyph_index)} empreintes)")
+        else:
+            print("⚠️ Index de glyphes absent - il sera appris au fil des prédictions Haki")
+    except Exception as e:
+        print(f"❌ Erreur lors du chargement de l'index de glyphes: {e}")
 
 @app.route('/', methods=['GET'])
 def home():
@@ -202,7 +207,11 @@ def home():
         'endpoints': {
             '/': 'Cette page',
             '/health': 'Vérifier l\'état de l\'API',
-            '/predict': 'POST - Analyser une image d\'échiquier'
+            '/metrics': 'GET - Métriques (files de priorité, temps d\'attente)',
+            '/predict': 'POST - Analyser une image d\'échiquier',
+            '/jobs': 'POST - Soumettre un lot d\'images (traitement asynchrone)',
+            '/jobs/<job_id>': 'GET - Progression et résultats d\'un job',
+            '/stream': 'WebSocket - Suivi en direct (images envoyées, FEN reçues à chaque changement)'
         }
     })
 
@@ -212,8 +221,10 @@ def health():
     models_loaded = {
         'gear': model_gear is not None,
         'haki': model_haki is not None,
-        'kaido': model_kaido is not None
+        'kaido': model_kaido is not None,
+        'squares': square_classifier is not None
     }
+    models_measured = {name: model_costs.measured(name) is not None for name in ('gear', 'haki', 'kaido')}
     
     any_loaded = model_gear is not None or model_haki is not None or model_kaido is not None
     
@@ -221,6 +232,7 @@ def health():
         'status': 'healthy' if any_loaded else 'model_not_loaded',
         'model_type': MODEL_TYPE,
         'models_loaded': models_loaded,
+        'models_measured': models_measured,
         'use_huggingface': USE_HUGGINGFACE,
         'repo_id': HUGGINGFACE_REPO if USE_HUGGINGFACE else 'local'
     })
@@ -232,10 +244,32 @@ def predict():
     
     Accepte:
     - image: fichier image (multipart/form-data)
+    - corps brut de l'image (Content-Type application/octet-stream ou image/*),
+      les paramètres passant alors dans la query string
     - image_url: URL d'une image
     - image_base64: image encodée en base64
+    
+    Seul le corps brut est vérifié au fil de la lecture (format et dimensions dès
+    les premiers octets). Un formulaire (`image` multipart, `image_base64`) est
+    lu et mis en mémoire tampon en entier par werkzeug avant ces vérifications,
+    dans la seule limite de MAX_REQUEST_BYTES.
     - conf: seuil de confiance (optionnel, défaut 0.25)
     - model: 'gear', 'haki', 'yonko' ou 'ensemble' (optionnel, utilise MODEL_TYPE par défaut)
+    - priority (ou en-tête X-Priority): 'interactive' (défaut), 'batch' ou 'background'
+    - prefilter: 'false' pour désactiver le pré-filtre "échiquier présent" (422 sinon)
+    - rectify: 'true' pour localiser et redresser l'échiquier avant la détection
+      (défaut RECTIFY_BOARD)
+    - engine: 'detection' (YOLO), 'squares' (classification des 64 cases d'un
+      échiquier localisé) ou 'glyphs' (index de glyphes des diagrammes 2D);
+      défaut ENGINE
+    - cascade: 'true' pour une première passe à basse résolution, relancée à
+      pleine résolution seulement si elle n'est pas concluante (défaut CASCADE_ENABLED)
+    - tiling: 'true' pour découper les grandes images (ou grands échiquiers
+      redressés) en tuiles détectées en un lot (défaut TILING_ENABLED)
+    - mosaic: 'true' pour regrouper les petites images de requêtes simultanées
+      dans un même canevas (une passe pour plusieurs images, défaut MOSAIC_ENABLED)
+    - budget_ms: budget de latence; seuls les modèles dont la latence mesurée
+      (model_costs.json) tient dans le budget sont lancés (voir `routing`)
     
     Retourne:
     - fen: notation FEN de la position
@@ -244,41 +278,60 @@ def predict():
     - detectedPieces: nombre de pièces détectées
     """
     # Vérifier qu'au moins un modèle est chargé
-    if model_gear is None and model_haki is None and model_yonko is None:
+    if model_gear is None and model_haki is None and model_kaido is None:
         return jsonify({
             'error': 'Modèle non chargé',
             'message': 'Aucun modèle YOLO n\'a pu être chargé'
         }), 500
     
+    budget_ms = request_param('budget_ms')
+    if budget_ms is not None:
+        try:
+            budget_ms = float(budget_ms)
+        except ValueError:
+            budget_ms = None
+        if budget_ms is None or not 0 < budget_ms < float('inf'):
+            return jsonify({
+                'error': 'Paramètre invalide',
+                'message': 'budget_ms doit être un nombre de millisecondes strictement positif'
+            }), 400
+    
     try:
         # Paramètres
-        conf_threshold = float(request.form.get('conf', 0.25))
-        requested_model = request.form.get('model', MODEL_TYPE)
+        conf_threshold = float(request_param('conf', 0.25))
+        requested_model = request_param('model', MODEL_TYPE)
+        lane = request_lane('interactive')
+        rectify = request_param('rectify', str(RECTIFY_BOARD)).lower() == 'true'
+        engine = request_param('engine', ENGINE)
+        cascade = request_param('cascade', str(CASCADE_ENABLED)).lower() == 'true'
+        tiling = request_param('tiling', str(TILING_ENABLED)).lower() == 'true'
+        mosaic = request_param('mosaic', str(MOSAIC_ENABLED)).lower() == 'true'
+        
+        # Budget de latence : modèle ou membres de l'ensemble choisis selon leurs coûts mesurés
+        routing = None
+        if budget_ms is not None:
+            routing = model_costs.plan(requested_model, budget_ms, loaded_models(),
+                                       RECTIFIED_IMGSZ if rectify else None)
+            requested_model = routing.model
         
         # Récupérer l'image depuis différentes sources
-        image = None
+        # (lecture par blocs : en-tête, taille et dimensions vérifiés dès les premiers octets)
+        
+        # 1. Corps brut : pas d'analyse multipart
+        if is_raw_image_body():
+            ingested = ingest_chunks(iter_stream(request.stream))
         
-        # 1. Fichier uploadé
-        if 'image' in request.files:
-            file = request.files['image']
-            image_bytes = file.read()
-            image = Image.open(io.BytesIO(image_bytes))
+        # 2. Fichier uploadé (formulaire déjà lu en entier par werkzeug)
+        elif 'image' in request.files:
+            ingested = ingest_chunks(iter_stream(request.files['image'].stream))
         
-        # 2. Image base64
+        # 3. Image base64 (préfixe data:image/...;base64, accepté; chaîne déjà en mémoire)
         elif 'image_base64' in request.form:
-            image_base64 = request.form['image_base64']
-            # Enlever le préfixe data:image/...;base64, si présent
-            if ',' in image_base64:
-                image_base64 = image_base64.split(',')[1]
-            image_bytes = base64.b64decode(image_base64)
-            image = Image.open(io.BytesIO(image_bytes))
+            ingested = ingest_chunks(iter_base64(request.form['image_base64']))
         
-        # 3. URL d'image (à implémenter si nécessaire)
-        elif 'image_url' in request.form:
-            return jsonify({
-                'error': 'Non implémenté',
-                'message': 'Le téléchargement depuis URL n\'est pas encore supporté'
-            }), 501
+        # 4. URL d'image (téléchargée en flux via le pool de connexions)
+        elif request_param('image_url'):
+            ingested = fetcher.fetch(request_param('image_url'))
         
         else:
             return jsonify({
@@ -286,211 +339,624 @@ def predict():
                 'message': 'Veuillez fournir une image via "image", "image_base64" ou "image_url"'
             }), 400
         
-        # Convertir PIL Image en format compatible OpenCV
-        image_np = np.array(image)
-        if len(image_np.shape) == 2:  # Grayscale
-            image_np = cv2.cvtColor(image_np, cv2.COLOR_GRAY2RGB)
-        elif image_np.shape[2] == 4:  # RGBA
-            image_np = cv2.cvtColor(image_np, cv2.COLOR_RGBA2RGB)
-        
-        image_height, image_width = image_np.shape[:2]
-        
-        # Sauvegarder temporairement l'image
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp_file:
-            tmp_path = tmp_file.name
-            cv2.imwrite(tmp_path, cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR))
-        
-        # Choisir le modèle à utiliser
-        detections = []
-        
-        if requested_model == 'ensemble' and (model_gear or model_haki or model_kaido):
-            # Mode ensemble : utiliser Gear + Haki + Kaido
-            detections = predict_ensemble(tmp_path, conf_threshold)
-        elif requested_model == 'kaido' and model_kaido:
-            # Utiliser Kaido
-            detections = predict_with_model(model_kaido, tmp_path, conf_threshold)
-        elif requested_model == 'haki' and model_haki:
-            # Utiliser Haki
-            detections = predict_with_model(model_haki, tmp_path, conf_threshold)
-        elif requested_model == 'gear' and model_gear:
-            # Utiliser Gear
-            detections = predict_with_model(model_gear, tmp_path, conf_threshold)
-        elif model_kaido:
-            # Fallback sur Kaido si disponible
-            detections = predict_with_model(model_kaido, tmp_path, conf_threshold)
-        elif model_haki:
-            # Fallback sur Haki si disponible
-            detections = predict_with_model(model_haki, tmp_path, conf_threshold)
-        elif model_gear:
-            # Fallback sur Gear
-            detections = predict_with_model(model_gear, tmp_path, conf_threshold)
-        
-        # Nettoyer le fichier temporaire
-        os.unlink(tmp_path)
-        
-        # Calculer la confiance moyenne
-        confidences = [d['confidence'] for d in detections]
-        avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-        
-        # Convertir en FEN
-        fen = pieces_to_fen(detections, image_width, image_height)
-        
-        # Préparer la réponse
-        response = {
-            'success': True,
-            'fen': fen,
-            'pieces': detections,
-            'confidence': round(avg_confidence, 3),
-            'detectedPieces': len(detections),
-            'description': f'Position détectée avec {len(detections)} pièces',
-            'model_used': requested_model,
-            'imageSize': {
-                'width': image_width,
-                'height': image_height
-            },
-            'warnings': []
-        }
-        
-        # Ajouter des avertissements si nécessaire
-        if avg_confidence < 0.8:
-            response['warnings'].append('Confiance faible - vérifiez la qualité de l\'image')
-        
-        if len(detections) < 2:
-            response['warnings'].append('Peu de pièces détectées - vérifiez que l\'échiquier est visible')
-        
+        # Même image (upload, base64 ou URL) et mêmes paramètres : résultat en cache
+        key = request_key(ingested.digest, requested_model, conf_threshold,
+                          rectify=rectify, engine=engine, cascade=cascade, tiling=tiling, mosaic=mosaic)
+        response = result_cache.get(key)
+        if response is None:
+            # Pré-filtre rapide : pas d'échiquier, pas de passe YOLO
+            if PREFILTER_ENABLED and request_param('prefilter', 'true').lower() != 'false':
+                check = check_board(np.asarray(ingested.image.convert('L')))
+                if not check.accepted:
+                    return jsonify(board_not_found(check)), 422
+            
+            # Les copies simultanées d'une même requête (retries mobiles) attendent
+            # le calcul déjà en cours au lieu de relancer les modèles
+            response, shared = inflight.do(
+                key, analyze_image, ingested.image, requested_model, conf_threshold, lane, rectify, engine,
+                cascade, tiling, mosaic
+            )
+            if not shared:
+                result_cache.put(key, response)
+        if routing is not None:
+            response = dict(response, routing=routing.to_dict())
+            if routing.fits is False:
+                response['warnings'] = response['warnings'] + [
+                    f'Aucun modèle ne tient dans {routing.budget_ms:g} ms - modèle le plus rapide utilisé'
+                ]
         return jsonify(response)
     
+    except IngestError as e:
+        return jsonify(e.to_dict()), e.status
+    
+    except RequestEntityTooLarge:
+        return request_too_large()
+    
     except Exception as e:
         return jsonify({
             'error': 'Erreur lors de la prédiction',
             'message': str(e)
         }), 500
 
-def predict_with_model(model, image_path, conf_threshold):
-    """Effectue une prédiction avec un modèle unique"""
-    results = model.predict(
-        source=image_path,
-        conf=conf_threshold,
-        save=False,
-        verbose=False
+def analyze_image(image, requested_model, conf_threshold, lane='interactive', rectify=False,
+                  engine='detection', cascade=False, tiling=False, mosaic=False):
+    """
+    Exécute la détection sur une image PIL et construit la réponse de /predict
+    
+    Avec `rectify`, l'échiquier est localisé puis redressé : la détection
+    tourne sur le plateau redressé (imgsz réduit) et les cases sont déduites
+    de l'homographie. Sans plateau localisé, on revient à l'image entière.
+    
+    Avec engine='squares', les 64 cases de l'échiquier localisé sont classées
+    en une passe par le classifieur de cases (pas de détection d'objets).
+    
+    Avec engine='glyphs', les cases sont reconnues par leur empreinte dans
+    l'index de glyphes; seules les cases inconnues passent par Haki.
+    
+    Avec `cascade`, la détection YOLO tourne d'abord à CASCADE_LOW_IMGSZ et n'est
+    relancée à pleine résolution que si cette passe n'est pas concluante.
+    
+    Avec `tiling`, une grande image (ou un grand échiquier redressé, à sa
+    résolution native) est découpée en tuiles qui se recouvrent, détectées en
+    un seul lot; les petites images suivent le chemin habituel.
+    
+    Avec `mosaic`, une petite image (sans plateau redressé) est assemblée avec
+    celles des requêtes simultanées dans un canevas commun (micro-lot).
+    """
+    if image.mode not in ('RGB', 'RGBA', 'L'):  # Palette, CMYK, 16 bits...
+        image = image.convert('RGB')
+    
+    # Convertir PIL Image en format compatible OpenCV
+    image_np = np.array(image)
+    if len(image_np.shape) == 2:  # Grayscale
+        image_np = cv2.cvtColor(image_np, cv2.COLOR_GRAY2RGB)
+    elif image_np.shape[2] == 4:  # RGBA
+        image_np = cv2.cvtColor(image_np, cv2.COLOR_RGBA2RGB)
+    
+    image_height, image_width = image_np.shape[:2]
+    image_bgr = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
+    
+    use_squares = engine == 'squares' and square_classifier is not None
+    use_glyphs = engine == 'glyphs'
+    board = locate_board(image_bgr) if rectify or use_squares or use_glyphs else None
+    
+    if use_glyphs and board is not None:
+        detections, glyph_stats = analyze_glyphs(image_bgr, board, conf_threshold, lane)
+        response = build_prediction_response(detections, image_width, image_height, 'glyphs', board)
+        response['engine'] = 'glyphs'
+        response['glyphs'] = glyph_stats
+        return response
+    
+    if use_squares and board is not None:
+        detections = scheduler.run(
+            lane, square_classifier.predict_boards, [image_bgr], [board], conf_threshold
+        )[0]
+        response = build_prediction_response(detections, image_width, image_height, 'squares', board)
+        response['engine'] = 'squares'
+        return response
+    
+    if tiling:
+        response = analyze_tiled(image_bgr, board, requested_model, conf_threshold, lane)
+        if response is not None:
+            return response
+    
+    if board is not None:
+        crop, warp = rectify_board(image_bgr, board)
+        
+        def detect(imgsz):
+            return map_detections(
+                scheduler.run(lane, run_detection, [crop], requested_model, conf_threshold, imgsz)[0], warp
+            )
+        
+        if cascade:
+            result = run_cascade(detect, image_width, image_height, board.homography,
+                                 min(CASCADE_LOW_IMGSZ, RECTIFIED_IMGSZ), RECTIFIED_IMGSZ)
+            response = build_prediction_response(result.detections, image_width, image_height,
+                                                  requested_model, board, result.fen_result)
+            response['resolution'] = result.to_dict()
+        else:
+            response = build_prediction_response(detect(RECTIFIED_IMGSZ), image_width, image_height,
+                                                  requested_model, board)
+        if engine == 'squares':
+            response['warnings'].append('Classifieur de cases non chargé - détection YOLO utilisée')
+        return response
+    
+    if mosaic and not cascade and fits_mosaic(image_width, image_height):
+        detections = mosaic_batcher.run(image_bgr, (requested_model, conf_threshold, lane))
+        response = build_prediction_response(detections, image_width, image_height, requested_model)
+        response['mosaic'] = True
+        return response
+    
+    # Sauvegarder temporairement l'image
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp_file:
+        tmp_path = tmp_file.name
+        cv2.imwrite(tmp_path, image_bgr)
+    
+    def detect(imgsz=None):
+        # Détection avec le modèle demandé (ou ensemble), via la file de priorité
+        return scheduler.run(lane, run_detection, [tmp_path], requested_model, conf_threshold, imgsz)[0]
+    
+    try:
+        if cascade:
+            result = run_cascade(detect, image_width, image_height)
+        else:
+            detections = detect()
+    finally:
+        # Nettoyer le fichier temporaire
+        os.unlink(tmp_path)
+    
+    if cascade:
+        response = build_prediction_response(result.detections, image_width, image_height, requested_model,
+                                              fen_result=result.fen_result)
+        response['resolution'] = result.to_dict()
+    else:
+        response = build_prediction_response(detections, image_width, image_height, requested_model)
+    if engine in ('squares', 'glyphs'):
+        response['warnings'].append(
+            f'Moteur {engine} indisponible pour cette image - détection YOLO utilisée'
+        )
+    elif rectify:
+        response['warnings'].append('Échiquier non localisé - détection sur l\'image entière')
+    return response
+
+def analyze_tiled(image_bgr, board, requested_model, conf_threshold, lane='interactive'):
+    """
+    Détection par tuiles de l'image, ou de l'échiquier redressé à sa résolution native
+    
+    Returns:
+        dict | None: Réponse de /predict, ou None si l'image est assez petite
+                     pour une seule passe
+    """
+    image_height, image_width = image_bgr.shape[:2]
+    
+    def detect_batch(sources, imgsz):
+        return scheduler.run(lane, run_detection, sources, requested_model, conf_threshold, imgsz)
+    
+    if board is not None:
+        size = min(board_side(board, RECTIFY_MARGIN_SQUARES), TILE_MAX_BOARD_PX)
+        if not needs_tiling(size, size):
+            return None
+        crop, warp = rectify_board(image_bgr, board, size)
+        detections, tiles = detect_tiled(crop, detect_batch, square_px=size / (8 + 2 * RECTIFY_MARGIN_SQUARES))
+        detections = map_detections(detections, warp)
+    else:
+        if not needs_tiling(image_width, image_height):
+            return None
+        detections, tiles = detect_tiled(image_bgr, detect_batch)
+    
+    response = build_prediction_response(detections, image_width, image_height, requested_model, board)
+    response['tiles'] = tiles
+    return response
+
+def analyze_glyphs(image_bgr, board, conf_threshold, lane='interactive'):
+    """
+    Reconnaît les cases d'un diagramme via l'index de glyphes
+    
+    Les cases dont l'empreinte est inconnue sont prédites par Haki sur le
+    plateau redressé; ses prédictions confiantes (et les cases où son meilleur
+    score reste sous GLYPH_EMPTY_MAX_CONF, apprises comme vides) enrichissent
+    l'index pour les images suivantes du même thème.
+    
+    Returns:
+        tuple: (détections, statistiques {'known', 'unknown', 'learned'})
+    """
+    hashes = square_hashes(image_bgr, board)
+    names, confidences = glyph_index.lookup(hashes)
+    unknown = [square for square, name in enumerate(names) if name is None]
+    detections = squares_to_detections(
+        [name or 'empty' for name in names], confidences, board, conf_threshold
     )
     
-    detections = []
-    for result in results:
-        boxes = result.boxes
-        for i, box in enumerate(boxes):
-            x1, y1, x2, y2 = box.xyxy[0].tolist()
-            class_id = int(box.cls[0])
-            confidence = float(box.conf[0])
-            class_name = result.names[class_id]
-            
-            # Normaliser le nom de classe (remplacer _ par -)
-            class_name = class_name.replace('_', '-')
-            
-            detections.append({
-                'id': len(detections) + 1,
-                'class': class_name,
-                'confidence': round(confidence, 3),
-                'bbox': {
-                    'x1': round(x1, 2),
-                    'y1': round(y1, 2),
-                    'x2': round(x2, 2),
-                    'y2': round(y2, 2),
-                    'width': round(x2 - x1, 2),
-                    'height': round(y2 - y1, 2)
-                }
-            })
-    
-    return detections
-
-def predict_ensemble(image_path, conf_threshold):
+    learned = 0
+    if unknown:
+        crop, warp = rectify_board(image_bgr, board)
+        haki = scheduler.run(
+            lane, run_detection, [crop], 'haki', min(conf_threshold, GLYPH_HAKI_CONF), RECTIFIED_IMGSZ
+        )[0]
+        haki = map_detections(haki, warp)
+        
+        # Détection la plus confiante de chaque case inconnue
+        best = {}
+        for det, square in zip(haki, detection_squares(haki, board.homography)):
+            if names[square] is None and det['confidence'] > best.get(square, {}).get('confidence', -1):
+                best[square] = det
+        
+        learn_squares, learn_names = [], []
+        for square in unknown:
+            det = best.get(square)
+            if det is None or det['confidence'] < GLYPH_EMPTY_MAX_CONF:
+                learn_squares.append(square)
+                learn_names.append('empty')
+                continue
+            if det['confidence'] >= conf_threshold:
+                detections.append({**det, 'id': len(detections) + 1})
+            if det['confidence'] >= GLYPH_LEARN_CONF and det['class'] in GLYPH_CLASSES:
+                learn_squares.append(square)
+                learn_names.append(det['class'])
+        
+        if learn_squares:
+            learned = glyph_index.learn(hashes[learn_squares], learn_names)
+    
+    return detections, {'known': 64 - len(unknown), 'unknown': len(unknown), 'learned': learned}
+
+def build_prediction_response(detections, image_width, image_height, requested_model, board=None,
+                              fen_result=None):
+    """
+    Construit la réponse de prédiction (FEN, pièces, confiance, avertissements)
+    
+    `board` (BoardLocation) donne l'homographie utilisée pour placer les pièces
+    sur les cases; ses coins sont renvoyés dans la réponse. `fen_result` évite
+    de recalculer la FEN quand elle a déjà été construite pour tout un lot.
+    """
+    # Calculer la confiance moyenne
+    confidences = [d['confidence'] for d in detections]
+    avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+    
+    # Convertir en FEN (une pièce par case : la plus confiante)
+    if fen_result is None:
+        fen_result = build_fen(detections, image_width, image_height,
+                               board.homography if board is not None else None)
+    fen = fen_result.fen
+    
+    # Préparer la réponse
+    response = {
+        'success': True,
+        'fen': fen,
+        'pieces': detections,
+        'confidence': round(avg_confidence, 3),
+        'detectedPieces': len(detections),
+        'description': f'Position détectée avec {len(detections)} pièces',
+        'model_used': requested_model,
+        'imageSize': {
+            'width': image_width,
+            'height': image_height
+        },
+        'warnings': []
+    }
+    if board is not None:
+        response['board'] = board.to_dict()
+    if fen_result.conflicts:
+        response['conflicts'] = fen_result.conflicts
+        response['warnings'].append(
+            f'{len(fen_result.conflicts)} case(s) avec plusieurs pièces - la plus confiante est conservée'
+        )
+    
+    # Ajouter des avertissements si nécessaire
+    if avg_confidence < 0.8:
+        response['warnings'].append('Confiance faible - vérifiez la qualité de l\'image')
+    
+    if len(detections) < 2:
+        response['warnings'].append('Peu de pièces détectées - vérifiez que l\'échiquier est visible')
+    
+    return response
+
+def run_detection(sources, requested_model, conf_threshold, imgsz=None):
+    """
+    Exécute la détection sur un lot d'images avec le modèle demandé
+    
+    Args:
+        sources: Liste de chemins d'images ou de tableaux BGR
+        requested_model: 'gear', 'haki', 'kaido', 'ensemble' ou des membres
+                         d'ensemble choisis par le routage ('gear+haki')
+        conf_threshold: Seuil de confiance
+        imgsz: Taille d'entrée des modèles (optionnel, défaut du modèle)
+    
+    Returns:
+        list: Détections pour chaque image de `sources`
+    """
+    if requested_model == 'ensemble' and (model_gear or model_haki or model_kaido):
+        # Mode ensemble : utiliser Gear + Haki + Kaido
+        return predict_ensemble(sources, conf_threshold, imgsz)
+    
+    if '+' in requested_model:
+        # Ensemble réduit au budget de latence
+        return predict_ensemble(sources, conf_threshold, imgsz, requested_model.split('+'))
+    
+    requested = {'kaido': model_kaido, 'haki': model_haki, 'gear': model_gear}.get(requested_model)
+    # Fallback sur Kaido, puis Haki, puis Gear si le modèle demandé n'est pas disponible
+    model = requested or model_kaido or model_haki or model_gear
+    return predict_batch_with_model(model, sources, conf_threshold, imgsz)
+
+def predict_ensemble(sources, conf_threshold, imgsz=None, members=None):
     """
     Prédiction ensemble combinant Gear et Haki
     - Gear: Précis pour toutes les pièces
     - Haki: Spécialisé pour les pièces stratégiques (King, Queen, Rook, Bishop)
     - Kaido: Polyvalent avec excellentes performances sur tous les styles
-    """
-    strategic_pieces = [
-        'king', 'queen', 'rook', 'bishop',
-        'black-king', 'black-queen', 'black-rook', 'black-bishop',
-        'white-king', 'white-queen', 'white-rook', 'white-bishop'
-    ]
     
-    all_detections = []
+    Chaque modèle traite le lot complet en une passe, puis les détections
+    sont fusionnées image par image. `members` restreint l'ensemble à
+    certains modèles (routage selon le budget de latence).
+    """
+    per_model = []
+    members = members or ['gear', 'haki', 'kaido']
     
     # 1. Prédictions Gear (toutes les pièces)
-    if model_gear:
-        gear_detections = predict_with_model(model_gear, image_path, conf_threshold)
-        all_detections.append(('gear', gear_detections))
+    if model_gear and 'gear' in members:
+        per_model.append(('gear', predict_batch_with_model(model_gear, sources, conf_threshold, imgsz)))
     
     # 2. Prédictions Haki (pièces stratégiques)
-    if model_haki:
-        haki_detections = predict_with_model(model_haki, image_path, conf_threshold)
-        all_detections.append(('haki', haki_detections))
+    if model_haki and 'haki' in members:
+        per_model.append(('haki', predict_batch_with_model(model_haki, sources, conf_threshold, imgsz)))
     
     # 3. Prédictions Kaido (polyvalent - haute précision)
-    if model_kaido:
-        kaido_detections = predict_with_model(model_kaido, image_path, conf_threshold)
-        all_detections.append(('kaido', kaido_detections))
+    if model_kaido and 'kaido' in members:
+        per_model.append(('kaido', predict_batch_with_model(model_kaido, sources, conf_threshold, imgsz)))
     
     # 4. Combiner intelligemment avec NMS (Non-Maximum Suppression)
-    final_detections = []
-    
-    def boxes_overlap(box1, box2, threshold=0.5):
-        """Vérifie si deux boîtes se chevauchent (IoU)"""
-        x1_min, y1_min = box1['x1'], box1['y1']
-        x1_max, y1_max = box1['x2'], box1['y2']
-        x2_min, y2_min = box2['x1'], box2['y1']
-        x2_max, y2_max = box2['x2'], box2['y2']
-        
-        # Calculer l'intersection
-        x_overlap = max(0, min(x1_max, x2_max) - max(x1_min, x2_min))
-        y_overlap = max(0, min(y1_max, y2_max) - max(y1_min, y2_min))
-        intersection = x_overlap * y_overlap
-        
-        # Calculer les aires
-        area1 = (x1_max - x1_min) * (y1_max - y1_min)
-        area2 = (x2_max - x2_min) * (y2_max - y2_min)
-        union = area1 + area2 - intersection
-        
-        return intersection / union > threshold if union > 0 else False
-    
-    # Fusionner les détections de tous les modèles
-    all_dets = []
-    for model_name, detections in all_detections:
-        for det in detections:
-            det['source_model'] = model_name
-            all_dets.append(det)
-    
-    # Trier par confiance décroissante
-    all_dets.sort(key=lambda x: x['confidence'], reverse=True)
-    
-    # NMS: garder les détections les plus confiantes et supprimer les chevauchements
-    used_positions = []
-    for det in all_dets:
-        overlaps = False
-        for used_det in final_detections:
-            if boxes_overlap(det['bbox'], used_det['bbox'], threshold=0.3):
-                overlaps = True
-                # Si c'est Haki et c'est une pièce stratégique, on peut remplacer
-                if (det['source_model'] == 'haki' and 
-                    det['class'].lower() in strategic_pieces and
-                    det['confidence'] > used_det['confidence']):
-                    final_detections.remove(used_det)
-                    overlaps = False
-                break
-        
-        if not overlaps:
-            final_detections.append(det)
+    return [
+        merge_ensemble_detections([(name, batch[i]) for name, batch in per_model])
+        for i in range(len(sources))
+    ]
+
+def loaded_models():
+    """Modèles chargés, dans l'ordre de l'ensemble"""
+    loaded = {'gear': model_gear, 'haki': model_haki, 'kaido': model_kaido}
+    return [name for name, model in loaded.items() if model is not None]
+
+def run_mosaic(canvases, key):
+    """Passe de modèle d'un micro-lot de mosaïques (key = modèle, seuil, voie)"""
+    requested_model, conf_threshold, lane = key
+    return scheduler.run(lane, run_detection, canvases, requested_model, conf_threshold,
+                         MOSAIC_GRID * MOSAIC_CELL)
+
+def request_param(name, default=None):
+    """Paramètre de formulaire, ou de query string pour les corps bruts"""
+    return request.form.get(name) or request.args.get(name, default)
+
+def is_raw_image_body():
+    """Vrai si le corps de la requête est l'image elle-même (sans multipart)"""
+    content_type = (request.mimetype or '').lower()
+    return content_type == 'application/octet-stream' or content_type.startswith('image/')
+
+def board_not_found(check):
+    """Erreur retournée quand le pré-filtre ne trouve pas d'échiquier"""
+    return {
+        'error': 'Aucun échiquier détecté',
+        'message': check.reason,
+        'prefilter': check.to_dict()
+    }
+
+def request_too_large():
+    """Réponse 413 pour un corps de requête au-delà de la limite de l'endpoint"""
+    limit_mb = request.max_content_length / (1024 * 1024)
+    return jsonify({
+        'error': 'Requête trop volumineuse',
+        'message': f'Taille maximale de la requête: {limit_mb:.0f} Mo'
+    }), 413
+
+def request_lane(default):
+    """Voie de priorité demandée via l'en-tête X-Priority ou le champ 'priority'"""
+    requested = request.headers.get('X-Priority') or request_param('priority')
+    return scheduler.resolve_lane(requested, default)
+
+def process_job_batch(images, requested_model, conf_threshold, lane='batch'):
+    """
+    Traite un lot d'images d'un job asynchrone (décodage, détection, FEN)
     
-    # Réassigner les IDs
-    for i, det in enumerate(final_detections):
-        det['id'] = i + 1
+    Le décodage se fait dans le thread des jobs; seule la passe des modèles
+    passe par l'ordonnanceur, dans la voie du job. Les images déjà analysées
+    (même contenu, mêmes paramètres) sont servies par le cache de résultats.
     
-    return final_detections
+    Returns:
+        list: Un résultat par image (même format que /predict, ou une erreur)
+    """
+    results = [None] * len(images)
+    decoded = []
+    for i, image_bytes in enumerate(images):
+        key = request_key(hashlib.sha256(image_bytes).hexdigest(), requested_model, conf_threshold,
+                          rectify=False, engine='detection', cascade=False, tiling=False,
+                          mosaic=False)
+        results[i] = result_cache.get(key)
+        if results[i] is not None:
+            continue
+        try:
+            image = decode_image(image_bytes)
+        except Exception as e:
+            results[i] = {'error': 'Image invalide', 'message': str(e)}
+            continue
+        if PREFILTER_ENABLED:
+            check = check_board(image)
+            if not check.accepted:
+                results[i] = board_not_found(check)
+                continue
+        decoded.append((i, key, image))
+    
+    if decoded:
+        batch_detections = scheduler.run(
+            lane, run_detection, [image for _, _, image in decoded], requested_model, conf_threshold
+        )
+        sizes = [(image.shape[1], image.shape[0]) for _, _, image in decoded]
+        fen_results = build_fens(batch_detections, sizes)
+        for (i, key, _), detections, (image_width, image_height), fen_result in zip(
+                decoded, batch_detections, sizes, fen_results):
+            results[i] = build_prediction_response(
+                detections, image_width, image_height, requested_model, fen_result=fen_result
+            )
+            result_cache.put(key, results[i])
+    
+    return results
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Soumet un lot d'images pour un traitement asynchrone
+    
+    Accepte (multipart/form-data):
+    - images: un ou plusieurs fichiers image
+    - image_urls: une ou plusieurs URLs d'images (champ répété ou une URL par ligne),
+      téléchargées pendant le traitement des lots précédents
+    - conf: seuil de confiance (optionnel, défaut 0.25)
+    - model: 'gear', 'haki', 'kaido' ou 'ensemble' (optionnel)
+    - priority (ou en-tête X-Priority): 'batch' (défaut) ou 'background'
+    
+    Retourne (202): job_id et URL de suivi
+    """
+    if model_gear is None and model_haki is None and model_kaido is None:
+        return jsonify({
+            'error': 'Modèle non chargé',
+            'message': 'Aucun modèle YOLO n\'a pu être chargé'
+        }), 500
+    
+    try:
+        files = request.files.getlist('images') + request.files.getlist('image')
+        urls = [url.strip() for field in request.form.getlist('image_urls')
+                for url in field.splitlines() if url.strip()]
+    except RequestEntityTooLarge:
+        return request_too_large()
+    if not files and not urls:
+        return jsonify({
+            'error': 'Aucune image fournie',
+            'message': 'Veuillez fournir une ou plusieurs images via "images" ou "image_urls"'
+        }), 400
+    
+    if len(files) + len(urls) > JOBS_MAX_IMAGES:
+        return jsonify({
+            'error': 'Trop d\'images',
+            'message': f'Un job accepte au maximum {JOBS_MAX_IMAGES} images'
+        }), 413
+    
+    try:
+        conf_threshold = float(request.form.get('conf', 0.25))
+    except ValueError:
+        return jsonify({
+            'error': 'Paramètre invalide',
+            'message': 'conf doit être un nombre'
+        }), 400
+    requested_model = request.form.get('model', MODEL_TYPE)
+    lane = request_lane('batch')
+    if lane == 'interactive':
+        # Les jobs ne doivent pas concurrencer le trafic interactif
+        lane = 'batch'
+    
+    # Chaque fichier est vérifié (format, taille, dimensions) avant d'être mis en file
+    images = []
+    for file in files:
+        try:
+            ingested = ingest_chunks(iter_stream(file.stream), decode=False)
+        except IngestError as e:
+            error = e.to_dict()
+            error['message'] = f'{file.filename}: {e.message}'
+            return jsonify(error), e.status
+        images.append((file.filename, ingested.data))
+    
+    for url in urls:
+        try:
+            check_url(url)
+        except IngestError as e:
+            error = e.to_dict()
+            error['message'] = f'{url}: {e.message}'
+            return jsonify(error), e.status
+    
+    job_id = job_store.create_job(images, requested_model, conf_threshold, priority=lane, urls=urls)
+    job_runner.notify()
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': 'queued',
+        'priority': lane,
+        'total': len(images) + len(urls),
+        'status_url': f'/jobs/{job_id}',
+        'expires_in': JOBS_TTL_SECONDS
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Progression et résultats d'un job
+    
+    Paramètres (query):
+    - results: 'false' pour ne retourner que la progression
+    """
+    include_results = request.args.get('results', 'true').lower() != 'false'
+    job = job_store.get_job(job_id, include_results=include_results)
+    if job is None:
+        return jsonify({
+            'error': 'Job introuvable',
+            'message': 'Ce job n\'existe pas ou a expiré'
+        }), 404
+    return jsonify(job)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Métriques de l'API: profondeur de file et temps d'attente par voie de priorité
+    
+    Paramètres (query):
+    - format: 'json' (défaut) ou 'prometheus'
+    """
+    if request.args.get('format') == 'prometheus':
+        return Response(metrics.to_prometheus(), mimetype='text/plain; version=0.0.4')
+    return jsonify({
+        'scheduler': scheduler.stats(),
+        **metrics.snapshot()
+    })
+
+def stream_detector(requested_model, conf_threshold, engine, lane):
+    """Fonction de détection d'une connexion /stream (seules les cases modifiées sont demandées)"""
+    if engine == 'squares' and square_classifier is not None:
+        return classifier_detector(
+            square_classifier, conf_threshold,
+            lambda crops: scheduler.run(lane, square_classifier.classify, crops)
+        )
+    return rectified_detector(
+        lambda crop: scheduler.run(lane, run_detection, [crop], requested_model, conf_threshold, RECTIFIED_IMGSZ)[0]
+    )
+
+if sock is not None:
+    @sock.route('/stream')
+    def stream(ws):
+        """
+        Suivi en direct d'un échiquier filmé (WebSocket)
+        
+        Le client envoie des images (messages binaires JPEG/PNG) et reçoit un
+        message JSON {'type': 'position', 'fen', ...} à chaque changement de
+        position. Paramètres (query string) : conf, model, engine, priority.
+        """
+        if not acquire_connection():
+            send_message(ws, 'error', message='Trop de connexions simultanées')
+            return
+        try:
+            conf_threshold = float(request.args.get('conf', 0.25))
+            detect = stream_detector(
+                request.args.get('model', MODEL_TYPE), conf_threshold,
+                request.args.get('engine', ENGINE), request_lane('interactive')
+            )
+            StreamSession(ws, detect).run()
+        finally:
+            release_connection()
 
 # Charger le modèle au démarrage
 load_model()
+load_square_classifier()
+
+# Coûts mesurés des modèles (routage selon budget_ms)
+model_costs = ModelCosts.load()
+
+# Index de glyphes (moteur 'glyphs')
+glyph_index = GlyphIndex()
+load_glyph_index()
+
+# Ordonnanceur d'inférence (voies interactive / batch / background)
+scheduler = InferenceScheduler()
+
+# Micro-lots de petites images assemblées en mosaïques
+mosaic_batcher = MosaicBatcher(run_mosaic)
+
+# Dé-duplication des requêtes /predict identiques en cours
+inflight = SingleFlight('predict.singleflight')
+
+# Cache des résultats par empreinte du contenu (uploads, base64 et URLs)
+result_cache = ResultCache()
+
+# Téléchargement des images par URL (pool de connexions)
+fetcher = ImageFetcher()
+
+# Jobs asynchrones traités en arrière-plan par lots
+job_store = JobStore()
+job_runner = JobRunner(job_store, process_job_batch, batch_size=JOBS_BATCH_SIZE, fetcher=fetcher)
+job_runner.start()
 
 # Pour Vercel, exporter l'app
 # Vercel utilisera cette variable pour gérer les requêtes
@@ -0,0 +1,155 @@
+"""
+Fonctions d'inférence partagées par l'API
+Utilisées par /predict (requêtes synchrones) et par les jobs asynchrones (/jobs)
+"""
+
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Pièces pour lesquelles Haki est prioritaire dans l'ensemble
+STRATEGIC_PIECES = [
+    'king', 'queen', 'rook', 'bishop',
+    'black-king', 'black-queen', 'black-rook', 'black-bishop',
+    'white-king', 'white-queen', 'white-rook', 'white-bishop'
+]
+
+
+def decode_image(image_bytes):
+    """
+    Décode des octets d'image en tableau BGR (format attendu par YOLO/OpenCV)
+
+    Args:
+        image_bytes: Contenu brut du fichier image
+
+    Returns:
+        np.ndarray: Image BGR (hauteur, largeur, 3)
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    image_rgb = np.array(image.convert('RGB'))
+    return cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
+
+
+def predict_batch_with_model(model, sources, conf_threshold, imgsz=None):
+    """
+    Effectue une prédiction sur un lot d'images en une seule passe
+
+    Args:
+        model: Modèle YOLO chargé
+        sources: Liste de chemins d'images ou de tableaux BGR
+        conf_threshold: Seuil de confiance
+        imgsz: Taille d'entrée du modèle (optionnel, défaut du modèle)
+
+    Returns:
+        list: Une liste de détections par image, dans l'ordre de `sources`
+    """
+    kwargs = {'imgsz': imgsz} if imgsz else {}
+    results = model.predict(
+        source=sources,
+        conf=conf_threshold,
+        save=False,
+        verbose=False,
+        **kwargs
+    )
+
+    batch_detections = []
+    for result in results:
+        detections = []
+        for box in result.boxes:
+            x1, y1, x2, y2 = box.xyxy[0].tolist()
+            class_id = int(box.cls[0])
+            confidence = float(box.conf[0])
+            class_name = result.names[class_id]
+
+            # Normaliser le nom de classe (remplacer _ par -)
+            class_name = class_name.replace('_', '-')
+
+            detections.append({
+                'id': len(detections) + 1,
+                'class': class_name,
+                'confidence': round(confidence, 3),
+                'bbox': {
+                    'x1': round(x1, 2),
+                    'y1': round(y1, 2),
+                    'x2': round(x2, 2),
+                    'y2': round(y2, 2),
+                    'width': round(x2 - x1, 2),
+                    'height': round(y2 - y1, 2)
+                }
+            })
+        batch_detections.append(detections)
+
+    return batch_detections
+
+
+def predict_with_model(model, image_path, conf_threshold, imgsz=None):
+    """Effectue une prédiction avec un modèle unique"""
+    return predict_batch_with_model(model, [image_path], conf_threshold, imgsz)[0]
+
+
+def boxes_overlap(box1, box2, threshold=0.5):
+    """Vérifie si deux boîtes se chevauchent (IoU)"""
+    x1_min, y1_min = box1['x1'], box1['y1']
+    x1_max, y1_max = box1['x2'], box1['y2']
+    x2_min, y2_min = box2['x1'], box2['y1']
+    x2_max, y2_max = box2['x2'], box2['y2']
+
+    # Calculer l'intersection
+    x_overlap = max(0, min(x1_max, x2_max) - max(x1_min, x2_min))
+    y_overlap = max(0, min(y1_max, y2_max) - max(y1_min, y2_min))
+    intersection = x_overlap * y_overlap
+
+    # Calculer les aires
+    area1 = (x1_max - x1_min) * (y1_max - y1_min)
+    area2 = (x2_max - x2_min) * (y2_max - y2_min)
+    union = area1 + area2 - intersection
+
+    return intersection / union > threshold if union > 0 else False
+
+
+def merge_ensemble_detections(all_detections):
+    """
+    Combine les détections de plusieurs modèles pour une même image (NMS)
+
+    Args:
+        all_detections: Liste de tuples (nom_du_modèle, détections)
+
+    Returns:
+        list: Détections fusionnées, IDs réassignés
+    """
+    final_detections = []
+
+    # Fusionner les détections de tous les modèles
+    all_dets = []
+    for model_name, detections in all_detections:
+        for det in detections:
+            det['source_model'] = model_name
+            all_dets.append(det)
+
+    # Trier par confiance décroissante
+    all_dets.sort(key=lambda x: x['confidence'], reverse=True)
+
+    # NMS: garder les détections les plus confiantes et supprimer les chevauchements
+    for det in all_dets:
+        overlaps = False
+        for used_det in final_detections:
+            if boxes_overlap(det['bbox'], used_det['bbox'], threshold=0.3):
+                overlaps = True
+                # Si c'est Haki et c'est une pièce stratégique, on peut remplacer
+                if (det['source_model'] == 'haki' and
+                        det['class'].lower() in STRATEGIC_PIECES and
+                        det['confidence'] > used_det['confidence']):
+                    final_detections.remove(used_det)
+                    overlaps = False
+                break
+
+        if not overlaps:
+            final_detections.append(det)
+
+    # Réassigner les IDs
+    for i, det in enumerate(final_detections):
+        det['id'] = i + 1
+
+    return final_detections
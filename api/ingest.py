@@ -0,0 +1,287 @@
+"""
+Ingestion des images en flux avec rejet précoce
+
+Les octets sont lus par blocs. L'en-tête (format et dimensions) est analysé dès
+les premiers octets : les fichiers qui ne sont pas des images, ou les images
+démesurées, sont rejetés avant la lecture complète du flux (pour un corps brut;
+un formulaire multipart ou base64 a déjà été lu par werkzeug). Les blocs sont
+hachés (SHA-256) et transmis au décodeur PIL au fil de l'eau, sans copie
+intermédiaire du fichier complet.
+"""
+
+import base64
+import binascii
+import hashlib
+import os
+import struct
+
+from PIL import ImageFile
+
+MAX_UPLOAD_BYTES = int(float(os.environ.get('MAX_UPLOAD_MB', 10)) * 1024 * 1024)
+MAX_IMAGE_PIXELS = int(float(os.environ.get('MAX_IMAGE_MEGAPIXELS', 40)) * 1_000_000)
+MAX_IMAGE_SIDE = int(os.environ.get('MAX_IMAGE_SIDE', 12000))
+CHUNK_SIZE = 64 * 1024
+
+# Au-delà, on laisse PIL déterminer les dimensions (JPEG avec de gros blocs EXIF)
+SNIFF_LIMIT = 256 * 1024
+
+# Taille maximale d'une requête /predict : image encodée en base64 (+33%) et enveloppe multipart
+MAX_REQUEST_BYTES = MAX_UPLOAD_BYTES * 4 // 3 + 64 * 1024
+
+# Marqueurs JPEG Start Of Frame (hors DHT, JPG et DAC)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class IngestError(Exception):
+    """Image refusée à l'ingestion (taille, format ou contenu)"""
+
+    def __init__(self, error, message, status=400):
+        super().__init__(message)
+        self.error = error
+        self.message = message
+        self.status = status
+
+    def to_dict(self):
+        return {'error': self.error, 'message': self.message}
+
+
+class IngestedImage:
+    """Image ingérée : image PIL décodée (ou octets bruts) + empreinte du contenu"""
+
+    def __init__(self, digest, format, nbytes, image=None, data=None):
+        self.digest = digest
+        self.format = format
+        self.nbytes = nbytes
+        self.image = image
+        self.data = data
+
+
+def _jpeg_size(head):
+    """Cherche le segment SOF d'un JPEG; retourne (largeur, hauteur) ou None"""
+    pos = 2
+    while pos + 4 <= len(head):
+        if head[pos] != 0xFF:
+            return None
+        marker = head[pos + 1]
+        if marker == 0xFF:  # Octet de remplissage
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        length = struct.unpack('>H', head[pos + 2:pos + 4])[0]
+        if marker in _JPEG_SOF:
+            if pos + 9 > len(head):
+                return None
+            height, width = struct.unpack('>HH', head[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def sniff_image_header(head):
+    """
+    Identifie le format et les dimensions d'une image à partir de ses premiers octets
+
+    Args:
+        head: Premiers octets du fichier (au moins 32 pour PNG/GIF/BMP/WebP)
+
+    Returns:
+        tuple: (format, largeur, hauteur); largeur et hauteur valent None si
+               l'en-tête est reconnu mais que les dimensions ne sont pas
+               encore lisibles. None si ce n'est pas une image supportée.
+    """
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        if len(head) < 24:
+            return 'PNG', None, None
+        width, height = struct.unpack('>II', head[16:24])
+        return 'PNG', width, height
+
+    if head.startswith(b'\xff\xd8\xff'):
+        size = _jpeg_size(head)
+        return ('JPEG',) + (size if size else (None, None))
+
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        if len(head) < 10:
+            return 'GIF', None, None
+        width, height = struct.unpack('<HH', head[6:10])
+        return 'GIF', width, height
+
+    if head.startswith(b'BM'):
+        if len(head) < 26:
+            return 'BMP', None, None
+        width, height = struct.unpack('<ii', head[18:26])
+        return 'BMP', abs(width), abs(height)
+
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        if len(head) < 30:
+            return 'WEBP', None, None
+        chunk = head[12:16]
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', head[26:30])
+            return 'WEBP', width & 0x3FFF, height & 0x3FFF
+        if chunk == b'VP8L':
+            bits = struct.unpack('<I', head[21:25])[0]
+            return 'WEBP', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X':
+            width = int.from_bytes(head[24:27], 'little') + 1
+            height = int.from_bytes(head[27:30], 'little') + 1
+            return 'WEBP', width, height
+        return 'WEBP', None, None
+
+    return None
+
+
+def check_dimensions(width, height, max_pixels=MAX_IMAGE_PIXELS):
+    """Rejette les images vides ou démesurées (IngestError 413)"""
+    if width <= 0 or height <= 0:
+        raise IngestError('Image invalide', f'Dimensions invalides: {width}x{height}', 400)
+    if width > MAX_IMAGE_SIDE or height > MAX_IMAGE_SIDE or width * height > max_pixels:
+        raise IngestError(
+            'Image trop grande',
+            f'{width}x{height} pixels (maximum {max_pixels / 1e6:.0f} Mpx, {MAX_IMAGE_SIDE} px par côté)',
+            413
+        )
+
+
+class ImageIngestor:
+    """
+    Ingestion incrémentale d'une image
+
+    `feed()` reçoit les blocs dans l'ordre et lève IngestError dès que le
+    contenu est refusé; `finish()` retourne l'IngestedImage.
+
+    Args:
+        max_bytes: Taille maximale du fichier
+        max_pixels: Nombre maximal de pixels
+        decode: Décoder l'image au fil de l'eau (sinon conserver les octets bruts)
+    """
+
+    def __init__(self, max_bytes=MAX_UPLOAD_BYTES, max_pixels=MAX_IMAGE_PIXELS, decode=True):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.decode = decode
+        self.nbytes = 0
+        self.format = None
+        self.size = None
+        self._head = bytearray()
+        self._sniffed = False
+        self._hasher = hashlib.sha256()
+        self._parser = ImageFile.Parser() if decode else None
+        self._chunks = None if decode else []
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        self.nbytes += len(chunk)
+        if self.nbytes > self.max_bytes:
+            raise IngestError(
+                'Fichier trop volumineux',
+                f'Taille maximale: {self.max_bytes // (1024 * 1024)} Mo',
+                413
+            )
+
+        if not self._sniffed:
+            self._head += chunk
+            self._sniff(final=False)
+
+        self._hasher.update(chunk)
+        if self.decode:
+            try:
+                self._parser.feed(chunk)
+            except Exception as e:
+                raise IngestError('Image illisible', str(e), 400)
+        else:
+            self._chunks.append(chunk)
+
+    def _sniff(self, final):
+        if len(self._head) < 32 and not final:
+            return
+        header = sniff_image_header(bytes(self._head))
+        if header is None:
+            raise IngestError(
+                'Format non supporté',
+                'Le fichier n\'est pas une image PNG, JPEG, GIF, BMP ou WebP',
+                415
+            )
+        self.format, width, height = header
+        if width is None and not final and len(self._head) < SNIFF_LIMIT:
+            return
+        if width is None and final:
+            # Fichier entier lu sans dimensions : en-tête tronqué
+            raise IngestError('Image illisible', 'Fichier tronqué : dimensions introuvables', 400)
+        if width is not None:
+            check_dimensions(width, height, self.max_pixels)
+            self.size = (width, height)
+        self._sniffed = True
+        self._head = None
+
+    def finish(self):
+        """Termine l'ingestion et retourne l'IngestedImage"""
+        if self.nbytes == 0:
+            raise IngestError('Aucune image fournie', 'Le fichier image est vide', 400)
+        if not self._sniffed:
+            self._sniff(final=True)
+
+        image = None
+        data = None
+        if self.decode:
+            try:
+                image = self._parser.close()
+            except Exception as e:
+                raise IngestError('Image illisible', str(e), 400)
+            # Dimensions réelles (en-têtes non analysés, ex: gros blocs EXIF)
+            check_dimensions(image.width, image.height, self.max_pixels)
+        else:
+            data = b''.join(self._chunks)
+            self._chunks = None
+
+        return IngestedImage(self._hasher.hexdigest(), self.format, self.nbytes, image=image, data=data)
+
+
+def ingest_chunks(chunks, **kwargs):
+    """Ingère une image à partir d'un itérable de blocs d'octets"""
+    ingestor = ImageIngestor(**kwargs)
+    for chunk in chunks:
+        ingestor.feed(chunk)
+    return ingestor.finish()
+
+
+def iter_stream(stream, chunk_size=CHUNK_SIZE):
+    """Lit un flux (fichier uploadé, corps de requête) par blocs"""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def iter_base64(text, chunk_size=CHUNK_SIZE):
+    """
+    Décode une chaîne base64 par blocs (préfixe data:image/...;base64, accepté)
+
+    Les blocs sont alignés sur 4 caractères; les espaces et retours à la
+    ligne sont ignorés.
+    """
+    start = 0
+    comma = text.find(',', 0, 256)
+    if comma >= 0:
+        start = comma + 1
+
+    carry = ''
+    for pos in range(start, len(text), chunk_size):
+        piece = carry + text[pos:pos + chunk_size]
+        piece = ''.join(piece.split())
+        usable = len(piece) - len(piece) % 4
+        carry = piece[usable:]
+        if usable:
+            yield _b64decode(piece[:usable])
+    if carry:
+        yield _b64decode(carry + '=' * (-len(carry) % 4))
+
+
+def _b64decode(text):
+    try:
+        return base64.b64decode(text)
+    except (binascii.Error, ValueError) as e:
+        raise IngestError('Base64 invalide', str(e), 400)
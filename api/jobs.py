@@ -0,0 +1,451 @@
+"""
+Jobs asynchrones pour les soumissions volumineuses (scoresheets, lots de photos de tournoi)
+
+- JobStore : stockage local SQLite des jobs, des images en attente et des résultats,
+  avec expiration (TTL) des jobs terminés. Un job en cours appartient au processus
+  qui l'a réclamé tant que son bail (lease) est renouvelé; un bail expiré (processus
+  arrêté) remet le job en file
+- JobRunner : thread d'arrière-plan qui traite les jobs par lots d'images;
+  les images données par URL du lot suivant sont téléchargées pendant que
+  les modèles traitent le lot courant
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+JOBS_DB_PATH = os.environ.get('JOBS_DB_PATH', os.path.join(tempfile.gettempdir(), 'senchess_jobs.sqlite3'))
+JOBS_TTL_SECONDS = int(os.environ.get('JOBS_TTL_SECONDS', 3600))
+JOBS_BATCH_SIZE = int(os.environ.get('JOBS_BATCH_SIZE', 8))
+JOBS_MAX_IMAGES = int(os.environ.get('JOBS_MAX_IMAGES', 200))
+JOBS_MAX_REQUEST_BYTES = int(float(os.environ.get('JOBS_MAX_REQUEST_MB', 200)) * 1024 * 1024)
+# Durée du bail d'un job en cours, renouvelé toutes les JOBS_LEASE_SECONDS / 3 secondes
+JOBS_LEASE_SECONDS = float(os.environ.get('JOBS_LEASE_SECONDS', 120))
+# Expiration d'un job pas encore terminé : jamais (fixée par finish_job)
+NO_EXPIRY = float('inf')
+FINISHED = ('done', 'failed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    model TEXT NOT NULL,
+    conf REAL NOT NULL,
+    priority TEXT NOT NULL DEFAULT 'batch',
+    total INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    owner TEXT,
+    lease_expires REAL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    name TEXT,
+    status TEXT NOT NULL,
+    image BLOB,
+    url TEXT,
+    result TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs (expires_at);
+"""
+
+
+class JobStore:
+    """Stockage SQLite des jobs et de leurs résultats"""
+
+    def __init__(self, db_path=JOBS_DB_PATH, ttl_seconds=JOBS_TTL_SECONDS, lease_seconds=JOBS_LEASE_SECONDS):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        # Propriétaire des jobs réclamés par ce processus
+        self.owner = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+
+    def _migrate(self):
+        """Ajoute les colonnes manquantes aux bases créées par une version antérieure"""
+        columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        if 'priority' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN priority TEXT NOT NULL DEFAULT 'batch'")
+        if 'owner' not in columns:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN lease_expires REAL')
+        item_columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(job_items)')}
+        if 'url' not in item_columns:
+            self._conn.execute('ALTER TABLE job_items ADD COLUMN url TEXT')
+
+    def create_job(self, images, model, conf, priority='batch', urls=()):
+        """
+        Enregistre un nouveau job
+
+        Args:
+            images: Liste de tuples (nom, octets de l'image)
+            model: Modèle demandé ('gear', 'haki', 'kaido' ou 'ensemble')
+            conf: Seuil de confiance
+            priority: Voie d'ordonnancement ('batch' ou 'background')
+            urls: URLs d'images à télécharger pendant le traitement
+
+        Returns:
+            str: Identifiant du job
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.execute(
+                    'INSERT INTO jobs (id, status, model, conf, priority, total, created_at, updated_at, expires_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (job_id, 'queued', model, conf, priority, len(images) + len(urls),
+                     now, now, NO_EXPIRY)
+                )
+                self._conn.executemany(
+                    'INSERT INTO job_items (job_id, idx, name, status, image, url) VALUES (?, ?, ?, ?, ?, ?)',
+                    [(job_id, i, name, 'pending', sqlite3.Binary(data), None)
+                     for i, (name, data) in enumerate(images)] +
+                    [(job_id, len(images) + i, url, 'pending', None, url)
+                     for i, url in enumerate(urls)]
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return job_id
+
+    def get_job(self, job_id, include_results=True):
+        """Retourne l'état d'un job (et ses résultats), ou None s'il n'existe pas ou a expiré
+
+        Seul un job terminé expire : un job en file ou en cours reste visible.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT * FROM jobs WHERE id = ? AND expires_at > ?', (job_id, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            items = []
+            if include_results:
+                items = self._conn.execute(
+                    'SELECT idx, name, status, result FROM job_items WHERE job_id = ? ORDER BY idx',
+                    (job_id,)
+                ).fetchall()
+
+        job = {
+            'job_id': row['id'],
+            'status': row['status'],
+            'model': row['model'],
+            'conf': row['conf'],
+            'priority': row['priority'],
+            'progress': {
+                'done': row['done'],
+                'total': row['total'],
+                'percent': round(100.0 * row['done'] / row['total'], 1) if row['total'] else 100.0
+            },
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'expires_at': row['expires_at'] if row['status'] in FINISHED else None
+        }
+        if include_results:
+            job['results'] = []
+            for item in items:
+                entry = {'index': item['idx'], 'name': item['name'], 'status': item['status']}
+                if item['result'] is not None:
+                    entry['result'] = json.loads(item['result'])
+                job['results'].append(entry)
+        return job
+
+    def claim_next_job(self):
+        """
+        Passe le plus ancien job en attente à l'état 'running' et le retourne
+
+        BEGIN IMMEDIATE prend le verrou d'écriture de la base avant la lecture :
+        deux processus partageant la base ne peuvent pas réclamer le même job.
+        Le job appartient à ce JobStore (`owner`) jusqu'à l'expiration de son bail.
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    "SELECT id, model, conf, priority FROM jobs WHERE status = 'queued' "
+                    "ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                now = time.time()
+                claimed = row is not None and self._conn.execute(
+                    "UPDATE jobs SET status = 'running', owner = ?, lease_expires = ?, updated_at = ? "
+                    "WHERE id = ? AND status = 'queued'",
+                    (self.owner, now + self.lease_seconds, now, row['id'])
+                ).rowcount == 1
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        if not claimed:
+            return None
+        return {'job_id': row['id'], 'model': row['model'], 'conf': row['conf'], 'priority': row['priority']}
+
+    def renew_lease(self, job_id):
+        """Prolonge le bail d'un job en cours; False s'il n'appartient plus à ce JobStore"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (now + self.lease_seconds, job_id, self.owner)
+            )
+        return cursor.rowcount == 1
+
+    def pending_items(self, job_id, limit, after_idx=-1):
+        """
+        Retourne au plus `limit` images non traitées d'un job, d'index > after_idx
+
+        Returns:
+            list: Tuples (index, octets ou None, URL ou None)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, image, url FROM job_items WHERE job_id = ? AND status = 'pending' AND idx > ? "
+                "ORDER BY idx LIMIT ?",
+                (job_id, after_idx, limit)
+            ).fetchall()
+        return [(row['idx'], bytes(row['image']) if row['image'] is not None else None, row['url'])
+                for row in rows]
+
+    def store_results(self, job_id, results):
+        """
+        Enregistre les résultats d'un lot et libère les images correspondantes
+
+        Args:
+            job_id: Identifiant du job
+            results: Liste de tuples (index, résultat dict); un résultat contenant
+                     la clé 'error' marque l'image en échec
+
+        Seules les images encore en attente sont comptées : une image traitée deux
+        fois (bail repris par un autre processus) ne fait pas dépasser `total`.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                stored = self._conn.executemany(
+                    "UPDATE job_items SET status = ?, result = ?, image = NULL "
+                    "WHERE job_id = ? AND idx = ? AND status = 'pending'",
+                    [('failed' if 'error' in result else 'done', json.dumps(result), job_id, idx)
+                     for idx, result in results]
+                ).rowcount
+                self._conn.execute(
+                    'UPDATE jobs SET done = done + ?, updated_at = ? WHERE id = ?',
+                    (stored, now, job_id)
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def finish_job(self, job_id, status='done', error=None):
+        """
+        Marque un job de ce JobStore comme terminé; les résultats sont conservés pendant le TTL
+
+        Returns:
+            bool: False si le job n'appartient plus à ce JobStore (bail expiré et repris)
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, updated_at = ?, expires_at = ?, lease_expires = NULL '
+                "WHERE id = ? AND owner = ? AND status = 'running'",
+                (status, error, now, now + self.ttl_seconds, job_id, self.owner)
+            )
+        return cursor.rowcount == 1
+
+    def requeue_interrupted(self, now=None):
+        """
+        Remet en file les jobs 'running' dont le bail a expiré (processus arrêté)
+
+        Les jobs d'un processus vivant (bail renouvelé) ne sont pas touchés.
+
+        Returns:
+            int: Nombre de jobs remis en file
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE status = 'running' AND (lease_expires IS NULL OR lease_expires <= ?)",
+                (now, now)
+            )
+        return cursor.rowcount
+
+    def evict_expired(self, now=None):
+        """
+        Supprime les jobs terminés expirés et leurs images/résultats
+
+        Returns:
+            int: Nombre de jobs supprimés
+        """
+        now = time.time() if now is None else now
+        expired = "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND expires_at <= ?"
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.execute(f'DELETE FROM job_items WHERE job_id IN ({expired})', (now,))
+                cursor = self._conn.execute(f'DELETE FROM jobs WHERE id IN ({expired})', (now,))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return cursor.rowcount
+
+
+class JobRunner:
+    """
+    Thread d'arrière-plan qui traite les jobs par lots
+
+    `process_batch(images, model, conf, priority)` reçoit une liste d'octets
+    d'images et doit retourner un résultat (dict) par image, dans le même ordre.
+    Un lot est l'unité de préemption : les requêtes interactives passent devant
+    entre deux lots.
+
+    `fetcher` (ImageFetcher) télécharge les images données par URL : celles du
+    lot suivant sont lancées avant le traitement du lot courant.
+
+    Un thread de battement de cœur renouvelle le bail du job en cours; un job
+    dont le bail a été perdu est abandonné (un autre processus l'a repris).
+    """
+
+    def __init__(self, store, process_batch, batch_size=JOBS_BATCH_SIZE, fetcher=None,
+                 poll_interval=5.0, evict_interval=60.0):
+        self.store = store
+        self.process_batch = process_batch
+        self.fetcher = fetcher
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self.evict_interval = evict_interval
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._heartbeat_thread = None
+        self._current_job = None
+        self._last_eviction = 0.0
+
+    def start(self):
+        """Démarre le thread de traitement (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._requeue_interrupted()
+        self._thread = threading.Thread(target=self._run, name='senchess-jobs', daemon=True)
+        self._thread.start()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat, name='senchess-jobs-heartbeat',
+                                                  daemon=True)
+        self._heartbeat_thread.start()
+
+    def notify(self):
+        """Réveille le thread après la création d'un job"""
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._maybe_evict()
+            job = self.store.claim_next_job()
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._process_job(job)
+
+    def _heartbeat(self):
+        """Renouvelle le bail du job en cours toutes les lease_seconds / 3 secondes"""
+        while True:
+            time.sleep(self.store.lease_seconds / 3)
+            job_id = self._current_job
+            if job_id is not None:
+                try:
+                    self.store.renew_lease(job_id)
+                except Exception as e:
+                    print(f"❌ Erreur lors du renouvellement du bail du job {job_id}: {e}")
+
+    def _requeue_interrupted(self):
+        requeued = self.store.requeue_interrupted()
+        if requeued:
+            print(f"🔁 {requeued} job(s) interrompu(s) remis en file")
+
+    def _maybe_evict(self):
+        now = time.time()
+        if now - self._last_eviction < self.evict_interval:
+            return
+        self._last_eviction = now
+        try:
+            # Jobs d'un processus arrêté (bail expiré)
+            self._requeue_interrupted()
+            evicted = self.store.evict_expired(now)
+            if evicted:
+                print(f"🧹 {evicted} job(s) expiré(s) supprimé(s)")
+        except Exception as e:
+            print(f"❌ Erreur lors de l'éviction des jobs: {e}")
+
+    def _prefetch(self, items):
+        """Lance le téléchargement des images par URL d'un lot"""
+        prepared = []
+        for idx, data, url in items:
+            if data is None and url and self.fetcher is not None:
+                data = self.fetcher.submit(url, decode=False)
+            prepared.append((idx, data))
+        return prepared
+
+    def _process_job(self, job):
+        job_id = job['job_id']
+        self._current_job = job_id
+        try:
+            items = self.store.pending_items(job_id, self.batch_size)
+            prepared = self._prefetch(items)
+            while items:
+                # Téléchargements du lot suivant pendant le traitement du lot courant
+                next_items = self.store.pending_items(job_id, self.batch_size, after_idx=items[-1][0])
+                next_prepared = self._prefetch(next_items)
+
+                ready, results = [], []
+                for idx, data in prepared:
+                    if data is None:
+                        results.append((idx, {'error': 'Image manquante', 'message': 'Aucune source d\'image'}))
+                        continue
+                    if hasattr(data, 'result'):
+                        try:
+                            data = data.result().data
+                        except Exception as e:
+                            error = e.to_dict() if hasattr(e, 'to_dict') else {'error': 'Téléchargement impossible'}
+                            error['message'] = str(e)
+                            results.append((idx, error))
+                            continue
+                    ready.append((idx, data))
+
+                if ready:
+                    batch_results = self.process_batch(
+                        [data for _, data in ready], job['model'], job['conf'], job['priority']
+                    )
+                    results.extend((idx, result) for (idx, _), result in zip(ready, batch_results))
+                self.store.store_results(job_id, results)
+                if not self.store.renew_lease(job_id):
+                    print(f"⚠️ Bail du job {job_id} perdu - job abandonné")
+                    return
+
+                items, prepared = next_items, next_prepared
+            self.store.finish_job(job_id, 'done')
+        except Exception as e:
+            print(f"❌ Erreur lors du traitement du job {job_id}: {e}")
+            self.store.finish_job(job_id, 'failed', str(e))
+        finally:
+            self._current_job = None
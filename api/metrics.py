@@ -0,0 +1,114 @@
+"""
+Registre de métriques en mémoire pour l'API (exporté par GET /metrics)
+
+- Compteurs : nombre d'événements (requêtes, rejets, ...)
+- Jauges : valeurs instantanées lues au moment de l'export (profondeur de file, ...)
+- Durées : nombre, moyenne, max et percentiles sur une fenêtre glissante
+"""
+
+import threading
+from collections import deque
+
+TIMING_WINDOW = 1024
+
+
+class Timing:
+    """Résumé d'une durée (en millisecondes) sur une fenêtre glissante"""
+
+    def __init__(self, window=TIMING_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def summary(self):
+        values = sorted(self.recent)
+
+        def percentile(p):
+            if not values:
+                return 0.0
+            return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 3) if self.count else 0.0,
+            'max': round(self.max, 3),
+            'p50': round(percentile(50), 3),
+            'p95': round(percentile(95), 3),
+            'p99': round(percentile(99), 3)
+        }
+
+
+class MetricsRegistry:
+    """Registre thread-safe de compteurs, jauges et durées"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._timings = {}
+
+    def incr(self, name, value=1):
+        """Incrémente un compteur"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, value_ms):
+        """Enregistre une durée en millisecondes"""
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = self._timings[name] = Timing()
+            timing.observe(value_ms)
+
+    def gauge(self, name, read):
+        """Enregistre une jauge; `read()` est appelée à chaque export"""
+        with self._lock:
+            self._gauges[name] = read
+
+    def counter(self, name):
+        """Valeur courante d'un compteur"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self):
+        """Retourne toutes les métriques sous forme de dict sérialisable en JSON"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            timings = {name: timing.summary() for name, timing in self._timings.items()}
+        return {
+            'counters': counters,
+            'gauges': {name: read() for name, read in gauges.items()},
+            'timings_ms': timings
+        }
+
+    def to_prometheus(self):
+        """Export au format texte Prometheus"""
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric_name(name):
+            return 'senchess_' + name.replace('.', '_').replace('-', '_')
+
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"{metric_name(name)}_total {value}")
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines.append(f"{metric_name(name)} {value}")
+        for name, summary in sorted(snapshot['timings_ms'].items()):
+            base = metric_name(name) + '_ms'
+            for quantile in ('p50', 'p95', 'p99'):
+                lines.append(f'{base}{{quantile="0.{quantile[1:]}"}} {summary[quantile]}')
+            lines.append(f"{base}_count {summary['count']}")
+            lines.append(f"{base}_sum {round(summary['mean'] * summary['count'], 3)}")
+        return '\n'.join(lines) + '\n'
+
+
+# Registre global de l'API
+metrics = MetricsRegistry()
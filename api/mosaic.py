@@ -0,0 +1,165 @@
+"""
+Mosaïque : plusieurs petites images dans une seule passe de modèle
+
+Une capture d'écran de ~400 px est agrandie à 640 par le letterbox de YOLO :
+l'essentiel du tenseur est du remplissage. Les petites images de requêtes
+simultanées sont réduites à MOSAIC_CELL px et assemblées en grille (quatre
+cases de 320 px dans un canevas de 640); une seule passe détecte tout le
+canevas, puis chaque détection est rendue à son image d'après la case où
+tombe son centre.
+
+Le regroupement se fait dans une file de micro-lots (MosaicBatcher) : la
+première image attend au plus MOSAIC_WAIT_MS que d'autres la rejoignent
+(mêmes modèle, seuil et voie de priorité).
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+from metrics import metrics
+
+MOSAIC_ENABLED = os.environ.get('MOSAIC_ENABLED', 'false').lower() == 'true'
+# Plus grand côté d'une image éligible (px)
+MOSAIC_MAX_SIDE = int(os.environ.get('MOSAIC_MAX_SIDE', 480))
+# Côté d'une case de la mosaïque; le canevas fait MOSAIC_GRID x MOSAIC_CELL
+MOSAIC_CELL = int(os.environ.get('MOSAIC_CELL', 320))
+MOSAIC_GRID = int(os.environ.get('MOSAIC_GRID', 2))
+# Attente maximale d'une image avant le départ du micro-lot (ms)
+MOSAIC_WAIT_MS = float(os.environ.get('MOSAIC_WAIT_MS', 15))
+# Canevas maximum par passe de modèle
+MOSAIC_MAX_CANVASES = int(os.environ.get('MOSAIC_MAX_CANVASES', 2))
+
+PAD_VALUE = 114  # Gris du letterbox YOLO
+
+
+def fits_mosaic(width, height):
+    return max(width, height) <= MOSAIC_MAX_SIDE
+
+
+def pack(images, cell=MOSAIC_CELL, grid=MOSAIC_GRID):
+    """
+    Assemble jusqu'à grid x grid images dans un canevas
+
+    Returns:
+        tuple: (canevas BGR, placements (x, y, échelle, largeur, hauteur) de chaque image)
+    """
+    canvas = np.full((grid * cell, grid * cell, 3), PAD_VALUE, dtype=np.uint8)
+    placements = []
+    for i, image in enumerate(images):
+        height, width = image.shape[:2]
+        scale = min(cell / width, cell / height)
+        resized = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                             interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+        x, y = (i % grid) * cell, (i // grid) * cell
+        canvas[y:y + resized.shape[0], x:x + resized.shape[1]] = resized
+        placements.append((x, y, scale, width, height))
+    return canvas, placements
+
+
+def split(detections, placements, cell=MOSAIC_CELL, grid=MOSAIC_GRID):
+    """Rend les détections du canevas à chaque image (coordonnées d'origine)"""
+    per_image = [[] for _ in placements]
+    for det in detections:
+        box = det['bbox']
+        center_x, center_y = (box['x1'] + box['x2']) / 2, (box['y1'] + box['y2']) / 2
+        index = int(center_y // cell) * grid + int(center_x // cell)
+        if not 0 <= index < len(placements):
+            continue
+        x, y, scale, width, height = placements[index]
+        x1 = min(max((box['x1'] - x) / scale, 0), width)
+        y1 = min(max((box['y1'] - y) / scale, 0), height)
+        x2 = min(max((box['x2'] - x) / scale, 0), width)
+        y2 = min(max((box['y2'] - y) / scale, 0), height)
+        if x2 <= x1 or y2 <= y1:
+            continue  # Dans le remplissage
+        per_image[index].append({
+            **det,
+            'id': len(per_image[index]) + 1,
+            'bbox': {
+                'x1': round(x1, 2),
+                'y1': round(y1, 2),
+                'x2': round(x2, 2),
+                'y2': round(y2, 2),
+                'width': round(x2 - x1, 2),
+                'height': round(y2 - y1, 2)
+            }
+        })
+    return per_image
+
+
+class MosaicBatcher:
+    """
+    File de micro-lots : regroupe les petites images en mosaïques
+
+    `run_canvases(canevas, key)` exécute une passe de modèle sur une liste de
+    canevas et retourne les détections de chacun; `key` identifie le groupe
+    (modèle, seuil, voie) commun aux images d'un lot.
+    """
+
+    def __init__(self, run_canvases, max_wait_ms=MOSAIC_WAIT_MS, grid=MOSAIC_GRID,
+                 max_canvases=MOSAIC_MAX_CANVASES):
+        self.run_canvases = run_canvases
+        self.max_wait = max_wait_ms / 1000
+        self.grid = grid
+        self.capacity = grid * grid * max_canvases
+        self._condition = threading.Condition()
+        self._pending = {}  # key -> [(image, future, enqueued_at)]
+        metrics.gauge('mosaic.images_per_pass', self._images_per_pass)
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    @staticmethod
+    def _images_per_pass():
+        passes = metrics.counter('mosaic.passes')
+        return round(metrics.counter('mosaic.images') / passes, 2) if passes else 0.0
+
+    def submit(self, image, key):
+        """Ajoute une image au micro-lot de son groupe; Future des détections"""
+        future = Future()
+        with self._condition:
+            self._pending.setdefault(key, []).append((image, future, time.perf_counter()))
+            self._condition.notify()
+        return future
+
+    def run(self, image, key):
+        return self.submit(image, key).result()
+
+    def _next_batch(self):
+        """Attend un groupe complet ou dont la plus ancienne image a assez attendu"""
+        with self._condition:
+            while True:
+                now = time.perf_counter()
+                for key, items in self._pending.items():
+                    if len(items) >= self.capacity or now - items[0][2] >= self.max_wait:
+                        batch, rest = items[:self.capacity], items[self.capacity:]
+                        if rest:
+                            self._pending[key] = rest
+                        else:
+                            del self._pending[key]
+                        return key, batch
+                timeout = min(items[0][2] + self.max_wait for items in self._pending.values()) - now \
+                    if self._pending else None
+                self._condition.wait(timeout)
+
+    def _loop(self):
+        while True:
+            key, batch = self._next_batch()
+            per_canvas = self.grid * self.grid
+            groups = [batch[i:i + per_canvas] for i in range(0, len(batch), per_canvas)]
+            try:
+                packed = [pack([image for image, _, _ in group], grid=self.grid) for group in groups]
+                results = self.run_canvases([canvas for canvas, _ in packed], key)
+                metrics.incr('mosaic.passes')
+                metrics.incr('mosaic.images', len(batch))
+                for group, (_, placements), detections in zip(groups, packed, results):
+                    for (_, future, _), image_detections in zip(group, split(detections, placements,
+                                                                             grid=self.grid)):
+                        future.set_result(image_detections)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
@@ -0,0 +1,114 @@
+"""
+Pré-filtre rapide "y a-t-il un échiquier ?"
+
+Avant toute passe YOLO, on cherche sur une vignette en niveaux de gris la
+structure périodique d'un échiquier : les bords des cases produisent un pic
+dans le spectre des profils de gradient (colonnes pour les bords verticaux,
+lignes pour les bords horizontaux). Une photo sans échiquier, ou une image
+uniforme, est refusée en quelques millisecondes avec un 422.
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+from metrics import metrics
+
+PREFILTER_ENABLED = os.environ.get('PREFILTER_ENABLED', 'true').lower() == 'true'
+# Rapport pic/fond minimal du spectre sur au moins un axe
+# (mesuré sur les vignettes : diagrammes chess_decoder_1000 >= 25, photos data/processed >= 5.2,
+#  bruit flou / dégradés <= 3.5)
+PREFILTER_MIN_SCORE = float(os.environ.get('PREFILTER_MIN_SCORE', 4.0))
+# Écart-type minimal des niveaux de gris (image uniforme en dessous)
+PREFILTER_MIN_CONTRAST = float(os.environ.get('PREFILTER_MIN_CONTRAST', 8.0))
+
+THUMBNAIL_SIZE = 128
+# Fréquences recherchées (cycles par vignette) : un échiquier de 8 cases
+# occupant entre 25% et 100% de la largeur de la vignette
+MIN_FREQUENCY = 6
+MAX_FREQUENCY = 34
+
+
+class PrefilterResult:
+    """Résultat du pré-filtre : accepté ou non, raison et score"""
+
+    def __init__(self, accepted, reason, score, elapsed_ms):
+        self.accepted = accepted
+        self.reason = reason
+        self.score = score
+        self.elapsed_ms = elapsed_ms
+
+    def to_dict(self):
+        return {
+            'accepted': self.accepted,
+            'reason': self.reason,
+            'score': round(self.score, 3),
+            'elapsed_ms': round(self.elapsed_ms, 3)
+        }
+
+
+def periodicity_score(profile):
+    """
+    Rapport entre le pic du spectre dans la bande des fréquences d'échiquier
+    et le niveau médian du spectre (hors composante continue)
+    """
+    profile = profile - profile.mean()
+    spectrum = np.abs(np.fft.rfft(profile * np.hanning(len(profile))))
+    background = np.median(spectrum[1:]) + 1e-6
+    return float(spectrum[MIN_FREQUENCY:MAX_FREQUENCY + 1].max() / background)
+
+
+def board_score(gray):
+    """
+    Score de présence d'un échiquier sur une vignette en niveaux de gris
+
+    Returns:
+        tuple: (score, contraste); score = max des scores de périodicité des deux axes
+    """
+    gray = gray.astype(np.float32)
+    grad_x = np.abs(cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3))
+    grad_y = np.abs(cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3))
+    score = max(periodicity_score(grad_x.mean(axis=0)), periodicity_score(grad_y.mean(axis=1)))
+    return score, float(gray.std())
+
+
+def check_board(image_bgr, min_score=PREFILTER_MIN_SCORE, min_contrast=PREFILTER_MIN_CONTRAST):
+    """
+    Vérifie rapidement qu'une image contient un échiquier
+
+    Args:
+        image_bgr: Image BGR (ou niveaux de gris)
+        min_score: Score de périodicité minimal
+        min_contrast: Écart-type minimal des niveaux de gris
+
+    Returns:
+        PrefilterResult
+    """
+    started = time.perf_counter()
+    gray = image_bgr if image_bgr.ndim == 2 else cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+    thumbnail = cv2.resize(gray, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA)
+    score, contrast = board_score(thumbnail)
+
+    if contrast < min_contrast:
+        accepted, reason = False, 'Image uniforme - aucun échiquier visible'
+    elif score < min_score:
+        accepted, reason = False, 'Aucune grille d\'échiquier détectée - cadrez l\'échiquier entier'
+    else:
+        accepted, reason = True, None
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    metrics.observe('prefilter.check', elapsed_ms)
+    metrics.incr('prefilter.checked')
+    if not accepted:
+        metrics.incr('prefilter.rejected')
+    return PrefilterResult(accepted, reason, score, elapsed_ms)
+
+
+def _rejection_rate():
+    checked = metrics.counter('prefilter.checked')
+    return round(metrics.counter('prefilter.rejected') / checked, 4) if checked else 0.0
+
+
+metrics.gauge('prefilter.rejection_rate', _rejection_rate)
@@ -0,0 +1,157 @@
+"""
+Ordonnanceur d'inférence avec voies de priorité
+
+Toutes les passes de modèle de l'API passent par cet ordonnanceur. Chaque tâche
+est une unité atomique (une image interactive, un lot de job): une tâche
+interactive passe donc devant le travail en lot dès la fin du lot en cours.
+
+Voies, par ordre de priorité :
+- interactive : /predict (application mobile, site web)
+- batch       : jobs asynchrones /jobs
+- background  : travaux non urgents
+
+Chaque voie peut recevoir une part minimale garantie (SCHEDULER_MIN_SHARES)
+pour ne jamais être affamée par les voies plus prioritaires.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from metrics import metrics
+
+LANES = ('interactive', 'batch', 'background')
+SCHEDULER_WORKERS = int(os.environ.get('SCHEDULER_WORKERS', 1))
+SCHEDULER_MIN_SHARES = os.environ.get('SCHEDULER_MIN_SHARES', 'batch:0.2,background:0.05')
+
+
+def parse_min_shares(spec):
+    """Analyse 'batch:0.2,background:0.05' en dict {voie: part}"""
+    shares = {}
+    for item in spec.split(','):
+        if ':' not in item:
+            continue
+        lane, share = item.split(':', 1)
+        shares[lane.strip()] = min(0.9, max(0.0, float(share)))
+    return shares
+
+
+class _Task:
+    __slots__ = ('lane', 'fn', 'args', 'kwargs', 'future', 'enqueued_at')
+
+    def __init__(self, lane, fn, args, kwargs):
+        self.lane = lane
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class InferenceScheduler:
+    """
+    File d'inférence multi-voies servie par un ou plusieurs workers
+
+    La voie la plus prioritaire non vide est servie en premier, sauf si une
+    voie moins prioritaire a accumulé assez de crédit pour respecter sa part
+    minimale : chaque tâche servie ailleurs pendant qu'elle attend lui donne
+    share / (1 - share) de crédit, et elle passe dès que son crédit atteint 1.
+    """
+
+    def __init__(self, lanes=LANES, min_shares=None, workers=SCHEDULER_WORKERS):
+        self.lanes = tuple(lanes)
+        self.min_shares = parse_min_shares(SCHEDULER_MIN_SHARES) if min_shares is None else min_shares
+        self._queues = {lane: deque() for lane in self.lanes}
+        self._credits = {lane: 0.0 for lane in self.lanes}
+        self._condition = threading.Condition()
+        self._workers = []
+
+        for lane in self.lanes:
+            metrics.gauge(f'scheduler.{lane}.queue_depth', lambda lane=lane: len(self._queues[lane]))
+
+        for i in range(max(1, workers)):
+            worker = threading.Thread(target=self._worker, name=f'senchess-inference-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def resolve_lane(self, requested, default='interactive'):
+        """Retourne la voie demandée si elle existe, sinon la voie par défaut"""
+        requested = (requested or '').strip().lower()
+        return requested if requested in self._queues else default
+
+    def submit(self, lane, fn, *args, **kwargs):
+        """Ajoute une tâche dans une voie et retourne son Future"""
+        if lane not in self._queues:
+            raise ValueError(f"Voie inconnue: {lane}. Utilisez {', '.join(self.lanes)}")
+        task = _Task(lane, fn, args, kwargs)
+        with self._condition:
+            self._queues[lane].append(task)
+            self._condition.notify()
+        metrics.incr(f'scheduler.{lane}.submitted')
+        return task.future
+
+    def run(self, lane, fn, *args, **kwargs):
+        """Soumet une tâche et attend son résultat"""
+        return self.submit(lane, fn, *args, **kwargs).result()
+
+    def _select_lane(self):
+        waiting = [lane for lane in self.lanes if self._queues[lane]]
+        if not waiting:
+            return None
+
+        # Voie moins prioritaire ayant atteint sa part minimale garantie
+        chosen = waiting[0]
+        for lane in reversed(waiting[1:]):
+            if self._credits[lane] >= 1.0:
+                self._credits[lane] -= 1.0
+                chosen = lane
+                break
+
+        for lane in self.lanes:
+            if lane == chosen:
+                continue
+            if self._queues[lane]:
+                share = self.min_shares.get(lane, 0.0)
+                self._credits[lane] += share / (1.0 - share) if share else 0.0
+            else:
+                self._credits[lane] = 0.0
+        return chosen
+
+    def _next_task(self):
+        with self._condition:
+            while True:
+                lane = self._select_lane()
+                if lane is not None:
+                    return self._queues[lane].popleft()
+                self._condition.wait()
+
+    def _worker(self):
+        while True:
+            task = self._next_task()
+            if not task.future.set_running_or_notify_cancel():
+                continue
+
+            started = time.perf_counter()
+            metrics.observe(f'scheduler.{task.lane}.wait', (started - task.enqueued_at) * 1000)
+            try:
+                result = task.fn(*task.args, **task.kwargs)
+            except BaseException as e:
+                task.future.set_exception(e)
+            else:
+                task.future.set_result(result)
+            metrics.observe(f'scheduler.{task.lane}.run', (time.perf_counter() - started) * 1000)
+            metrics.incr(f'scheduler.{task.lane}.completed')
+
+    def stats(self):
+        """Profondeur de file et crédit courant de chaque voie"""
+        with self._condition:
+            return {
+                lane: {
+                    'queue_depth': len(self._queues[lane]),
+                    'min_share': self.min_shares.get(lane, 0.0),
+                    'credit': round(self._credits[lane], 3)
+                }
+                for lane in self.lanes
+            }
@@ -0,0 +1,81 @@
+"""
+Dé-duplication des requêtes identiques simultanées (singleflight)
+
+Les clients mobiles relancent souvent une requête lente : la même image arrive
+plusieurs fois en moins d'une seconde. Les copies attendent le calcul déjà en
+cours au lieu de lancer chacune un ensemble complet. Aucun résultat n'est
+conservé une fois le calcul terminé (ce n'est pas un cache).
+"""
+
+import threading
+
+from metrics import metrics
+
+
+def request_key(image_digest, model, conf, **options):
+    """
+    Clé d'une requête de prédiction : empreinte du contenu de l'image + paramètres
+
+    Args:
+        image_digest: Empreinte SHA-256 (hex) des octets de l'image
+        model: Modèle demandé
+        conf: Seuil de confiance
+        **options: Autres paramètres qui influencent le résultat
+
+    Returns:
+        str: Clé hexadécimale
+    """
+    params = '|'.join(f'{name}={options[name]}' for name in sorted(options))
+    return f'{image_digest}|{model}|{float(conf):.4f}|{params}'
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Groupe d'appels dont au plus un est en cours par clé"""
+
+    def __init__(self, name='singleflight'):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        metrics.gauge(f'{name}.in_flight', lambda: len(self._calls))
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Exécute `fn` une seule fois pour tous les appelants simultanés de même clé
+
+        Returns:
+            tuple: (résultat, partagé) — partagé vaut True si le résultat vient
+                   d'un calcul lancé par un autre appelant
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.incr(f'{self.name}.shared')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        metrics.incr(f'{self.name}.leader')
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
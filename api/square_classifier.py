@@ -0,0 +1,139 @@
+"""
+Moteur "squares" : classification des 64 cases au lieu de la détection d'objets
+
+Sur un échiquier localisé (diagrammes 2D en particulier), chaque case est
+découpée (board.square_crops) puis classée parmi 13 états (vide + 12 pièces)
+par un petit CNN, en une seule passe pour les 64 cases.
+
+Le modèle est entraîné par src/train_square_classifier.py sur des cases
+dérivées automatiquement des annotations YOLO (src/square_dataset.py).
+"""
+
+import numpy as np
+import torch
+from torch import nn
+
+from board import SQUARE_CONTEXT, SQUARE_PX, square_corners, square_crops
+
+# 13 états d'une case (même ordre que data/chess_decoder_1000)
+CLASSES = [
+    'empty', 'white-king', 'white-queen', 'white-rook', 'white-bishop', 'white-knight', 'white-pawn',
+    'black-king', 'black-queen', 'black-rook', 'black-bishop', 'black-knight', 'black-pawn'
+]
+
+
+class SquareNet(nn.Module):
+    """CNN minimal (~20k paramètres) pour imagettes de cases 36x36"""
+
+    def __init__(self, num_classes=len(CLASSES)):
+        super().__init__()
+
+        def block(c_in, c_out):
+            return nn.Sequential(
+                nn.Conv2d(c_in, c_out, 3, padding=1, bias=False),
+                nn.BatchNorm2d(c_out),
+                nn.ReLU(inplace=True),
+                nn.MaxPool2d(2)
+            )
+
+        self.features = nn.Sequential(block(3, 16), block(16, 32), block(32, 48))
+        self.head = nn.Sequential(nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Dropout(0.2),
+                                  nn.Linear(48, num_classes))
+
+    def forward(self, x):
+        return self.head(self.features(x))
+
+
+def crops_to_tensor(crops):
+    """Imagettes BGR uint8 (N, H, W, 3) -> tenseur float (N, 3, H, W) dans [0, 1]"""
+    return torch.from_numpy(np.ascontiguousarray(crops)).permute(0, 3, 1, 2).float().div_(255)
+
+
+class SquareClassifier:
+    """
+    Classifieur de cases chargé depuis un checkpoint de train_square_classifier.py
+
+    Le checkpoint contient les poids, la liste des classes et la géométrie des
+    imagettes (square_px, context) utilisée à l'entraînement.
+    """
+
+    def __init__(self, weights_path, device='cpu'):
+        checkpoint = torch.load(weights_path, map_location=device)
+        self.classes = checkpoint.get('classes', CLASSES)
+        self.square_px = checkpoint.get('square_px', SQUARE_PX)
+        self.context = checkpoint.get('context', SQUARE_CONTEXT)
+        self.device = device
+
+        self.model = SquareNet(len(self.classes))
+        self.model.load_state_dict(checkpoint['state_dict'])
+        self.model.to(device).eval()
+
+    def classify(self, crops):
+        """
+        Classe un lot d'imagettes en une passe
+
+        Returns:
+            tuple: (indices des classes (N,), confiances (N,))
+        """
+        with torch.inference_mode():
+            logits = self.model(crops_to_tensor(crops).to(self.device))
+            confidences, labels = torch.softmax(logits, dim=1).max(dim=1)
+        return labels.cpu().numpy(), confidences.cpu().numpy()
+
+    def predict_boards(self, images, locations, conf_threshold=0.25):
+        """
+        Classe les cases de plusieurs échiquiers en une seule passe
+
+        Args:
+            images: Images BGR
+            locations: BoardLocation de chaque image
+            conf_threshold: Confiance minimale d'une pièce (sinon case vide)
+
+        Returns:
+            list: Détections de chaque image (boîte = contour de la case dans l'image)
+        """
+        crops = np.concatenate([
+            square_crops(image, location, self.square_px, self.context)
+            for image, location in zip(images, locations)
+        ])
+        labels, confidences = self.classify(crops)
+
+        results = []
+        for i, location in enumerate(locations):
+            results.append(squares_to_detections(
+                [self.classes[label] for label in labels[i * 64:(i + 1) * 64]],
+                confidences[i * 64:(i + 1) * 64],
+                location,
+                conf_threshold
+            ))
+        return results
+
+
+def squares_to_detections(square_labels, confidences, location, conf_threshold=0.25):
+    """
+    Convertit les états des 64 cases en détections au format de /predict
+
+    La boîte d'une pièce est le rectangle englobant sa case dans l'image
+    d'origine, ce qui permet de réutiliser pieces_to_fen avec l'homographie.
+    """
+    corners = square_corners(location)
+    detections = []
+    for square, (name, confidence) in enumerate(zip(square_labels, confidences)):
+        if name == 'empty' or confidence < conf_threshold:
+            continue
+        x1, y1 = corners[square].min(axis=0).tolist()
+        x2, y2 = corners[square].max(axis=0).tolist()
+        detections.append({
+            'id': len(detections) + 1,
+            'class': name,
+            'confidence': round(float(confidence), 3),
+            'bbox': {
+                'x1': round(x1, 2),
+                'y1': round(y1, 2),
+                'x2': round(x2, 2),
+                'y2': round(y2, 2),
+                'width': round(x2 - x1, 2),
+                'height': round(y2 - y1, 2)
+            }
+        })
+    return detections
@@ -0,0 +1,155 @@
+"""
+Suivi en direct d'un échiquier via WebSocket (/stream)
+
+Le client envoie un flux d'images (messages binaires JPEG/PNG); le serveur
+répond uniquement quand la position change. Chaque connexion garde son
+propre état (homographie du plateau, dernière image stable, BoardTracker) :
+une image sans changement est traitée sans passe de modèle.
+
+Contre-pression : une boîte aux lettres d'une seule place sépare la
+réception du traitement. Une image arrivée pendant le traitement remplace
+celle en attente (l'ancienne est abandonnée) : la latence reste bornée au
+lieu de laisser grossir une file.
+"""
+
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from metrics import metrics
+from tracking import BoardTracker
+
+# Connexions simultanées (chacune occupe un thread gunicorn)
+STREAM_MAX_CONNECTIONS = int(os.environ.get('STREAM_MAX_CONNECTIONS', 4))
+# Fermeture d'une connexion sans image reçue pendant ce délai (s)
+STREAM_IDLE_TIMEOUT = float(os.environ.get('STREAM_IDLE_TIMEOUT', 60))
+STREAM_MAX_FRAME_BYTES = int(os.environ.get('STREAM_MAX_FRAME_BYTES', 2 * 1024 * 1024))
+
+_connections = 0
+_connections_lock = threading.Lock()
+metrics.gauge('stream.connections', lambda: _connections)
+
+
+class FrameMailbox:
+    """Boîte aux lettres d'une place : la dernière image reçue remplace la précédente"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._condition:
+            if self._item is not None:
+                self.dropped += 1
+                metrics.incr('stream.dropped')
+            self._item = item
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """Image en attente, ou None si la boîte est fermée ou si le délai expire"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._item is not None or self._closed, timeout)
+            item, self._item = self._item, None
+            return item
+
+
+def send_message(ws, message_type, **payload):
+    """Envoie un message JSON {'type': ..., ...} sur la connexion"""
+    ws.send(json.dumps({'type': message_type, **payload}))
+
+
+def acquire_connection():
+    """Réserve une place de connexion; False si la limite est atteinte"""
+    global _connections
+    with _connections_lock:
+        if _connections >= STREAM_MAX_CONNECTIONS:
+            metrics.incr('stream.rejected')
+            return False
+        _connections += 1
+        return True
+
+
+def release_connection():
+    global _connections
+    with _connections_lock:
+        _connections -= 1
+
+
+class StreamSession:
+    """
+    Une connexion /stream : réception dans un thread, suivi dans le thread de la requête
+
+    Messages reçus : images (binaire).
+    Messages envoyés (JSON) : {'type': 'position'|'no_board'|'error', ...}; chaque
+    position est accompagnée des statistiques de la connexion (images traitées,
+    détections, images abandonnées).
+    """
+
+    def __init__(self, ws, detect, idle_timeout=STREAM_IDLE_TIMEOUT):
+        self.ws = ws
+        self.tracker = BoardTracker(detect)
+        self.mailbox = FrameMailbox()
+        self.idle_timeout = idle_timeout
+        self.started = time.monotonic()
+        self._board_reported = None
+
+    def _receive(self):
+        try:
+            while True:
+                message = self.ws.receive()
+                if message is None:
+                    break
+                if isinstance(message, str):
+                    continue
+                if len(message) > STREAM_MAX_FRAME_BYTES:
+                    metrics.incr('stream.oversized')
+                    continue
+                self.mailbox.put((time.monotonic() - self.started, message))
+        except Exception:
+            # Connexion fermée par le client
+            pass
+        finally:
+            self.mailbox.close()
+
+    def send(self, message_type, **payload):
+        send_message(self.ws, message_type, **payload)
+
+    def stats(self):
+        return {**self.tracker.stats(), 'dropped': self.mailbox.dropped,
+                'elapsed_s': round(time.monotonic() - self.started, 1)}
+
+    def run(self):
+        receiver = threading.Thread(target=self._receive, daemon=True)
+        receiver.start()
+        while True:
+            item = self.mailbox.get(self.idle_timeout)
+            if item is None:
+                break
+            self._process(*item)
+
+    def _process(self, timestamp, data):
+        started = time.perf_counter()
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            self.send('error', message='Image illisible')
+            return
+        entry = self.tracker.update(frame, timestamp)
+        metrics.observe('stream.frame', (time.perf_counter() - started) * 1000)
+
+        board_found = self.tracker.location is not None
+        if board_found != self._board_reported and not board_found:
+            self.send('no_board', message='Échiquier non localisé')
+        self._board_reported = board_found
+        if entry:
+            self.send('position', **entry, board=self.tracker.location.to_dict(), stats=self.stats())
@@ -0,0 +1,153 @@
+"""
+Inférence par tuiles pour les photos haute résolution
+
+Réduire une photo de 12 MP à 640 px ramène les pions du fond de l'échiquier
+à quelques pixels. Les grandes images (ou grands échiquiers redressés) sont
+découpées en tuiles de la taille d'entrée du modèle, qui se recouvrent d'au
+moins la hauteur d'une pièce : chaque pièce apparaît entière dans une tuile.
+Toutes les tuiles passent dans le modèle en un seul lot, puis :
+- les boîtes coupées par un bord intérieur de tuile sont écartées (la pièce
+  est entière dans la tuile voisine)
+- les doublons des zones de recouvrement sont fusionnés (api/fusion.py)
+
+La taille et le recouvrement des tuiles sont déduits de la taille de l'image;
+une image qui tient dans TILE_MIN_RATIO x imgsz n'est pas découpée.
+"""
+
+import math
+import os
+
+import cv2
+import numpy as np
+
+from fusion import detection_arrays, nms
+from metrics import metrics
+
+TILING_ENABLED = os.environ.get('TILING_ENABLED', 'false').lower() == 'true'
+# Taille d'une tuile (= taille d'entrée du modèle)
+TILE_IMGSZ = int(os.environ.get('TILE_IMGSZ', 640))
+# Côté maximal de l'image (ou de l'échiquier redressé) découpée en tuiles :
+# au-delà elle est d'abord réduite (1280 px : ~140 px par case, 9 tuiles)
+TILE_MAX_BOARD_PX = int(os.environ.get('TILE_MAX_BOARD_PX', 1280))
+
+# En dessous de TILE_MIN_RATIO x imgsz, une seule passe
+TILE_MIN_RATIO = 1.25
+# Recouvrement des tuiles, en cases (hauteur d'une pièce haute en perspective)
+TILE_OVERLAP_SQUARES = 1.5
+# Distance (px) à un bord intérieur de tuile en dessous de laquelle une boîte est coupée
+TILE_EDGE_MARGIN = 3
+TILE_NMS_IOU = 0.5
+
+
+def needs_tiling(width, height, imgsz=TILE_IMGSZ):
+    return max(width, height) > TILE_MIN_RATIO * imgsz
+
+
+def _axis_starts(length, tile, overlap):
+    """Débuts des tuiles sur un axe : espacement régulier, pas au plus tile - overlap"""
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - overlap) / max(tile - overlap, 1))
+    return [int(round(start)) for start in np.linspace(0, length - tile, max(count, 2))]
+
+
+def plan_tiles(width, height, imgsz=TILE_IMGSZ, square_px=None):
+    """
+    Découpage d'une image en tuiles
+
+    Args:
+        width: Largeur de l'image
+        height: Hauteur de l'image
+        imgsz: Côté d'une tuile
+        square_px: Côté d'une case (px); par défaut l'échiquier est supposé
+                   occuper toute l'image
+
+    Returns:
+        list: Tuiles (x, y, largeur, hauteur); une seule si l'image est petite
+    """
+    if not needs_tiling(width, height, imgsz):
+        return [(0, 0, width, height)]
+    square_px = square_px or min(width, height) / 8
+    overlap = min(int(math.ceil(TILE_OVERLAP_SQUARES * square_px)), imgsz // 2)
+    tile_w, tile_h = min(imgsz, width), min(imgsz, height)
+    return [
+        (x, y, tile_w, tile_h)
+        for y in _axis_starts(height, tile_h, overlap)
+        for x in _axis_starts(width, tile_w, overlap)
+    ]
+
+
+def board_side(location, margin_squares):
+    """Côté natif (px) de l'échiquier redressé avec sa marge : plus long bord du quadrilatère"""
+    corners = location.corners
+    edges = np.linalg.norm(corners - np.roll(corners, -1, axis=0), axis=1)
+    return int(edges.max() * (8 + 2 * margin_squares) / 8)
+
+
+def detect_tiled(image, detect_batch, imgsz=TILE_IMGSZ, square_px=None, max_side=TILE_MAX_BOARD_PX):
+    """
+    Détection par tuiles en une passe de modèle
+
+    Args:
+        image: Image BGR (H, W, 3)
+        detect_batch: Fonction (liste d'images, imgsz) -> détections de chaque image
+        imgsz: Côté d'une tuile
+        square_px: Côté d'une case (px, optionnel)
+        max_side: Côté maximal de l'image découpée (réduite au-delà)
+
+    Returns:
+        tuple: (détections dans les coordonnées de l'image, nombre de tuiles)
+    """
+    scale = min(1.0, max_side / max(image.shape[:2]))
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        square_px = square_px * scale if square_px else None
+    height, width = image.shape[:2]
+    tiles = plan_tiles(width, height, imgsz, square_px)
+    if len(tiles) == 1 and scale == 1.0:
+        return detect_batch([image], imgsz)[0], 1
+
+    batch = detect_batch([image[y:y + h, x:x + w] for x, y, w, h in tiles], imgsz)
+    metrics.incr('tiling.images')
+    metrics.incr('tiling.tiles', len(tiles))
+
+    detections, boxes = [], []
+    for (x, y, w, h), tile_detections in zip(tiles, batch):
+        if not tile_detections:
+            continue
+        tile_boxes, _ = detection_arrays(tile_detections)
+        # Bords intérieurs de la tuile (les bords de l'image ne coupent rien)
+        cut = np.zeros(len(tile_boxes), dtype=bool)
+        if x > 0:
+            cut |= tile_boxes[:, 0] <= TILE_EDGE_MARGIN
+        if y > 0:
+            cut |= tile_boxes[:, 1] <= TILE_EDGE_MARGIN
+        if x + w < width:
+            cut |= tile_boxes[:, 2] >= w - TILE_EDGE_MARGIN
+        if y + h < height:
+            cut |= tile_boxes[:, 3] >= h - TILE_EDGE_MARGIN
+        for det, box, is_cut in zip(tile_detections, tile_boxes + [x, y, x, y], cut):
+            if not is_cut:
+                detections.append(det)
+                boxes.append(box)
+
+    if not detections:
+        return [], len(tiles)
+    boxes = np.float64(boxes) / scale
+    kept = nms(boxes, np.float64([d['confidence'] for d in detections]), TILE_NMS_IOU)
+    merged = []
+    for n, i in enumerate(kept):
+        x1, y1, x2, y2 = boxes[i].tolist()
+        merged.append({
+            **detections[i],
+            'id': n + 1,
+            'bbox': {
+                'x1': round(x1, 2),
+                'y1': round(y1, 2),
+                'x2': round(x2, 2),
+                'y2': round(y2, 2),
+                'width': round(x2 - x1, 2),
+                'height': round(y2 - y1, 2)
+            }
+        })
+    return merged, len(tiles)
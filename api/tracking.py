@@ -0,0 +1,204 @@
+"""
+Suivi d'un échiquier dans un flux vidéo (caméra fixe)
+
+Plutôt que de relancer la détection sur chaque image, chaque image est
+comparée case par case à la dernière image stable, sur l'échiquier redressé
+(différence absolue moyenne en niveaux de gris, bords des cases ignorés) :
+- mouvement entre deux images (main au-dessus du plateau) : on attend que
+  l'image se stabilise
+- image stable avec des cases modifiées : la détection est relancée et seules
+  les cases modifiées sont mises à jour (FEN incrémentale)
+- presque toutes les cases modifiées (caméra déplacée, éclairage) : l'échiquier
+  est relocalisé et entièrement re-détecté
+
+La chronologie des FEN est lissée : une position remplacée en moins de
+TRACK_MIN_HOLD secondes par la position précédente (main posée sur le
+plateau, détection erronée) est retirée.
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+from board import locate_board, map_detections, rectify_board, square_crops
+from fen import FEN_SUFFIX, PIECE_SYMBOLS, build_fen, placement_to_symbols, square_name, symbols_to_placement
+from metrics import metrics
+
+# Différence moyenne (niveaux de gris, 0..255) au-delà de laquelle une case a changé
+TRACK_CHANGE_THRESHOLD = float(os.environ.get('TRACK_CHANGE_THRESHOLD', 12))
+# Images consécutives sans mouvement avant de relancer la détection
+TRACK_STABLE_FRAMES = int(os.environ.get('TRACK_STABLE_FRAMES', 3))
+# Durée minimale (s) d'une position avant qu'un retour en arrière soit pris pour une vraie position
+TRACK_MIN_HOLD = float(os.environ.get('TRACK_MIN_HOLD', 1.0))
+
+# Nombre de cases modifiées à partir duquel l'échiquier est relocalisé
+RELOCATE_SQUARES = 40
+# Côté d'une case redressée (px) et bord ignoré (pièces voisines, imprécision des coins)
+SQUARE_PX = 16
+SQUARE_INSET = 3
+
+
+class BoardTracker:
+    """
+    Suivi incrémental de la position d'un échiquier filmé
+
+    `detect(frame, location, squares)` retourne le symbole FEN ('1' si vide) de
+    chacune des cases demandées (indices 0..63, ordre a8..h1).
+    """
+
+    def __init__(self, detect, change_threshold=TRACK_CHANGE_THRESHOLD, stable_frames=TRACK_STABLE_FRAMES,
+                 min_hold=TRACK_MIN_HOLD, locate=locate_board):
+        self.detect = detect
+        self.change_threshold = change_threshold
+        self.stable_frames = stable_frames
+        self.min_hold = min_hold
+        self.locate = locate
+
+        self.location = None
+        self.reference = None  # Cases de la dernière image stable
+        self.previous = None   # Cases de l'image précédente
+        self.stable = 0
+        self.symbols = None
+        self.timeline = []
+        self.frames = 0
+        self.detections = 0
+
+    @property
+    def fen(self):
+        return self.timeline[-1]['fen'] if self.timeline else None
+
+    def _squares(self, frame):
+        """Intérieur des 64 cases redressées en niveaux de gris : (64, côté, côté) int16"""
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        warp = np.float64([[SQUARE_PX, 0, 0], [0, SQUARE_PX, 0], [0, 0, 1]]) @ self.location.homography
+        board = cv2.warpPerspective(gray, warp, (8 * SQUARE_PX, 8 * SQUARE_PX), flags=cv2.INTER_AREA,
+                                    borderMode=cv2.BORDER_REPLICATE)
+        board = cv2.GaussianBlur(board, (3, 3), 0)
+        cells = board.reshape(8, SQUARE_PX, 8, SQUARE_PX).transpose(0, 2, 1, 3).reshape(64, SQUARE_PX, SQUARE_PX)
+        return cells[:, SQUARE_INSET:SQUARE_PX - SQUARE_INSET, SQUARE_INSET:SQUARE_PX - SQUARE_INSET].astype(np.int16)
+
+    @staticmethod
+    def _difference(squares, other):
+        """Différence absolue moyenne par case : (64,)"""
+        return np.abs(squares - other).mean(axis=(1, 2))
+
+    def update(self, frame, timestamp):
+        """
+        Traite une image du flux
+
+        Args:
+            frame: Image BGR (ou niveaux de gris)
+            timestamp: Position de l'image dans le flux (s)
+
+        Returns:
+            dict | None: Nouvelle entrée de la chronologie si la position a changé
+                         (entrée précédente marquée 'reverted' si la dernière
+                         position a été retirée par le lissage)
+        """
+        self.frames += 1
+        metrics.incr('tracking.frames')
+        if self.location is None:
+            self.location = self.locate(frame)
+            if self.location is None:
+                metrics.incr('tracking.no_board')
+                return None
+            squares = self._squares(frame)
+            return self._refresh(frame, squares, timestamp, range(64))
+
+        squares = self._squares(frame)
+        moving = self.previous is not None and self._difference(squares, self.previous).max() > self.change_threshold
+        self.previous = squares
+        if moving:
+            self.stable = 0
+            return None
+        self.stable += 1
+        if self.stable < self.stable_frames:
+            return None
+
+        changed = np.flatnonzero(self._difference(squares, self.reference) > self.change_threshold)
+        if not len(changed):
+            # Suit les variations lentes d'éclairage
+            self.reference = squares
+            return None
+        if len(changed) >= RELOCATE_SQUARES:
+            metrics.incr('tracking.relocate')
+            self.location = self.locate(frame) or self.location
+            squares = self._squares(frame)
+            changed = range(64)
+        return self._refresh(frame, squares, timestamp, changed)
+
+    def _refresh(self, frame, squares, timestamp, changed):
+        """Re-détecte les cases modifiées et met à jour la position"""
+        changed = [int(square) for square in changed]
+        detected = self.detect(frame, self.location, changed)
+        self.detections += 1
+        metrics.incr('tracking.detections')
+        metrics.incr('tracking.squares', len(changed))
+
+        self.reference = self.previous = squares
+        symbols = list(self.symbols) if self.symbols is not None else ['1'] * 64
+        for square, symbol in zip(changed, detected):
+            symbols[square] = symbol
+        if symbols == self.symbols:
+            return None
+        moved = [square_name(s) for s in range(64) if self.symbols is None or symbols[s] != self.symbols[s]]
+        self.symbols = symbols
+        return self._record(timestamp, moved)
+
+    def _record(self, timestamp, moved):
+        """Ajoute la position à la chronologie (lissage des allers-retours brefs)"""
+        fen = symbols_to_placement(self.symbols) + FEN_SUFFIX
+        if (len(self.timeline) >= 2 and timestamp - self.timeline[-1]['time'] < self.min_hold
+                and self.timeline[-2]['fen'] == fen):
+            # Retour à la position précédente : la position intermédiaire est retirée
+            self.timeline.pop()
+            metrics.incr('tracking.smoothed')
+            return {**self.timeline[-1], 'reverted': True}
+        entry = {'time': round(float(timestamp), 3), 'frame': self.frames, 'fen': fen, 'changed': moved}
+        self.timeline.append(entry)
+        return entry
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'detections': self.detections,
+            'detection_rate': round(self.detections / self.frames, 4) if self.frames else 0.0,
+            'positions': len(self.timeline),
+        }
+
+
+def rectified_detector(predict):
+    """
+    Fonction `detect` d'un détecteur d'objets appliqué à l'échiquier redressé
+
+    `predict(crop)` retourne les détections de l'image redressée; toutes les
+    cases sont détectées, seules celles demandées sont reprises.
+    """
+    def detect(frame, location, squares):
+        crop, warp = rectify_board(frame, location)
+        detections = map_detections(predict(crop), warp)
+        height, width = frame.shape[:2]
+        symbols = placement_to_symbols(build_fen(detections, width, height, location.homography).fen)
+        return [symbols[square] for square in squares]
+
+    return detect
+
+
+def classifier_detector(classifier, conf_threshold, classify=None):
+    """
+    Fonction `detect` du classifieur de cases : seules les cases demandées sont classées
+
+    `classify(crops)` remplace classifier.classify (ex: passage par l'ordonnanceur).
+    """
+    classify = classify or classifier.classify
+
+    def detect(frame, location, squares):
+        crops = square_crops(frame, location, classifier.square_px, classifier.context)[squares]
+        labels, confidences = classify(crops)
+        return [
+            PIECE_SYMBOLS.get(classifier.classes[label], '1') if confidence >= conf_threshold else '1'
+            for label, confidence in zip(labels, confidences)
+        ]
+
+    return detect
@@ -0,0 +1,121 @@
+"""
+Benchmark de la cascade de résolutions (api/cascade.py)
+
+Pour chaque image de test annotée (chess_decoder_1000 et processed), compare
+trois modes d'un même modèle :
+- full    : une passe à CASCADE_FULL_IMGSZ (640)
+- low     : une passe à CASCADE_LOW_IMGSZ (320)
+- cascade : passe à 320, relancée à 640 si elle n'est pas concluante
+Mesures : précision par case, FEN exactes, latence, taux d'escalade.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.append(str(BASE_DIR / 'api'))
+sys.path.append(str(BASE_DIR / 'src'))
+
+from cascade import CASCADE_FULL_IMGSZ, CASCADE_LOW_IMGSZ, run_cascade  # noqa: E402
+from fen import build_fen, placement_to_symbols  # noqa: E402
+from inference import predict_batch_with_model  # noqa: E402
+from square_dataset import DATASETS, board_to_placement, iter_annotated_images  # noqa: E402
+
+
+def run_mode(model, mode, image, location, conf, low_imgsz, full_imgsz):
+    """Retourne (partie placement de la FEN, résolution finale, escalade)"""
+    height, width = image.shape[:2]
+
+    def detect(imgsz):
+        return predict_batch_with_model(model, [image], conf, imgsz)[0]
+
+    if mode == 'cascade':
+        result = run_cascade(detect, width, height, location.homography, low_imgsz, full_imgsz)
+        return result.fen_result.fen.split()[0], result.imgsz, result.escalated
+    imgsz = full_imgsz if mode == 'full' else low_imgsz
+    return build_fen(detect(imgsz), width, height, location.homography).fen.split()[0], imgsz, False
+
+
+def square_matches(predicted, expected):
+    """Nombre de cases identiques entre deux parties placement"""
+    return sum(p == e for p, e in zip(placement_to_symbols(predicted), placement_to_symbols(expected)))
+
+
+def benchmark(model, datasets, split, limit, conf, low_imgsz, full_imgsz):
+    report = {}
+    for dataset in datasets:
+        samples = []
+        for _, image, location, board in iter_annotated_images(dataset, split):
+            if location is not None and board is not None:
+                samples.append((image, location, board_to_placement(board)))
+            if limit and len(samples) >= limit:
+                break
+        if not samples:
+            continue
+        print(f"\n📂 {dataset} ({split}) : {len(samples)} images")
+
+        report[dataset] = {}
+        for mode in ('full', 'low', 'cascade'):
+            run_mode(model, mode, samples[0][0], samples[0][1], conf, low_imgsz, full_imgsz)  # Préchauffage
+            latencies, squares_ok, boards_ok, escalated = [], 0, 0, 0
+            for image, location, expected in samples:
+                started = time.perf_counter()
+                placement, _, escalation = run_mode(model, mode, image, location, conf, low_imgsz, full_imgsz)
+                latencies.append((time.perf_counter() - started) * 1000)
+                squares_ok += square_matches(placement, expected)
+                boards_ok += placement == expected
+                escalated += escalation
+
+            latencies = np.array(latencies)
+            report[dataset][mode] = {
+                'images': len(samples),
+                'square_accuracy': round(squares_ok / (64 * len(samples)), 4),
+                'fen_accuracy': round(boards_ok / len(samples), 4),
+                'escalation_rate': round(escalated / len(samples), 4),
+                'latency_ms_mean': round(float(latencies.mean()), 2),
+                'latency_ms_p95': round(float(np.percentile(latencies, 95)), 2),
+            }
+    return report
+
+
+def print_report(report):
+    print("\n" + "=" * 80)
+    print(f"{'Dataset':<20}{'Mode':<10}{'Cases':>9}{'FEN':>9}{'Escalade':>10}{'Moy (ms)':>11}{'p95':>10}")
+    print("-" * 80)
+    for dataset, modes in report.items():
+        for mode, m in modes.items():
+            print(f"{dataset:<20}{mode:<10}{m['square_accuracy']:>9.2%}{m['fen_accuracy']:>9.2%}"
+                  f"{m['escalation_rate']:>10.1%}{m['latency_ms_mean']:>11.1f}{m['latency_ms_p95']:>10.1f}")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de la cascade de résolutions (320 puis 640).")
+    parser.add_argument('--model', type=Path, default=BASE_DIR / 'models/senchess_haki_v1.0/weights/best.pt')
+    parser.add_argument('--split', type=str, default='test', choices=['train', 'val', 'test'])
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS), choices=list(DATASETS))
+    parser.add_argument('--limit', type=int, default=0, help="Nombre maximal d'images par dataset (0 = toutes)")
+    parser.add_argument('--conf', type=float, default=0.25, help="Seuil de confiance")
+    parser.add_argument('--low-imgsz', type=int, default=CASCADE_LOW_IMGSZ)
+    parser.add_argument('--full-imgsz', type=int, default=CASCADE_FULL_IMGSZ)
+    parser.add_argument('--output', type=Path, help="Fichier JSON des résultats (optionnel)")
+    args = parser.parse_args()
+
+    if not args.model.exists():
+        print(f"❌ Modèle introuvable: {args.model}")
+        sys.exit(1)
+
+    from ultralytics import YOLO
+    model = YOLO(str(args.model))
+
+    report = benchmark(model, args.datasets, args.split, args.limit, args.conf, args.low_imgsz, args.full_imgsz)
+    print_report(report)
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"💾 Résultats sauvegardés: {args.output}")
@@ -0,0 +1,119 @@
+"""
+Benchmark de la mosaïque (api/mosaic.py) sur des tailles de requêtes réelles
+
+Les images de test annotées dont le plus grand côté est sous MOSAIC_MAX_SIDE
+(photos 416 px de data/processed, petits diagrammes) sont détectées :
+- single : une passe par image (letterbox 640, comme /predict)
+- mosaic : quatre images par canevas de 640, MOSAIC_MAX_CANVASES canevas par passe
+Mesures : images par seconde, passes de modèle, précision par case et FEN exactes.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.append(str(BASE_DIR / 'api'))
+sys.path.append(str(BASE_DIR / 'src'))
+
+from fen import build_fen, placement_to_symbols  # noqa: E402
+from inference import predict_batch_with_model  # noqa: E402
+from mosaic import (MOSAIC_CELL, MOSAIC_GRID, MOSAIC_MAX_CANVASES, MOSAIC_MAX_SIDE, fits_mosaic,  # noqa: E402
+                    pack, split)
+from square_dataset import DATASETS, board_to_placement, iter_annotated_images  # noqa: E402
+
+
+def load_samples(datasets, split_name, limit):
+    samples = []
+    for dataset in datasets:
+        for _, image, location, board in iter_annotated_images(dataset, split_name):
+            height, width = image.shape[:2]
+            if location is None or board is None or not fits_mosaic(width, height):
+                continue
+            samples.append((image, location, board_to_placement(board)))
+            if limit and len(samples) >= limit:
+                return samples
+    return samples
+
+
+def run_single(model, images, conf):
+    return [predict_batch_with_model(model, [image], conf)[0] for image in images], len(images)
+
+
+def run_mosaic(model, images, conf):
+    per_canvas = MOSAIC_GRID * MOSAIC_GRID
+    per_pass = per_canvas * MOSAIC_MAX_CANVASES
+    results, passes = [], 0
+    for start in range(0, len(images), per_pass):
+        chunk = images[start:start + per_pass]
+        packed = [pack(chunk[i:i + per_canvas]) for i in range(0, len(chunk), per_canvas)]
+        batch = predict_batch_with_model(model, [canvas for canvas, _ in packed], conf, MOSAIC_GRID * MOSAIC_CELL)
+        passes += 1
+        for (_, placements), detections in zip(packed, batch):
+            results.extend(split(detections, placements))
+    return results, passes
+
+
+def score(samples, batch_detections):
+    squares_ok = boards_ok = 0
+    for (image, location, expected), detections in zip(samples, batch_detections):
+        height, width = image.shape[:2]
+        placement = build_fen(detections, width, height, location.homography).fen.split()[0]
+        squares_ok += sum(p == e for p, e in zip(placement_to_symbols(placement), placement_to_symbols(expected)))
+        boards_ok += placement == expected
+    return squares_ok / (64 * len(samples)), boards_ok / len(samples)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de la mosaïque de petites images.")
+    parser.add_argument('--model', type=Path, default=BASE_DIR / 'models/senchess_haki_v1.0/weights/best.pt')
+    parser.add_argument('--split', type=str, default='test', choices=['train', 'val', 'test'])
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS), choices=list(DATASETS))
+    parser.add_argument('--limit', type=int, default=0, help="Nombre maximal d'images (0 = toutes)")
+    parser.add_argument('--conf', type=float, default=0.25, help="Seuil de confiance")
+    parser.add_argument('--output', type=Path, help="Fichier JSON des résultats (optionnel)")
+    args = parser.parse_args()
+
+    if not args.model.exists():
+        print(f"❌ Modèle introuvable: {args.model}")
+        sys.exit(1)
+
+    samples = load_samples(args.datasets, args.split, args.limit)
+    if not samples:
+        print("⚠️ Aucune image éligible à la mosaïque")
+        sys.exit(1)
+    print(f"📂 {len(samples)} images éligibles (plus grand côté <= {MOSAIC_MAX_SIDE} px)")
+
+    from ultralytics import YOLO
+    model = YOLO(str(args.model))
+    images = [image for image, _, _ in samples]
+
+    report = {}
+    for name, run in (('single', run_single), ('mosaic', run_mosaic)):
+        run(model, images[:MOSAIC_GRID * MOSAIC_GRID], args.conf)  # Préchauffage
+        started = time.perf_counter()
+        detections, passes = run(model, images, args.conf)
+        elapsed = time.perf_counter() - started
+        square_accuracy, fen_accuracy = score(samples, detections)
+        report[name] = {
+            'images': len(images),
+            'passes': passes,
+            'images_per_second': round(len(images) / elapsed, 2),
+            'square_accuracy': round(square_accuracy, 4),
+            'fen_accuracy': round(fen_accuracy, 4),
+        }
+
+    print("\n" + "=" * 66)
+    print(f"{'Mode':<10}{'Images/s':>12}{'Passes':>10}{'Cases':>12}{'FEN':>12}")
+    print("-" * 66)
+    for name, m in report.items():
+        print(f"{name:<10}{m['images_per_second']:>12.1f}{m['passes']:>10}"
+              f"{m['square_accuracy']:>12.2%}{m['fen_accuracy']:>12.2%}")
+    print("=" * 66)
+    print(f"Gain de débit : x{report['mosaic']['images_per_second'] / report['single']['images_per_second']:.2f}")
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"💾 Résultats sauvegardés: {args.output}")
@@ -0,0 +1,145 @@
+"""
+Benchmark du moteur 'squares' (classifieur de cases) contre Haki et Gear
+
+Pour chaque image de test annotée (chess_decoder_1000 et processed), compare
+au placement attendu (dérivé des annotations YOLO) :
+- la précision par case et la proportion d'échiquiers entièrement corrects (FEN)
+- la latence par image (localisation comprise pour 'squares')
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.append(str(BASE_DIR / 'api'))
+sys.path.append(str(BASE_DIR / 'src'))
+
+from board import locate_board  # noqa: E402
+from inference import predict_batch_with_model  # noqa: E402
+from square_dataset import (DATASETS, board_to_placement, boxes_to_board,  # noqa: E402
+                            full_board_location, iter_annotated_images)
+
+
+def load_engines(args):
+    """Moteurs disponibles : nom -> fonction(image BGR) -> échiquier 8x8"""
+    engines = {}
+
+    if Path(args.squares).exists():
+        from square_classifier import SquareClassifier
+        classifier = SquareClassifier(str(args.squares))
+
+        def run_squares(image):
+            location = locate_board(image)
+            if location is None:
+                return None
+            detections = classifier.predict_boards([image], [location], args.conf)[0]
+            return detections_to_board(detections, location)
+
+        engines['squares'] = run_squares
+    else:
+        print(f"⚠️ Classifieur de cases introuvable: {args.squares}")
+
+    from ultralytics import YOLO
+    for name, weights in (('haki', args.haki), ('gear', args.gear)):
+        if not Path(weights).exists():
+            print(f"⚠️ Modèle {name} introuvable: {weights}")
+            continue
+        model = YOLO(str(weights))
+
+        def run_detection(image, model=model):
+            detections = predict_batch_with_model(model, [image], args.conf)[0]
+            # Placement comme /predict avec rectify=true (image entière si pas de plateau)
+            height, width = image.shape[:2]
+            location = locate_board(image) or full_board_location(width, height)
+            return detections_to_board(detections, location)
+
+        engines[name] = run_detection
+
+    return engines
+
+
+def detections_to_board(detections, location):
+    boxes = [(d['class'], d['bbox']['x1'], d['bbox']['y1'], d['bbox']['x2'], d['bbox']['y2'])
+             for d in detections]
+    return boxes_to_board(boxes, location.homography, [d['confidence'] for d in detections])
+
+
+def benchmark(engines, datasets, split, limit):
+    """Retourne {dataset: {moteur: métriques}}"""
+    report = {}
+    for dataset in datasets:
+        samples = []
+        for _, image, _, board in iter_annotated_images(dataset, split):
+            if board is not None:
+                samples.append((image, board))
+            if limit and len(samples) >= limit:
+                break
+        if not samples:
+            continue
+        print(f"\n📂 {dataset} ({split}) : {len(samples)} images")
+
+        report[dataset] = {}
+        for name, run in engines.items():
+            run(samples[0][0])  # Préchauffage
+            latencies, squares_ok, boards_ok = [], 0, 0
+            for image, expected in samples:
+                started = time.perf_counter()
+                predicted = run(image)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if predicted is None:
+                    continue
+                squares_ok += sum(p == e for p_row, e_row in zip(predicted, expected)
+                                  for p, e in zip(p_row, e_row))
+                boards_ok += board_to_placement(predicted) == board_to_placement(expected)
+
+            latencies = np.array(latencies)
+            report[dataset][name] = {
+                'images': len(samples),
+                'square_accuracy': round(squares_ok / (64 * len(samples)), 4),
+                'fen_accuracy': round(boards_ok / len(samples), 4),
+                'latency_ms_mean': round(float(latencies.mean()), 2),
+                'latency_ms_p50': round(float(np.percentile(latencies, 50)), 2),
+                'latency_ms_p95': round(float(np.percentile(latencies, 95)), 2),
+            }
+    return report
+
+
+def print_report(report):
+    print("\n" + "=" * 78)
+    print(f"{'Dataset':<20}{'Moteur':<10}{'Cases':>9}{'FEN':>9}{'Moy (ms)':>10}{'p50':>10}{'p95':>10}")
+    print("-" * 78)
+    for dataset, engines in report.items():
+        for name, m in engines.items():
+            print(f"{dataset:<20}{name:<10}{m['square_accuracy']:>9.2%}{m['fen_accuracy']:>9.2%}"
+                  f"{m['latency_ms_mean']:>10.1f}{m['latency_ms_p50']:>10.1f}{m['latency_ms_p95']:>10.1f}")
+    print("=" * 78)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark du classifieur de cases contre Haki et Gear.")
+    parser.add_argument('--squares', type=Path, default=BASE_DIR / 'models/square_classifier/weights/best.pt')
+    parser.add_argument('--haki', type=Path, default=BASE_DIR / 'models/senchess_haki_v1.0/weights/best.pt')
+    parser.add_argument('--gear', type=Path, default=BASE_DIR / 'models/senchess_gear_v1.1/weights/best.pt')
+    parser.add_argument('--split', type=str, default='test', choices=['train', 'val', 'test'])
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS), choices=list(DATASETS))
+    parser.add_argument('--limit', type=int, default=0, help="Nombre maximal d'images par dataset (0 = toutes)")
+    parser.add_argument('--conf', type=float, default=0.25, help="Seuil de confiance")
+    parser.add_argument('--output', type=Path, help="Fichier JSON des résultats (optionnel)")
+    args = parser.parse_args()
+
+    engines = load_engines(args)
+    if not engines:
+        print("❌ Aucun moteur disponible")
+        sys.exit(1)
+
+    report = benchmark(engines, args.datasets, args.split, args.limit)
+    print_report(report)
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"💾 Résultats sauvegardés: {args.output}")
@@ -0,0 +1,399 @@
+"""
+Test de charge de l'API Senchess (/predict)
+
+Générateur en boucle ouverte : les requêtes partent à des instants fixés à
+l'avance (arrivées de Poisson ou régulières au débit demandé), qu'il y ait
+ou non des réponses en attente. La latence est mesurée depuis l'instant
+prévu : une API saturée fait grimper la latence au lieu de ralentir le
+générateur (pas d'omission coordonnée).
+
+- cible : une URL (Cloud Run) ou l'application démarrée localement (gunicorn,
+  même configuration que le Dockerfile, cache de résultats désactivé, images
+  rendues uniques pour que les requêtes identiques simultanées ne soient pas
+  fusionnées par l'API)
+- corpus : un dossier d'images (examples/imgTest) ou un fichier JSONL de
+  requêtes capturées, une par ligne :
+      {"image": "chemin.jpg", "model": "haki", "params": {"engine": "squares"}, "t": 12.5}
+  ("image_url" à la place de "image"; "t" : instant d'arrivée en secondes,
+  rejoué tel quel avec --replay-timing)
+- paliers de débit (--rates) : courbe de saturation débit offert / obtenu
+- résultats : percentiles de latence, taux d'erreur et codes HTTP, par
+  palier et par modèle
+
+Usage :
+    python scripts/load_test.py --local --rates 1 2 4 8 --duration 30
+    python scripts/load_test.py --url https://senchess-api-....run.app --rates 2 5 --models gear haki
+    python scripts/load_test.py --url http://localhost:8080 --corpus captured.jsonl --replay-timing
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_DIR = Path(__file__).parent.parent
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+# Débit obtenu sous lequel un palier est considéré saturé (fraction du débit offert)
+SATURATION_RATIO = 0.9
+
+
+def load_corpus(source, models):
+    """
+    Requêtes à rejouer : [{'image' ou 'image_url', 'model', 'params', 't'}]
+
+    Un dossier donne une requête par image et par modèle demandé.
+    """
+    source = Path(source)
+    if source.suffix == '.jsonl':
+        corpus = []
+        with open(source) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if 'image' in entry:
+                    image = Path(entry['image'])
+                    entry['image'] = image if image.is_absolute() else source.parent / image
+                entry.setdefault('model', None)
+                entry.setdefault('params', {})
+                corpus.append(entry)
+        return corpus
+    images = sorted(p for p in source.rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+    return [{'image': path, 'model': model, 'params': {}} for path in images for model in models]
+
+
+class RequestSender:
+    """Envoie les requêtes du corpus via une session HTTP partagée (connexions réutilisées)"""
+
+    def __init__(self, base_url, concurrency, upload='raw', unique=False, timeout=60):
+        self.url = base_url.rstrip('/') + '/predict'
+        self.upload = upload
+        self.unique = unique
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._images = {}
+        self._lock = threading.Lock()
+
+    def _image_bytes(self, path):
+        with self._lock:
+            if path not in self._images:
+                self._images[path] = Path(path).read_bytes()
+            data = self._images[path]
+        if self.unique:
+            # Octets ignorés par les décodeurs après la fin de l'image : autre empreinte,
+            # pas de réponse servie par le cache de résultats
+            data += os.urandom(16)
+        return data
+
+    def send(self, entry):
+        """Retourne (code HTTP ou None, message d'erreur ou None)"""
+        params = dict(entry['params'])
+        if entry.get('model'):
+            params['model'] = entry['model']
+        try:
+            if 'image_url' in entry:
+                response = self.session.post(self.url, data={**params, 'image_url': entry['image_url']},
+                                             timeout=self.timeout)
+            elif self.upload == 'raw':
+                response = self.session.post(self.url, params=params, data=self._image_bytes(entry['image']),
+                                             headers={'Content-Type': 'application/octet-stream'},
+                                             timeout=self.timeout)
+            else:
+                response = self.session.post(self.url, data=params, files={
+                    'image': (Path(entry['image']).name, self._image_bytes(entry['image']))
+                }, timeout=self.timeout)
+            error = None if response.status_code == 200 else response.text[:200]
+            return response.status_code, error
+        except requests.RequestException as e:
+            return None, f'{type(e).__name__}: {e}'
+
+
+def arrival_times(rate, duration, arrival, rng):
+    """Instants d'envoi (s) d'un palier : Poisson (exponentielles) ou réguliers"""
+    if arrival == 'uniform':
+        return list(np.arange(0, duration, 1 / rate))
+    times, t = [], rng.expovariate(rate)
+    while t < duration:
+        times.append(t)
+        t += rng.expovariate(rate)
+    return times
+
+
+def run_step(sender, schedule, concurrency):
+    """
+    Envoie un palier en boucle ouverte
+
+    Args:
+        schedule: [(instant d'envoi en s, entrée du corpus)]
+
+    Returns:
+        tuple: (mesures [(modèle, latence ms, code, erreur)], durée du palier en s)
+    """
+    samples = []
+    samples_lock = threading.Lock()
+    started = time.perf_counter()
+
+    def task(scheduled_at, entry):
+        status, error = sender.send(entry)
+        latency_ms = (time.perf_counter() - scheduled_at) * 1000
+        with samples_lock:
+            samples.append((entry.get('model') or 'default', latency_ms, status, error))
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='load') as executor:
+        for offset, entry in schedule:
+            scheduled_at = started + offset
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(task, scheduled_at, entry)
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, elapsed):
+    """Percentiles de latence (réponses 200), taux d'erreur, codes HTTP, débit"""
+    latencies = np.float64([latency for _, latency, status, _ in samples if status == 200])
+    codes = {}
+    for _, _, status, _ in samples:
+        codes[str(status)] = codes.get(str(status), 0) + 1
+    errors = len(samples) - len(latencies)
+    summary = {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'status_codes': codes,
+        'throughput_rps': round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+    }
+    if len(latencies):
+        summary['latency_ms'] = {
+            'p50': round(float(np.percentile(latencies, 50)), 1),
+            'p90': round(float(np.percentile(latencies, 90)), 1),
+            'p95': round(float(np.percentile(latencies, 95)), 1),
+            'p99': round(float(np.percentile(latencies, 99)), 1),
+            'max': round(float(latencies.max()), 1),
+        }
+    return summary
+
+
+def fetch_server_metrics(base_url):
+    """Compteurs et files de l'API (/metrics), None si indisponible"""
+    try:
+        response = requests.get(base_url.rstrip('/') + '/metrics', timeout=5)
+        return response.json() if response.ok else None
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_local_api(port, workers, threads, keep_cache, startup_timeout=300):
+    """
+    Démarre l'API locale (gunicorn comme le Dockerfile, sinon le serveur Flask)
+
+    Returns:
+        tuple: (processus, URL de base)
+    """
+    env = dict(os.environ)
+    if not keep_cache:
+        env['RESULT_CACHE_SIZE'] = '0'
+    try:
+        import gunicorn  # noqa: F401
+        command = ['gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+                   '--threads', str(threads), '--timeout', '0', 'index:app']
+    except ImportError:
+        command = [sys.executable, '-c',
+                   f"from index import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    process = subprocess.Popen(command, cwd=BASE_DIR / 'api', env=env)
+    base_url = f'http://127.0.0.1:{port}'
+
+    # Les modèles sont chargés à l'import : attendre que /health réponde
+    deadline = time.time() + startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"L'API locale s'est arrêtée (code {process.returncode})")
+        try:
+            if requests.get(base_url + '/health', timeout=2).ok:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    process.terminate()
+    raise RuntimeError("L'API locale n'a pas démarré à temps")
+
+
+def build_schedule(corpus, rate, duration, arrival, replay_timing, rng):
+    if replay_timing:
+        timed = sorted((entry for entry in corpus if 't' in entry), key=lambda entry: entry['t'])
+        start = timed[0]['t'] if timed else 0
+        return [(entry['t'] - start, entry) for entry in timed]
+    return [(t, rng.choice(corpus)) for t in arrival_times(rate, duration, arrival, rng)]
+
+
+def run_load_test(base_url, corpus, rates, duration, concurrency, arrival='poisson', upload='raw',
+                  unique=False, replay_timing=False, cooldown=2.0, seed=0):
+    """
+    Paliers de débit successifs
+
+    Returns:
+        dict: {'settings', 'steps': [{'offered_rps', global..., 'models': {modèle: ...}}]}
+    """
+    rng = random.Random(seed)
+    sender = RequestSender(base_url, concurrency, upload, unique)
+    steps = []
+    for rate in ([None] if replay_timing else rates):
+        schedule = build_schedule(corpus, rate, duration, arrival, replay_timing, rng)
+        label = 'rejeu' if replay_timing else f'{rate} req/s'
+        print(f"🚀 Palier {label} : {len(schedule)} requêtes ...", end=' ', flush=True)
+        samples, elapsed = run_step(sender, schedule, concurrency)
+        span = duration if rate is not None else (schedule[-1][0] or 1.0)
+        step = {
+            'offered_rps': rate if rate is not None else round(len(schedule) / span, 3),
+            # Débit réellement envoyé (les arrivées de Poisson fluctuent autour du débit offert)
+            'sent_rps': round(len(schedule) / span, 3),
+            'elapsed_s': round(elapsed, 2),
+            **summarize(samples, elapsed),
+            'models': {
+                model: summarize([s for s in samples if s[0] == model], elapsed)
+                for model in sorted({s[0] for s in samples})
+            },
+            'server_metrics': fetch_server_metrics(base_url),
+            'sample_errors': sorted({error for _, _, _, error in samples if error})[:5],
+        }
+        steps.append(step)
+        latency = step.get('latency_ms', {})
+        print(f"{step['throughput_rps']:.2f} req/s obtenues, p95 {latency.get('p95', float('nan')):.0f} ms, "
+              f"erreurs {step['error_rate']:.1%}")
+        time.sleep(cooldown)
+    return {
+        'settings': {
+            'url': base_url,
+            'corpus': len(corpus),
+            'duration_s': duration,
+            'concurrency': concurrency,
+            'arrival': 'replay' if replay_timing else arrival,
+            'upload': upload,
+            'unique': unique,
+        },
+        'steps': steps,
+    }
+
+
+def saturation_point(steps, slo_ms=None):
+    """Premier palier saturé : débit obtenu < SATURATION_RATIO x envoyé, ou p95 au-delà du SLO"""
+    for step in steps:
+        p95 = step.get('latency_ms', {}).get('p95')
+        if step['throughput_rps'] < SATURATION_RATIO * step['sent_rps'] or \
+                (slo_ms and (p95 is None or p95 > slo_ms)):
+            return step
+    return None
+
+
+def print_report(report, slo_ms=None):
+    print("\n" + "=" * 92)
+    print(f"{'Offert':>8}{'Obtenu':>9}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'Erreurs':>10}  Modèles (p95)")
+    print("-" * 92)
+    for step in report['steps']:
+        latency = step.get('latency_ms', {})
+        per_model = ', '.join(
+            f"{model} {summary.get('latency_ms', {}).get('p95', float('nan')):.0f}"
+            for model, summary in step['models'].items()
+        )
+        print(f"{step['offered_rps']:>8.2f}{step['throughput_rps']:>9.2f}"
+              + ''.join(f"{latency.get(q, float('nan')):>9.0f}" for q in ('p50', 'p90', 'p95', 'p99'))
+              + f"{step['error_rate']:>10.1%}  {per_model}")
+    print("=" * 92)
+    print("Débits en req/s, latences en ms (depuis l'instant d'envoi prévu)")
+
+    saturated = saturation_point(report['steps'], slo_ms)
+    if saturated is None:
+        print("✅ Aucun palier saturé : augmenter --rates pour trouver la capacité")
+    else:
+        index = report['steps'].index(saturated)
+        capacity = report['steps'][index - 1]['throughput_rps'] if index else None
+        print(f"🔴 Saturation à {saturated['offered_rps']} req/s offertes"
+              + (f" : capacité soutenable ~{capacity} req/s par instance" if capacity else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de l'API Senchess (boucle ouverte).")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', type=str, help="URL de base de l'API")
+    target.add_argument('--local', action='store_true', help="Démarrer l'API localement (api/index.py)")
+    parser.add_argument('--corpus', type=Path, default=BASE_DIR / 'examples/imgTest',
+                        help="Dossier d'images ou fichier JSONL de requêtes capturées")
+    parser.add_argument('--models', nargs='+', default=[None],
+                        help="Modèles alternés pour un corpus d'images (défaut : celui de l'API)")
+    parser.add_argument('--rates', nargs='+', type=float, default=[1, 2, 4, 8],
+                        help="Paliers de débit offert (req/s)")
+    parser.add_argument('--duration', type=float, default=30, help="Durée d'un palier (s)")
+    parser.add_argument('--concurrency', type=int, default=32, help="Requêtes simultanées maximum")
+    parser.add_argument('--arrival', choices=['poisson', 'uniform'], default='poisson')
+    parser.add_argument('--replay-timing', action='store_true',
+                        help="Rejouer les instants 't' du corpus JSONL au lieu des paliers")
+    parser.add_argument('--upload', choices=['raw', 'multipart'], default='raw',
+                        help="Corps brut (application/octet-stream) ou formulaire multipart")
+    parser.add_argument('--unique', action='store_true',
+                        help="Rendre chaque image unique (contourne le cache de résultats et la fusion des "
+                             "requêtes identiques; implicite avec --local sauf --keep-cache)")
+    parser.add_argument('--slo-ms', type=float, help="Objectif de latence p95 (ms) pour la saturation")
+    parser.add_argument('--workers', type=int, default=1, help="Workers gunicorn (--local)")
+    parser.add_argument('--threads', type=int, default=8, help="Threads gunicorn (--local)")
+    parser.add_argument('--keep-cache', action='store_true', help="Garder le cache de résultats (--local)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, default=BASE_DIR / 'load_test_results.json',
+                        help="Fichier JSON des résultats")
+    args = parser.parse_args()
+
+    if not args.corpus.exists():
+        print(f"❌ Corpus introuvable: {args.corpus}")
+        sys.exit(1)
+    corpus = load_corpus(args.corpus, args.models)
+    if not corpus:
+        print(f"❌ Corpus vide: {args.corpus}")
+        sys.exit(1)
+    if args.replay_timing and not any('t' in entry for entry in corpus):
+        print("❌ --replay-timing : aucune entrée du corpus n'a d'instant 't'")
+        sys.exit(1)
+    print(f"📂 Corpus : {len(corpus)} requêtes ({args.corpus})")
+
+    process = None
+    base_url = args.url
+    # Sans octets uniques, l'API locale fusionnerait les requêtes identiques simultanées
+    # (une seule inférence partagée) et mesurerait une latence trop faible
+    unique = args.unique or (args.local and not args.keep_cache)
+    if args.local:
+        print("⏳ Démarrage de l'API locale...")
+        process, base_url = start_local_api(free_port(), args.workers, args.threads, args.keep_cache)
+        print(f"✅ API locale : {base_url}")
+    try:
+        report = run_load_test(base_url, corpus, args.rates, args.duration, args.concurrency, args.arrival,
+                               args.upload, unique, args.replay_timing, seed=args.seed)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print_report(report, args.slo_ms)
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"💾 Résultats sauvegardés: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
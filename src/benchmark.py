@@ -0,0 +1,452 @@
+"""
+Benchmark d'inférence des modèles Senchess AI
+
+Mesure la latence et le débit de n'importe quel modèle enregistré, quel que
+soit son format (PyTorch .pt, ONNX, ONNX quantifié, TorchScript, OpenVINO :
+tout ce que charge ultralytics.YOLO), sur un dossier d'images :
+- préchauffage avant toute mesure
+- balayage des tailles de lot, de imgsz et du nombre de threads
+- latence par lot et par image (p50/p95/p99), débit, pic de mémoire (RSS)
+- résultats JSON avec les métadonnées de l'environnement (CPU, versions)
+- résultats ajoutés à l'historique (src/history.py) pour comparer les commits
+- avec --write-costs : coûts mesurés (latence par imgsz, mémoire, chargement)
+  écrits dans MODEL_CONFIG.yaml (bloc `costs`) et api/model_costs.json, lus
+  par l'API pour le routage selon `budget_ms` (api/costs.py)
+
+Chaque configuration tourne dans un processus séparé : le nombre de threads
+(OMP/MKL/onnxruntime) est fixé avant le chargement des bibliothèques et le pic
+de mémoire mesuré est celui de la configuration seule.
+
+Usage :
+    python src/benchmark.py --models haki gear --images data/processed/test/images
+    python src/benchmark.py --models haki_onnx=models/haki.onnx --batch-sizes 1 4 --threads 1 4
+    python src/benchmark.py --models haki gear --imgsz 320 416 640 --write-costs
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from importlib import metadata
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from history import HistoryStore, git_commit, model_hash, new_run_id
+
+BASE_DIR = Path(__file__).parent.parent
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+LIBRARIES = ('torch', 'torchvision', 'ultralytics', 'onnxruntime', 'openvino', 'opencv-python',
+             'opencv-python-headless', 'numpy')
+WEIGHT_SUFFIXES = {'.pt', '.onnx', '.torchscript', '.engine', '.tflite'}
+CONFIG_PATH = BASE_DIR / 'models/MODEL_CONFIG.yaml'
+MODEL_COSTS_PATH = BASE_DIR / 'api/model_costs.json'
+
+
+def model_registry(config_path=CONFIG_PATH):
+    """
+    Modèles connus : nom -> chemin des poids
+
+    Noms courts de MODEL_CONFIG.yaml ('haki' pour senchess_haki_v1.0), puis
+    tous les poids présents dans models/*/weights (nom du dossier).
+    """
+    registry = {}
+    if Path(config_path).exists():
+        with open(config_path, 'r') as f:
+            config = yaml.safe_load(f) or {}
+        for key, info in (config.get('models') or {}).items():
+            path = BASE_DIR / info['path']
+            registry[key] = path
+            short = key.replace('senchess_', '').split('_v')[0]
+            registry.setdefault(short, path)
+    for weights in sorted((BASE_DIR / 'models').glob('*/weights/*')):
+        if weights.suffix not in WEIGHT_SUFFIXES and not weights.name.endswith('_openvino_model'):
+            continue
+        name = weights.parent.parent.name
+        if weights.stem != 'best':
+            name += f'_{weights.stem}'
+        if weights.suffix != '.pt':
+            name += f'_{backend_name(weights)}'
+        registry.setdefault(name, weights)
+    return registry
+
+
+def resolve_models(specs, registry):
+    """'haki' (nom enregistré) ou 'nom=chemin' -> [(nom, chemin)]"""
+    models = []
+    for spec in specs:
+        name, _, path = spec.partition('=')
+        if path:
+            models.append((name, Path(path)))
+        elif name in registry:
+            models.append((name, registry[name]))
+        elif Path(name).exists():
+            models.append((Path(name).stem, Path(name)))
+        else:
+            raise ValueError(f"Modèle inconnu: '{name}' (enregistrés: {', '.join(sorted(registry))})")
+    return models
+
+
+def backend_name(weights):
+    """Format des poids, tel que chargé par ultralytics"""
+    weights = Path(weights)
+    if weights.name.endswith('_openvino_model'):
+        return 'openvino'
+    if weights.suffix == '.onnx':
+        return 'onnx-int8' if 'int8' in weights.stem or 'quant' in weights.stem else 'onnx'
+    return {'.pt': 'pytorch', '.torchscript': 'torchscript', '.engine': 'tensorrt',
+            '.tflite': 'tflite'}.get(weights.suffix, weights.suffix.lstrip('.'))
+
+
+def environment():
+    """Métadonnées de l'environnement de mesure"""
+    cpu = platform.processor()
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpu = next((line.split(':', 1)[1].strip() for line in f if line.startswith('model name')), cpu)
+    except OSError:
+        pass
+    versions = {}
+    for library in LIBRARIES:
+        try:
+            versions[library] = metadata.version(library)
+        except metadata.PackageNotFoundError:
+            continue
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'hostname': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu': cpu,
+        'cpu_count': os.cpu_count(),
+        'libraries': versions,
+        'git_commit': git_commit(),
+    }
+
+
+def list_images(folder, limit=0):
+    images = sorted(p for p in Path(folder).rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+    return images[:limit] if limit else images
+
+
+def percentiles(values_ms):
+    values = np.asarray(values_ms)
+    return {
+        'mean': round(float(values.mean()), 3),
+        'p50': round(float(np.percentile(values, 50)), 3),
+        'p95': round(float(np.percentile(values, 95)), 3),
+        'p99': round(float(np.percentile(values, 99)), 3),
+        'max': round(float(values.max()), 3),
+    }
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus (Mo)"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : Ko, macOS : octets
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _run_config(weights, image_paths, batch_size, imgsz, threads, warmup, iterations, conf, result_queue):
+    """Une configuration, dans un processus dédié (threads fixés avant les imports)"""
+    for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[variable] = str(threads)
+    try:
+        import cv2
+        import torch
+        from ultralytics import YOLO
+
+        torch.set_num_threads(threads)
+        cv2.setNumThreads(threads)
+
+        images = [cv2.imread(str(path)) for path in image_paths]
+        images = [image for image in images if image is not None]
+        if not images:
+            raise ValueError("Aucune image lisible")
+
+        started = time.perf_counter()
+        model = YOLO(str(weights), task='detect')
+        load_ms = (time.perf_counter() - started) * 1000
+
+        def batches():
+            index = 0
+            while True:
+                yield [images[(index + i) % len(images)] for i in range(batch_size)]
+                index += batch_size
+
+        stream = batches()
+        for _ in range(warmup):
+            model.predict(source=next(stream), imgsz=imgsz, conf=conf, verbose=False)
+
+        latencies = []
+        detections = 0
+        for _ in range(iterations):
+            batch = next(stream)
+            started = time.perf_counter()
+            results = model.predict(source=batch, imgsz=imgsz, conf=conf, verbose=False)
+            latencies.append((time.perf_counter() - started) * 1000)
+            detections += sum(len(result.boxes) for result in results)
+
+        total_s = sum(latencies) / 1000
+        result_queue.put({
+            'load_ms': round(load_ms, 1),
+            'batch_latency_ms': percentiles(latencies),
+            'image_latency_ms': percentiles(np.asarray(latencies) / batch_size),
+            'throughput_ips': round(iterations * batch_size / total_s, 2),
+            'detections_per_image': round(detections / (iterations * batch_size), 2),
+            'peak_rss_mb': peak_rss_mb(),
+            'samples_ms': [round(latency / batch_size, 3) for latency in latencies],
+        })
+    except Exception as e:
+        result_queue.put({'error': f'{type(e).__name__}: {e}'})
+
+
+def run_config(weights, image_paths, batch_size, imgsz, threads, warmup=3, iterations=20, conf=0.25,
+               timeout=1800):
+    """Mesure une configuration dans un processus séparé"""
+    context = multiprocessing.get_context('spawn')
+    result_queue = context.Queue()
+    process = context.Process(target=_run_config, args=(
+        str(weights), [str(p) for p in image_paths], batch_size, imgsz, threads, warmup, iterations, conf,
+        result_queue
+    ))
+    process.start()
+    try:
+        result = result_queue.get(timeout=timeout)
+    except Exception:
+        result = {'error': 'Délai dépassé'}
+    process.join(timeout=10)
+    if process.is_alive():
+        process.terminate()
+    return result
+
+
+def run_benchmark(models, image_paths, batch_sizes=(1,), imgsizes=(640,), threads=(None,), warmup=3,
+                  iterations=20, conf=0.25):
+    """
+    Balaye toutes les configurations de chaque modèle
+
+    Returns:
+        dict: {'environment', 'settings', 'results': [...]}
+    """
+    threads = [t or os.cpu_count() for t in threads]
+    results = []
+    for name, weights in models:
+        if not Path(weights).exists():
+            print(f"⚠️ Poids introuvables pour {name}: {weights}")
+            continue
+        for imgsz in imgsizes:
+            for batch_size in batch_sizes:
+                for thread_count in threads:
+                    print(f"⏱️  {name} ({backend_name(weights)}) imgsz={imgsz} batch={batch_size} "
+                          f"threads={thread_count} ...", end=' ', flush=True)
+                    measure = run_config(weights, image_paths, batch_size, imgsz, thread_count,
+                                         warmup, iterations, conf)
+                    if 'error' in measure:
+                        print(f"❌ {measure['error']}")
+                    else:
+                        print(f"p50 {measure['image_latency_ms']['p50']:.1f} ms/image, "
+                              f"{measure['throughput_ips']:.1f} images/s")
+                    results.append({
+                        'model': name,
+                        'weights': str(weights),
+                        'backend': backend_name(weights),
+                        'imgsz': imgsz,
+                        'batch_size': batch_size,
+                        'threads': thread_count,
+                        **measure,
+                    })
+    return {
+        'environment': environment(),
+        'settings': {
+            'images': len(image_paths),
+            'warmup': warmup,
+            'iterations': iterations,
+            'conf': conf,
+        },
+        'results': results,
+    }
+
+
+def record_history(report, store=None):
+    """Ajoute les configurations mesurées à l'historique; retourne le run_id"""
+    store = store or HistoryStore()
+    run_id = new_run_id('benchmark')
+    for r in report['results']:
+        if 'error' in r:
+            continue
+        config = {key: r[key] for key in ('backend', 'imgsz', 'batch_size', 'threads')}
+        config.update(images=report['settings']['images'], conf=report['settings']['conf'],
+                      cpu=report['environment']['cpu'])
+        metrics = {f"image_latency_ms.{k}": v for k, v in r['image_latency_ms'].items()}
+        metrics.update(throughput_ips=r['throughput_ips'], peak_rss_mb=r['peak_rss_mb'], load_ms=r['load_ms'])
+        store.record(run_id, 'benchmark', r['model'], r['weights'], config, metrics,
+                     {'image_latency_ms': r['samples_ms']})
+    return run_id
+
+
+def api_model_name(name):
+    """Nom du modèle dans l'API : 'haki_onnx' ou 'senchess_haki_v1.0' -> 'haki'"""
+    return name.replace('senchess_', '').split('_v')[0].split('_')[0]
+
+
+def measured_costs(report):
+    """
+    Coûts par modèle de l'API et par backend, depuis les mesures à lot de 1
+    (une requête /predict = une image; à plusieurs nombres de threads, le plus grand)
+
+    Returns:
+        dict: {modèle: {backend: {'load_ms', 'peak_rss_mb', 'threads', 'latency_ms': {imgsz: {p50, p95}}}}}
+    """
+    costs = {}
+    results = [r for r in report['results'] if 'error' not in r and r['batch_size'] == 1]
+    for r in sorted(results, key=lambda r: r['threads']):
+        backend = costs.setdefault(api_model_name(r['model']), {}).setdefault(r['backend'], {
+            'weights_hash': model_hash(r['weights']), 'load_ms': r['load_ms'], 'peak_rss_mb': r['peak_rss_mb'],
+            'threads': r['threads'], 'latency_ms': {}})
+        backend['load_ms'] = min(backend['load_ms'], r['load_ms'])
+        backend['peak_rss_mb'] = max(backend['peak_rss_mb'], r['peak_rss_mb'])
+        backend['threads'] = r['threads']
+        backend['latency_ms'][r['imgsz']] = {key: r['image_latency_ms'][key] for key in ('p50', 'p95')}
+    return costs
+
+
+def _replace_costs_block(lines, model_key, block):
+    """Remplace (ou insère avant `training:`) le bloc `costs` d'un modèle, commentaires conservés"""
+    start = lines.index(f'  {model_key}:\n')
+    end = next((i for i in range(start + 1, len(lines))
+                if lines[i].strip() and len(lines[i]) - len(lines[i].lstrip()) <= 2), len(lines))
+    section = lines[start:end]
+    costs = next((i for i, line in enumerate(section) if line.startswith('    costs:')), None)
+    if costs is not None:
+        stop = next((i for i in range(costs + 1, len(section))
+                     if section[i].strip() and len(section[i]) - len(section[i].lstrip()) <= 4), len(section))
+        section[costs:stop] = block + ['    \n']
+    else:
+        training = next((i for i, line in enumerate(section) if line.startswith('    training:')), len(section))
+        section[training:training] = block + ['    \n']
+    lines[start:end] = section
+
+
+def write_costs(report, config_path=CONFIG_PATH, costs_path=MODEL_COSTS_PATH):
+    """
+    Écrit les coûts mesurés dans MODEL_CONFIG.yaml et api/model_costs.json
+
+    Les backends déjà mesurés et non repris dans ce rapport sont conservés.
+
+    Returns:
+        list: Modèles de l'API mis à jour
+    """
+    costs = measured_costs(report)
+    if not costs:
+        return []
+    with open(config_path, 'r') as f:
+        text = f.read()
+    config = yaml.safe_load(text) or {}
+    keys = {api_model_name(key): key for key in (config.get('models') or {})}
+    measured = report['environment']['timestamp'][:19]
+
+    lines = text.splitlines(keepends=True)
+    for name, backends in costs.items():
+        if name not in keys:
+            continue
+        previous = config['models'][keys[name]].get('costs') or {}
+        merged = {**previous.get('backends', {}), **backends}
+        block = {'measured': measured, 'cpu': report['environment']['cpu'], 'backends': merged}
+        dumped = yaml.safe_dump({'costs': block}, sort_keys=False, allow_unicode=True, default_flow_style=None)
+        _replace_costs_block(lines, keys[name], ['    ' + line + '\n' for line in dumped.splitlines()])
+    with open(config_path, 'w') as f:
+        f.write(''.join(lines))
+
+    data = json.loads(Path(costs_path).read_text()) if Path(costs_path).exists() else {}
+    models = data.get('models', {})
+    for name, backends in costs.items():
+        entry = models.setdefault(name, {'backends': {}})
+        # JSON : clés imgsz en chaînes
+        entry['backends'].update(json.loads(json.dumps(backends)))
+        if name in keys:
+            entry['metrics'] = config['models'][keys[name]].get('metrics', {})
+    data.update(generated=report['environment']['timestamp'], environment={
+        key: report['environment'][key] for key in ('cpu', 'cpu_count', 'git_commit')}, models=models)
+    Path(costs_path).write_text(json.dumps(data, indent=2))
+    return sorted(costs)
+
+
+def print_report(report):
+    print("\n" + "=" * 100)
+    print(f"{'Modèle':<18}{'Backend':<12}{'imgsz':>6}{'Lot':>5}{'Thr':>5}"
+          f"{'p50':>9}{'p95':>9}{'p99':>9}{'img/s':>9}{'RSS Mo':>9}")
+    print("-" * 100)
+    for r in report['results']:
+        if 'error' in r:
+            print(f"{r['model']:<18}{r['backend']:<12}{r['imgsz']:>6}{r['batch_size']:>5}{r['threads']:>5}"
+                  f"   ❌ {r['error']}")
+            continue
+        latency = r['image_latency_ms']
+        print(f"{r['model']:<18}{r['backend']:<12}{r['imgsz']:>6}{r['batch_size']:>5}{r['threads']:>5}"
+              f"{latency['p50']:>9.1f}{latency['p95']:>9.1f}{latency['p99']:>9.1f}"
+              f"{r['throughput_ips']:>9.1f}{r['peak_rss_mb']:>9.0f}")
+    print("=" * 100)
+    print("Latences en ms par image (lot / taille du lot)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark d'inférence des modèles Senchess AI.")
+    parser.add_argument('--models', nargs='+', default=['haki', 'gear'],
+                        help="Modèles enregistrés, chemins de poids ou nom=chemin")
+    parser.add_argument('--images', type=str, default='data/processed/test/images',
+                        help="Dossier (ou image) de test")
+    parser.add_argument('--limit', type=int, default=64, help="Nombre maximal d'images chargées (0 = toutes)")
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1])
+    parser.add_argument('--imgsz', nargs='+', type=int, default=[640])
+    parser.add_argument('--threads', nargs='+', type=int, default=[os.cpu_count()])
+    parser.add_argument('--warmup', type=int, default=3, help="Lots de préchauffage")
+    parser.add_argument('--iterations', type=int, default=20, help="Lots mesurés")
+    parser.add_argument('--conf', type=float, default=0.25, help="Seuil de confiance")
+    parser.add_argument('--output', type=str, default='benchmark_results.json', help="Fichier JSON des résultats")
+    parser.add_argument('--list', action='store_true', help="Lister les modèles enregistrés")
+    parser.add_argument('--no-history', action='store_true', help="Ne pas ajouter les résultats à l'historique")
+    parser.add_argument('--write-costs', action='store_true',
+                        help="Écrire les coûts mesurés dans MODEL_CONFIG.yaml et api/model_costs.json")
+    args = parser.parse_args()
+
+    registry = model_registry()
+    if args.list:
+        for name, weights in sorted(registry.items()):
+            status = '✅' if Path(weights).exists() else '❌'
+            print(f"{status} {name:<28} {backend_name(weights):<12} {weights}")
+        return
+
+    source = Path(args.images)
+    source = source if source.is_absolute() else BASE_DIR / source
+    image_paths = [source] if source.is_file() else list_images(source, args.limit)
+    if not image_paths:
+        print(f"❌ Aucune image dans {source}")
+        sys.exit(1)
+
+    report = run_benchmark(resolve_models(args.models, registry), image_paths, args.batch_sizes, args.imgsz,
+                           args.threads, args.warmup, args.iterations, args.conf)
+    print_report(report)
+
+    output = Path(args.output)
+    output = output if output.is_absolute() else BASE_DIR / output
+    output.write_text(json.dumps(report, indent=2))
+    print(f"💾 Résultats sauvegardés: {output}")
+    if not args.no_history:
+        print(f"🗂️  Historique: {record_history(report)} (python src/history.py compare)")
+    if args.write_costs:
+        updated = write_costs(report)
+        if updated:
+            print(f"💰 Coûts mesurés écrits ({', '.join(updated)}): {CONFIG_PATH.name}, {MODEL_COSTS_PATH}")
+        else:
+            print("⚠️ Aucune mesure à lot de 1 : coûts non écrits (--batch-sizes 1)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Construction de l'index de glyphes (voie rapide des diagrammes 2D de l'API)
+
+Chaque case des diagrammes annotés de data/chess_decoder_1000 est hachée
+(api/glyph_index.square_hashes) et associée à son état (vide ou pièce)
+dérivé des annotations YOLO. L'index est ensuite évalué sur le split de test :
+couverture (cases trouvées sans passe Haki), précision et temps par échiquier.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.append(str(BASE_DIR / 'api'))
+
+from board import locate_board  # noqa: E402
+from glyph_index import GLYPH_MIN_VOTES, GlyphIndex, square_hashes  # noqa: E402
+from square_dataset import board_to_placement, iter_annotated_images  # noqa: E402
+
+
+def build_index(splits, dataset='chess_decoder_1000'):
+    # Pas de sauvegarde automatique dans GLYPH_INDEX_PATH (index de l'API)
+    index = GlyphIndex(save_path=None)
+    boards = 0
+    for split in splits:
+        for _, image, location, board in iter_annotated_images(dataset, split):
+            if location is None or board is None:
+                continue
+            # Mêmes coins qu'à l'exécution (localisation), l'empreinte y est sensible
+            location = locate_board(image) or location
+            # Annotation sûre : l'empreinte est connue dès la première occurrence
+            index.learn(square_hashes(image, location), [name for row in board for name in row],
+                        weight=GLYPH_MIN_VOTES)
+            boards += 1
+    print(f"✅ {boards} échiquiers indexés, {len(index)} empreintes")
+    return index
+
+
+def evaluate_index(index, split='test', dataset='chess_decoder_1000'):
+    """Couverture, précision et temps (localisation + hachage + recherche) par échiquier"""
+    squares = hits = correct = boards = complete = 0
+    timings = []
+    for _, image, _, board in iter_annotated_images(dataset, split):
+        if board is None:
+            continue
+        started = time.perf_counter()
+        location = locate_board(image)
+        if location is None:
+            continue
+        names, _ = index.lookup(square_hashes(image, location))
+        timings.append((time.perf_counter() - started) * 1000)
+
+        expected = [name for row in board for name in row]
+        boards += 1
+        squares += 64
+        hits += sum(name is not None for name in names)
+        correct += sum(name == truth for name, truth in zip(names, expected))
+        if None not in names:
+            predicted = [names[r * 8:(r + 1) * 8] for r in range(8)]
+            complete += board_to_placement(predicted) == board_to_placement(board)
+
+    if not boards:
+        print("⚠️ Aucun échiquier de test")
+        return
+    print(f"\n📈 Évaluation sur '{split}' ({boards} échiquiers)")
+    print(f"   Cases trouvées dans l'index : {hits / squares:.2%}")
+    print(f"   Précision des cases trouvées: {correct / max(hits, 1):.2%}")
+    print(f"   Échiquiers sans passe Haki  : {complete / boards:.2%} (FEN exacte)")
+    print(f"   Temps par échiquier         : {np.mean(timings):.2f} ms "
+          f"(p95 {np.percentile(timings, 95):.2f} ms)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Construit l'index de glyphes à partir de chess_decoder_1000.")
+    parser.add_argument('--splits', nargs='+', default=['train', 'val'], help="Splits indexés")
+    parser.add_argument('--output', type=str, default='models/glyph_index/glyph_index.npz',
+                        help="Fichier de l'index")
+    parser.add_argument('--no-eval', action='store_true', help="Ne pas évaluer sur le split de test")
+    args = parser.parse_args()
+
+    index = build_index(args.splits)
+    output = BASE_DIR / args.output
+    output.parent.mkdir(parents=True, exist_ok=True)
+    index.save(str(output))
+    print(f"💾 Index sauvegardé: {output}")
+
+    if not args.no_eval:
+        evaluate_index(index)
@@ -0,0 +1,146 @@
+"""
+Métriques de détection recalculées à partir de prédictions brutes
+
+Les prédictions à seuil bas (src/prediction_cache.py) sont appariées une
+seule fois aux annotations, pour les dix seuils d'IoU 0.50:0.95 à la fois.
+Tout le reste en découle sans nouvelle inférence :
+- mAP50 et mAP50-95 (précision interpolée sur 101 points de rappel, comme COCO)
+- précision / rappel / F1 à n'importe quel seuil de confiance (balayage)
+- courbes précision-rappel par classe
+
+Les classes sont comparées par nom ('white-king'...) : les modèles et les
+datasets n'ont pas tous le même ordre de classes.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.append(str(BASE_DIR / 'api'))
+
+from fusion import pairwise_iou  # noqa: E402
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+RECALL_POINTS = np.linspace(0, 1, 101)
+
+
+def match_image(pred_boxes, pred_scores, pred_classes, gt_boxes, gt_classes, iou_thresholds=IOU_THRESHOLDS):
+    """
+    Apparie les prédictions d'une image aux annotations (glouton, par confiance décroissante)
+
+    Returns:
+        np.ndarray: (N, T) vrai positif de chaque prédiction pour chaque seuil d'IoU
+    """
+    tp = np.zeros((len(pred_boxes), len(iou_thresholds)), dtype=bool)
+    if not len(pred_boxes) or not len(gt_boxes):
+        return tp
+    same_class = np.asarray(pred_classes)[:, None] == np.asarray(gt_classes)[None, :]
+    ious = np.where(same_class, pairwise_iou(pred_boxes, gt_boxes), 0.0)
+    matched = np.zeros((len(iou_thresholds), len(gt_boxes)), dtype=bool)
+    order = np.argsort(-pred_scores, kind='stable')
+    # Une prédiction sans recouvrement suffisant est fausse à tous les seuils
+    for i in order[ious[order].max(axis=1) >= iou_thresholds[0]]:
+        valid = ~matched & (ious[i][None, :] >= iou_thresholds[:, None])
+        has_match = valid.any(axis=1)
+        best = np.where(valid, ious[i][None, :], -1.0).argmax(axis=1)
+        matched[has_match, best[has_match]] = True
+        tp[i, has_match] = True
+    return tp
+
+
+class MatchedPredictions:
+    """
+    Prédictions d'un dataset appariées aux annotations
+
+    Args:
+        predictions: {image: (boîtes (N, 4), confiances (N,), classes (N,))}
+        ground_truth: {image: (boîtes (M, 4), classes (M,))}
+    """
+
+    def __init__(self, predictions, ground_truth, iou_thresholds=IOU_THRESHOLDS):
+        self.iou_thresholds = np.asarray(iou_thresholds)
+        scores, classes, tps = [], [], []
+        gt_classes = []
+        for image, (gt_boxes, gt_names) in ground_truth.items():
+            gt_classes.extend(gt_names)
+            boxes, image_scores, names = predictions.get(image, (np.zeros((0, 4)), np.zeros(0), []))
+            tps.append(match_image(np.asarray(boxes), np.asarray(image_scores), names, np.asarray(gt_boxes),
+                                   gt_names, self.iou_thresholds))
+            scores.append(np.asarray(image_scores, dtype=np.float64))
+            classes.extend(names)
+        order = np.argsort(-np.concatenate(scores), kind='stable') if scores else np.zeros(0, dtype=int)
+        self.scores = np.concatenate(scores)[order] if scores else np.zeros(0)
+        self.classes = np.asarray(classes, dtype=object)[order]
+        self.tp = np.concatenate(tps)[order] if tps else np.zeros((0, len(self.iou_thresholds)), dtype=bool)
+        names, counts = np.unique(np.asarray(gt_classes, dtype=object), return_counts=True)
+        self.gt_counts = dict(zip(names.tolist(), counts.tolist()))
+
+    def class_curve(self, name, iou_index=0):
+        """Précision et rappel cumulés d'une classe, par confiance décroissante"""
+        mask = self.classes == name
+        tp = self.tp[mask, iou_index]
+        cumulative_tp = np.cumsum(tp)
+        precision = cumulative_tp / np.arange(1, len(tp) + 1)
+        recall = cumulative_tp / self.gt_counts[name]
+        return precision, recall, self.scores[mask]
+
+    def interpolated_precision(self, name, iou_index=0):
+        """Précision interpolée (enveloppe décroissante) aux 101 points de rappel"""
+        precision, recall, _ = self.class_curve(name, iou_index)
+        if not len(precision):
+            return np.zeros(len(RECALL_POINTS))
+        envelope = np.maximum.accumulate(precision[::-1])[::-1]
+        index = np.searchsorted(recall, RECALL_POINTS, side='left')
+        return np.where(index < len(envelope), envelope[np.minimum(index, len(envelope) - 1)], 0.0)
+
+    def average_precision(self):
+        """AP (C, T) de chaque classe annotée à chaque seuil d'IoU"""
+        return np.array([
+            [self.interpolated_precision(name, t).mean() for t in range(len(self.iou_thresholds))]
+            for name in sorted(self.gt_counts)
+        ]).reshape(-1, len(self.iou_thresholds))
+
+    def precision_recall(self, conf, iou_index=0):
+        """Précision et rappel moyens sur les classes annotées au seuil de confiance `conf`"""
+        kept = self.scores >= conf
+        precisions, recalls = [], []
+        for name, count in self.gt_counts.items():
+            mask = kept & (self.classes == name)
+            predicted = mask.sum()
+            true_positives = self.tp[mask, iou_index].sum()
+            precisions.append(true_positives / predicted if predicted else 0.0)
+            recalls.append(true_positives / count)
+        return float(np.mean(precisions)) if precisions else 0.0, float(np.mean(recalls)) if recalls else 0.0
+
+    def summary(self, conf):
+        """Métriques principales (en %, comme SenchessEvaluator.evaluate_model)"""
+        ap = self.average_precision()
+        precision, recall = self.precision_recall(conf)
+        return {
+            'mAP50': round(float(ap[:, 0].mean()) * 100, 3) if len(ap) else 0.0,
+            'mAP50-95': round(float(ap.mean()) * 100, 3) if len(ap) else 0.0,
+            'precision': round(precision * 100, 3),
+            'recall': round(recall * 100, 3),
+        }
+
+    def conf_sweep(self, thresholds):
+        """Précision, rappel et F1 (%) pour chaque seuil de confiance"""
+        rows = []
+        for conf in thresholds:
+            precision, recall = self.precision_recall(conf)
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            rows.append({'conf': round(float(conf), 4), 'precision': round(precision * 100, 3),
+                         'recall': round(recall * 100, 3), 'f1': round(f1 * 100, 3)})
+        return rows
+
+    def pr_curves(self, iou_index=0):
+        """Courbes précision-rappel (101 points de rappel) par classe et moyenne"""
+        curves = {name: self.interpolated_precision(name, iou_index) for name in sorted(self.gt_counts)}
+        mean = np.mean(list(curves.values()), axis=0) if curves else np.zeros(len(RECALL_POINTS))
+        return {
+            'recall': RECALL_POINTS.round(2).tolist(),
+            'mean': mean.round(4).tolist(),
+            'classes': {name: curve.round(4).tolist() for name, curve in curves.items()},
+        }
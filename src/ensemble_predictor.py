@@ -12,6 +12,8 @@ import cv2
 from typing import List, Dict, Tuple
 import argparse
 
+from profiling import add_profile_argument, profiled, stage, timed_predict
+
 
 class SenchessEnsemble:
     """
@@ -38,10 +40,11 @@ class SenchessEnsemble:
         for model_name, model_info in config['models'].items():
             model_path = self.base_dir / model_info['path']
             if model_path.exists():
-                models[model_name] = {
-                    'model': YOLO(str(model_path)),
-                    'info': model_info
-                }
+                with stage('model_load'):
+                    models[model_name] = {
+                        'model': YOLO(str(model_path)),
+                        'info': model_info
+                    }
                 print(f"  ✓ {model_name}: {model_info['full_name']}")
             else:
                 print(f"  ⚠️  {model_name}: Modèle introuvable")
@@ -49,8 +52,10 @@ class SenchessEnsemble:
         # Ajouter Gear v1.1 s'il existe
         gear_v11_path = self.base_dir / 'models/senchess_gear_v1.1/weights/best.pt'
         if gear_v11_path.exists():
+            with stage('model_load'):
+                model = YOLO(str(gear_v11_path))
             models['senchess_gear_v1.1'] = {
-                'model': YOLO(str(gear_v11_path)),
+                'model': model,
                 'info': {
                     'full_name': 'Senchess Gear v1.1',
                     'version': '1.1',
@@ -83,7 +88,7 @@ class SenchessEnsemble:
         
         for model_name, model_data in self.models.items():
             model = model_data['model']
-            results = model.predict(image_path, conf=conf_threshold, verbose=False)
+            results = timed_predict(model, image_path, conf=conf_threshold, verbose=False)
             
             boxes = results[0].boxes
             if len(boxes) > 0:
@@ -146,7 +151,7 @@ class SenchessEnsemble:
         
         for model_name, model_data in self.models.items():
             model = model_data['model']
-            results = model.predict(image_path, conf=conf_threshold, verbose=False)
+            results = timed_predict(model, image_path, conf=conf_threshold, verbose=False)
             
             boxes = results[0].boxes
             if len(boxes) > 0:
@@ -161,40 +166,41 @@ class SenchessEnsemble:
         if not all_boxes:
             return {'detections': 0, 'strategy': 'fusion'}
         
-        # Appliquer NMS pour fusionner les détections qui se chevauchent
-        all_boxes = np.array(all_boxes)
-        all_confidences = np.array(all_confidences)
-        all_class_ids = np.array(all_class_ids)
-        
-        # Convertir au format NMS (x, y, w, h)
-        boxes_xywh = all_boxes.copy()
-        boxes_xywh[:, 2] = all_boxes[:, 2] - all_boxes[:, 0]  # width
-        boxes_xywh[:, 3] = all_boxes[:, 3] - all_boxes[:, 1]  # height
-        
-        # Appliquer NMS par classe
-        final_boxes = []
-        final_confidences = []
-        final_classes = []
-        
-        for class_id in np.unique(all_class_ids):
-            mask = all_class_ids == class_id
-            class_boxes = boxes_xywh[mask]
-            class_confs = all_confidences[mask]
+        with stage('postprocess', count=0):
+            # Appliquer NMS pour fusionner les détections qui se chevauchent
+            all_boxes = np.array(all_boxes)
+            all_confidences = np.array(all_confidences)
+            all_class_ids = np.array(all_class_ids)
             
-            # NMS avec OpenCV
-            indices = cv2.dnn.NMSBoxes(
-                class_boxes.tolist(),
-                class_confs.tolist(),
-                conf_threshold,
-                iou_threshold
-            )
+            # Convertir au format NMS (x, y, w, h)
+            boxes_xywh = all_boxes.copy()
+            boxes_xywh[:, 2] = all_boxes[:, 2] - all_boxes[:, 0]  # width
+            boxes_xywh[:, 3] = all_boxes[:, 3] - all_boxes[:, 1]  # height
+            
+            # Appliquer NMS par classe
+            final_boxes = []
+            final_confidences = []
+            final_classes = []
+            
+            for class_id in np.unique(all_class_ids):
+                mask = all_class_ids == class_id
+                class_boxes = boxes_xywh[mask]
+                class_confs = all_confidences[mask]
+                
+                # NMS avec OpenCV
+                indices = cv2.dnn.NMSBoxes(
+                    class_boxes.tolist(),
+                    class_confs.tolist(),
+                    conf_threshold,
+                    iou_threshold
+                )
+                
+                if len(indices) > 0:
+                    for idx in indices.flatten():
+                        final_boxes.append(all_boxes[np.where(mask)[0][idx]])
+                        final_confidences.append(class_confs[idx])
+                        final_classes.append(class_id)
             
-            if len(indices) > 0:
-                for idx in indices.flatten():
-                    final_boxes.append(all_boxes[np.where(mask)[0][idx]])
-                    final_confidences.append(class_confs[idx])
-                    final_classes.append(class_id)
-        
         print("\n" + "=" * 70)
         print(f"🔗 FUSION: {len(all_boxes)} détections → {len(final_boxes)} après NMS")
         print(f"   Confiance moyenne: {np.mean(final_confidences)*100:.1f}%")
@@ -227,17 +233,19 @@ class SenchessEnsemble:
         print("-" * 70)
         
         # Analyser l'image
-        img = cv2.imread(str(image_path))
-        
-        # Heuristique simple: images vectorielles/générées ont moins de bruit
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        edges = cv2.Canny(gray, 50, 150)
-        edge_density = np.sum(edges > 0) / edges.size
-        
-        # Analyser la saturation des couleurs
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        saturation = hsv[:, :, 1]
-        avg_saturation = np.mean(saturation)
+        with stage('decode'):
+            img = cv2.imread(str(image_path))
+        
+        with stage('preprocess', count=0):
+            # Heuristique simple: images vectorielles/générées ont moins de bruit
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            edges = cv2.Canny(gray, 50, 150)
+            edge_density = np.sum(edges > 0) / edges.size
+            
+            # Analyser la saturation des couleurs
+            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+            saturation = hsv[:, :, 1]
+            avg_saturation = np.mean(saturation)
         
         # Décision: diagramme 2D ou photo 3D
         is_2d_diagram = edge_density < 0.15 or avg_saturation > 100
@@ -269,7 +277,7 @@ class SenchessEnsemble:
             if model_name in self.models:
                 model_data = self.models[model_name]
                 model = model_data['model']
-                results = model.predict(image_path, conf=conf_threshold, verbose=False)
+                results = timed_predict(model, image_path, conf=conf_threshold, verbose=False)
                 
                 boxes = results[0].boxes
                 if len(boxes) > 0:
@@ -338,7 +346,8 @@ class SenchessEnsemble:
             # Sauvegarder avec les annotations
             annotated = result['results'][0].plot()
             output_path = output_dir / Path(image_path).name
-            cv2.imwrite(str(output_path), annotated)
+            with stage('io'):
+                cv2.imwrite(str(output_path), annotated)
             print(f"\n💾 Image sauvegardée: {output_path}")
             result['output_path'] = str(output_path)
         
@@ -357,6 +366,7 @@ def main():
     parser.add_argument('--save', action='store_true',
                         help='Sauvegarder l\'image avec les détections')
     parser.add_argument('--output', '-o', help='Dossier de sortie')
+    add_profile_argument(parser)
     
     args = parser.parse_args()
     
@@ -364,17 +374,18 @@ def main():
     print("🎯 SENCHESS AI - ENSEMBLE PREDICTOR")
     print("=" * 70)
     
-    # Créer l'ensemble
-    ensemble = SenchessEnsemble()
-    
-    # Faire la prédiction
-    result = ensemble.predict(
-        args.image,
-        strategy=args.strategy,
-        conf_threshold=args.conf,
-        save=args.save,
-        output_dir=args.output
-    )
+    with profiled('ensemble_predictor', args.profile):
+        # Créer l'ensemble
+        ensemble = SenchessEnsemble()
+        
+        # Faire la prédiction
+        result = ensemble.predict(
+            args.image,
+            strategy=args.strategy,
+            conf_threshold=args.conf,
+            save=args.save,
+            output_dir=args.output
+        )
     
     print("\n✅ Prédiction terminée!")
 
@@ -2,52 +2,79 @@
 Script d'évaluation et de comparaison des modèles Senchess AI
 """
 import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
 from pathlib import Path
 from ultralytics import YOLO
 import yaml
 import json
 from datetime import datetime
 
+from history import HistoryStore, new_run_id
+from profiling import add_profile_argument, profiled, stage, watch_validation
+
+# Variables de threads fixées pour chaque processus d'évaluation
+THREAD_VARIABLES = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
 class SenchessEvaluator:
     """Évaluateur de modèles Senchess AI"""
     
-    def __init__(self, config_path="models/MODEL_CONFIG.yaml"):
+    def __init__(self, config_path="models/MODEL_CONFIG.yaml", history=True):
         self.base_dir = Path(__file__).parent.parent
         self.config_path = self.base_dir / config_path
         self.config = self._load_config()
+        # Toutes les évaluations de cette instance forment une exécution de l'historique
+        self.history = HistoryStore() if history else None
+        self.run_id = new_run_id('evaluation')
     
     def _load_config(self):
         """Charge la configuration des modèles"""
         with open(self.config_path, 'r') as f:
             return yaml.safe_load(f)
     
-    def evaluate_model(self, model_name, dataset_yaml=None, detailed=False):
+    def model_keys(self, available_only=True):
+        """Modèles de MODEL_CONFIG.yaml (ceux dont les poids sont présents par défaut)"""
+        keys = list(self.config['models'])
+        if available_only:
+            keys = [key for key in keys if (self.base_dir / self.config['models'][key]['path']).exists()]
+        return keys
+    
+    def _model_key(self, model_name):
+        """Clé de MODEL_CONFIG.yaml d'un modèle : clé complète ou nom court ('haki')"""
+        if model_name in self.config['models']:
+            return model_name
+        for key in self.config['models']:
+            if key.replace('senchess_', '').split('_v')[0] == model_name:
+                return key
+        raise ValueError(f"Modèle '{model_name}' non trouvé. Modèles : {', '.join(self.config['models'])}")
+    
+    def _default_dataset(self, model_info):
+        """Dataset d'entraînement du modèle"""
+        if 'chess_decoder' in str(model_info.get('training', {}).get('dataset', '')):
+            return self.base_dir / "data/chess_decoder_1000/data.yaml"
+        return self.base_dir / "data/chess_dataset.yaml"
+    
+    def evaluate_model(self, model_name, dataset_yaml=None, detailed=False, val_args=None):
         """
         Évalue un modèle sur un dataset de test
         
         Args:
-            model_name: 'haki' ou 'gear'
+            model_name: Nom court ('haki', 'gear') ou clé de MODEL_CONFIG.yaml
             dataset_yaml: Chemin vers le fichier data.yaml (optionnel)
             detailed: Afficher les métriques détaillées par classe
+            val_args: Arguments supplémentaires de model.val (optionnel)
         
         Returns:
             dict: Métriques d'évaluation
         """
-        model_key = f"senchess_{model_name}_v1.0"
-        
-        if model_key not in self.config['models']:
-            raise ValueError(f"Modèle '{model_name}' non trouvé. Utilisez 'haki' ou 'gear'")
-        
+        model_key = self._model_key(model_name)
         model_info = self.config['models'][model_key]
         model_path = self.base_dir / model_info['path']
         
-        # Déterminer le dataset à utiliser
+        # Déterminer le dataset à utiliser (par défaut celui d'entraînement du modèle)
         if dataset_yaml is None:
-            # Utiliser le dataset d'entraînement du modèle
-            if model_name == 'haki':
-                dataset_yaml = self.base_dir / "data/chess_decoder_1000/data.yaml"
-            else:  # gear
-                dataset_yaml = self.base_dir / "data/chess_dataset.yaml"
+            dataset_yaml = self._default_dataset(model_info)
         
         print("\n" + "="*70)
         print(f"📊 ÉVALUATION : {model_info['full_name']}")
@@ -59,14 +86,17 @@ class SenchessEvaluator:
         print("="*70 + "\n")
         
         # Charger et évaluer le modèle
-        model = YOLO(str(model_path))
+        with stage('model_load'):
+            model = YOLO(str(model_path))
+        watch_validation(model)
         
         print("🔄 Évaluation en cours...\n")
-        metrics = model.val(data=str(dataset_yaml), verbose=detailed)
+        metrics = model.val(data=str(dataset_yaml), verbose=detailed, **(val_args or {}))
         
         # Extraire les métriques principales
         results = {
             'model': model_info['full_name'],
+            'model_key': model_key,
             'mAP50': float(metrics.box.map50) * 100,
             'mAP50-95': float(metrics.box.map) * 100,
             'precision': float(metrics.box.mp) * 100,
@@ -85,6 +115,13 @@ class SenchessEvaluator:
         print(f"Recall    : {results['recall']:.2f}%")
         print("="*70 + "\n")
         
+        if self.history:
+            dataset_path = Path(dataset_yaml)
+            if dataset_path.is_relative_to(self.base_dir):
+                dataset_path = dataset_path.relative_to(self.base_dir)
+            self.history.record(self.run_id, 'evaluation', model_key, model_path, {'dataset': str(dataset_path)},
+                                {k: results[k] for k in ('mAP50', 'mAP50-95', 'precision', 'recall')})
+        
         # Métriques détaillées par classe
         if detailed and hasattr(metrics.box, 'ap_class_index'):
             print("\n📊 Métriques par classe :")
@@ -98,164 +135,427 @@ class SenchessEvaluator:
         
         return results
     
-    def compare_models(self, dataset_yaml=None, save_report=True):
+    def compare_models(self, dataset_yaml=None, save_report=True, models=None, datasets=None, workers=None):
         """
-        Compare les performances de Haki et Gear
+        Compare les modèles en parallèle, un processus par couple (modèle, dataset)
+        
+        Les cœurs sont répartis entre les processus (threads torch/OpenMP de
+        chacun = cœurs / processus); les résultats sont rassemblés dans un
+        seul tableau et un seul rapport JSON.
         
         Args:
-            dataset_yaml: Dataset de test (si None, utilise les datasets respectifs)
+            dataset_yaml: Dataset de test (si None, le dataset d'entraînement de chaque modèle)
             save_report: Sauvegarder le rapport en JSON
+            models: Modèles à comparer (défaut : ceux de MODEL_CONFIG.yaml dont les poids sont présents)
+            datasets: Plusieurs data.yaml : chaque modèle est évalué sur chacun
+            workers: Nombre de processus (défaut : un par couple, dans la limite des cœurs)
         
         Returns:
             dict: Comparaison des modèles
         """
-        print("\n" + "="*70)
-        print("⚖️  COMPARAISON : SENCHESS HAKI vs SENCHESS GEAR")
-        print("="*70 + "\n")
-        
-        results = {}
-        
-        # Évaluer Haki
-        print("🥇 Modèle 1/2 : Senchess Haki v1.0")
-        results['haki'] = self.evaluate_model('haki', dataset_yaml)
+        keys = [self._model_key(name) for name in models] if models else self.model_keys()
+        if not keys:
+            print("❌ Aucun modèle de MODEL_CONFIG.yaml n'a ses poids dans models/")
+            return {}
+        pairs = [(key, dataset) for key in keys for dataset in (datasets or [dataset_yaml])]
         
-        print("\n" + "-"*70 + "\n")
+        cpu_count = os.cpu_count() or 1
+        workers = max(1, min(len(pairs), workers or cpu_count))
+        threads = max(1, cpu_count // workers)
         
-        # Évaluer Gear
-        print("🥈 Modèle 2/2 : Senchess Gear v1.0")
-        results['gear'] = self.evaluate_model('gear', dataset_yaml)
-        
-        # Tableau comparatif
         print("\n" + "="*70)
-        print("📊 TABLEAU COMPARATIF")
-        print("="*70)
-        print(f"{'Métrique':<20} {'Haki v1.0':>15} {'Gear v1.0':>15} {'Gagnant':>15}")
-        print("-"*70)
-        
-        metrics_to_compare = ['mAP50', 'mAP50-95', 'precision', 'recall']
-        
-        for metric in metrics_to_compare:
-            haki_val = results['haki'][metric]
-            gear_val = results['gear'][metric]
-            winner = "🥇 Haki" if haki_val > gear_val else "🥈 Gear" if gear_val > haki_val else "Égalité"
-            print(f"{metric:<20} {haki_val:>14.2f}% {gear_val:>14.2f}% {winner:>15}")
-        
+        print(f"⚖️  COMPARAISON : {len(keys)} modèles, {len(pairs)} évaluations")
+        print(f"   {workers} processus x {threads} threads")
         print("="*70 + "\n")
         
-        # Recommandations
+        # Les processus lancés (spawn) héritent du budget de threads avant d'importer torch
+        previous = {name: os.environ.get(name) for name in THREAD_VARIABLES}
+        os.environ.update({name: str(threads) for name in THREAD_VARIABLES})
+        results = []
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = {
+                    pool.submit(_evaluate_worker, str(self.config_path), key,
+                                str(dataset) if dataset else None, threads): (key, dataset)
+                    for key, dataset in pairs
+                }
+                for future in as_completed(futures):
+                    key, dataset = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"❌ {key} ({dataset or 'dataset du modèle'}) : {type(e).__name__}: {e}")
+                        continue
+                    print(f"✅ {result['model']} sur {dataset_label(result['dataset'])} : "
+                          f"mAP50 {result['mAP50']:.2f}% ({result['duration_s']:.0f} s)")
+                    results.append(result)
+        finally:
+            for name, value in previous.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        
+        if self.history:
+            for result in results:
+                dataset_path = Path(result['dataset'])
+                if dataset_path.is_relative_to(self.base_dir):
+                    dataset_path = dataset_path.relative_to(self.base_dir)
+                self.history.record(self.run_id, 'evaluation', result['model_key'],
+                                    self.base_dir / self.config['models'][result['model_key']]['path'],
+                                    {'dataset': str(dataset_path)},
+                                    {k: result[k] for k in ('mAP50', 'mAP50-95', 'precision', 'recall')})
+        
+        # Tableau comparatif, meilleur modèle par dataset et par métrique
+        metrics_to_compare = ['mAP50', 'mAP50-95', 'precision', 'recall']
+        results.sort(key=lambda r: (r['dataset'], keys.index(r['model_key'])))
+        best = {}
+        for result in results:
+            for metric in metrics_to_compare:
+                current = best.setdefault(result['dataset'], {}).get(metric)
+                if current is None or result[metric] > current[1]:
+                    best[result['dataset']][metric] = (result['model_key'], result[metric])
+        
+        print("\n" + "="*86)
+        print("📊 TABLEAU COMPARATIF")
+        print("="*86)
+        print(f"{'Modèle':<24}{'Dataset':<22}" + ''.join(f"{metric:>10}" for metric in metrics_to_compare))
+        print("-"*86)
+        for result in results:
+            cells = ''
+            for metric in metrics_to_compare:
+                marker = '*' if best[result['dataset']][metric][0] == result['model_key'] else ' '
+                cells += f"{result[metric]:>9.2f}{marker}"
+            print(f"{result['model']:<24}{dataset_label(result['dataset']):<22}{cells}")
+        print("="*86)
+        print("* meilleur modèle du dataset pour la métrique\n")
+        
+        # Spécialisation de chaque modèle
         print("💡 RECOMMANDATIONS D'USAGE :")
         print("-"*70)
-        print("  Senchess Haki v1.0 (99.5% mAP50)")
-        print("    ✅ Diagrammes d'échecs 2D générés")
-        print("    ✅ Images Chess Decoder")
-        print("    ✅ Graphiques stylisés\n")
-        print("  Senchess Gear v1.0 (98.5% mAP50)")
-        print("    ✅ Photos d'échiquiers physiques")
-        print("    ✅ Images smartphone")
-        print("    ✅ Conditions d'éclairage variées")
+        for key in keys:
+            info = self.config['models'][key]
+            print(f"  {info['full_name']} ({info['metrics']['mAP50']}% mAP50)")
+            for use in info.get('best_for', [])[:3]:
+                print(f"    ✅ {use}")
+            print()
         print("-"*70 + "\n")
         
+        report = {
+            'timestamp': datetime.now().isoformat(),
+            'workers': workers,
+            'threads_per_worker': threads,
+            'results': results,
+            'best': {dataset: {metric: key for metric, (key, _) in by_metric.items()}
+                     for dataset, by_metric in best.items()},
+        }
+        
         # Sauvegarder le rapport
         if save_report:
             report_path = self.base_dir / "evaluation_report.json"
             with open(report_path, 'w') as f:
-                json.dump(results, f, indent=2)
+                json.dump(report, f, indent=2)
             print(f"📄 Rapport sauvegardé : {report_path}\n")
+        if self.history:
+            print(f"🗂️  Historique : {self.run_id} (python src/history.py compare --kind evaluation)\n")
         
-        return results
+        return report
     
-    def benchmark(self, image_path, conf=0.25):
+    def sweep(self, model_names, dataset=None, split='val', conf=0.25, fusion='nms', fusion_ious=(0.5,),
+              imgsz=640, output="sweep_report.json"):
         """
-        Benchmark de vitesse et précision sur une image
+        Métriques recalculées depuis le cache de prédictions (src/prediction_cache.py)
+        
+        Seule la première évaluation d'un modèle sur une image passe par le
+        modèle; les balayages de seuil de confiance, d'IoU de fusion et les
+        combinaisons d'ensemble sont ensuite instantanés.
         
         Args:
-            image_path: Chemin vers l'image de test
-            conf: Seuil de confiance
+            model_names: Un modèle, ou plusieurs pour un ensemble
+            dataset: Dataset de src/square_dataset.py (défaut : celui du premier modèle)
+            split: 'train', 'val' ou 'test'
+            conf: Seuil de confiance de la précision et du rappel rapportés
+            fusion: Stratégie de fusion d'un ensemble ('serving', 'nms', 'nms-class')
+            fusion_ious: Seuils d'IoU de fusion balayés (ensemble)
+            imgsz: Taille d'entrée des modèles
+            output: Rapport JSON (balayages et courbes précision-rappel)
         
         Returns:
-            dict: Résultats du benchmark
+            dict: Rapport
         """
-        import time
-        
+        import numpy as np
+        from benchmark import model_registry, resolve_models
+        from detection_metrics import MatchedPredictions
+        from prediction_cache import PredictionCache, fuse_predictions
+        from preprocess_cache import PreprocessedSplit
+        from square_dataset import iter_labeled_images
+        
+        dataset = dataset or ('chess_decoder_1000' if model_names[0] == 'haki' else 'processed')
+        ground_truth = {
+            path: (np.float64([box[1:] for box in boxes]).reshape(-1, 4), [box[0] for box in boxes])
+            for path, _, _, boxes in iter_labeled_images(dataset, split)
+        }
+        images = list(ground_truth)
+        print(f"\n📂 {dataset} ({split}) : {len(images)} images")
+        
+        cache = PredictionCache()
+        models = resolve_models(model_names, model_registry())
+        # Images décodées et letterboxées une seule fois pour tous les modèles à inférer
+        preprocessed = None
+        if any(cache.missing(weights, images, imgsz) for _, weights in models):
+            preprocessed = PreprocessedSplit.build(images, imgsz, f'{dataset}-{split}')
+        per_model = {name: cache.predictions(weights, images, imgsz, preprocessed=preprocessed)
+                     for name, weights in models}
+        
+        # Modèle seul, ou ensemble à chaque seuil d'IoU de fusion
+        variants = [(None, per_model[models[0][0]])] if len(models) == 1 else [
+            (iou, fuse_predictions(per_model, fusion, iou, conf if fusion == 'serving' else cache.raw_conf))
+            for iou in (fusion_ious if fusion != 'serving' else (None,))
+        ]
+        results = []
+        for iou, predictions in variants:
+            matched = MatchedPredictions(predictions, ground_truth)
+            results.append((iou, matched, matched.summary(conf)))
+        best_iou, best, summary = max(results, key=lambda r: r[2]['mAP50-95'])
+        
+        label = '+'.join(model_names) + (f" ({fusion})" if len(models) > 1 else '')
         print("\n" + "="*70)
-        print(f"🏁 BENCHMARK : {Path(image_path).name}")
+        print(f"📊 {label} — conf={conf}")
+        print("="*70)
+        if len(results) > 1:
+            print(f"{'IoU fusion':<12}{'mAP50':>10}{'mAP50-95':>11}{'Precision':>11}{'Recall':>10}")
+            for iou, _, r in results:
+                print(f"{iou:<12}{r['mAP50']:>10.2f}{r['mAP50-95']:>11.2f}{r['precision']:>11.2f}{r['recall']:>10.2f}")
+            print("-"*70)
+        else:
+            for key, value in summary.items():
+                print(f"{key:<10}: {value:.2f}%")
+            print("-"*70)
+        
+        conf_sweep = best.conf_sweep(np.round(np.arange(0.05, 0.96, 0.05), 2))
+        best_f1 = max(conf_sweep, key=lambda row: row['f1'])
+        print(f"{'conf':<8}{'Precision':>11}{'Recall':>10}{'F1':>8}")
+        for row in conf_sweep:
+            marker = '  ⬅ F1 max' if row is best_f1 else ''
+            print(f"{row['conf']:<8}{row['precision']:>11.2f}{row['recall']:>10.2f}{row['f1']:>8.2f}{marker}")
         print("="*70 + "\n")
         
-        results = {}
-        
-        for model_name in ['haki', 'gear']:
-            model_key = f"senchess_{model_name}_v1.0"
-            model_info = self.config['models'][model_key]
-            model_path = self.base_dir / model_info['path']
-            
-            print(f"⏱️  Test : {model_info['full_name']}")
-            
-            # Charger le modèle
-            start_load = time.time()
-            model = YOLO(str(model_path))
-            load_time = time.time() - start_load
-            
-            # Inférence (10 itérations pour moyenne)
-            times = []
-            for i in range(10):
-                start = time.time()
-                result = model.predict(source=image_path, conf=conf, verbose=False)
-                times.append(time.time() - start)
-            
-            avg_inference_time = sum(times) / len(times)
-            detections = len(result[0].boxes)
-            avg_conf = result[0].boxes.conf.cpu().numpy().mean() if detections > 0 else 0
-            
-            results[model_name] = {
-                'load_time': load_time,
-                'inference_time': avg_inference_time,
-                'detections': detections,
-                'avg_confidence': float(avg_conf)
-            }
-            
-            print(f"  Chargement    : {load_time:.3f}s")
-            print(f"  Inférence     : {avg_inference_time:.3f}s (moyenne sur 10)")
-            print(f"  Détections    : {detections}")
-            print(f"  Confiance moy : {avg_conf:.2%}\n")
-        
-        # Comparaison
-        print("="*70)
-        print("🏆 RÉSULTATS")
-        print("="*70)
-        faster = 'haki' if results['haki']['inference_time'] < results['gear']['inference_time'] else 'gear'
-        more_accurate = 'haki' if results['haki']['avg_confidence'] > results['gear']['avg_confidence'] else 'gear'
+        report = {
+            'models': {name: str(weights) for name, weights in models},
+            'dataset': dataset,
+            'split': split,
+            'imgsz': imgsz,
+            'conf': conf,
+            'fusion': fusion if len(models) > 1 else None,
+            'fusion_iou': best_iou,
+            'metrics': summary,
+            'fusion_sweep': [{'iou': iou, **r} for iou, _, r in results] if len(results) > 1 else [],
+            'conf_sweep': conf_sweep,
+            'best_f1_conf': best_f1['conf'],
+            'pr_curve': best.pr_curves(),
+            'timestamp': datetime.now().isoformat()
+        }
+        if output:
+            report_path = self.base_dir / output
+            with open(report_path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"📄 Rapport sauvegardé : {report_path}\n")
+        if self.history:
+            weights = models[0][1] if len(models) == 1 else None
+            self.history.record(self.run_id, 'evaluation', '+'.join(model_names), weights, {
+                'dataset': dataset, 'split': split, 'imgsz': imgsz, 'conf': conf, 'source': 'cache',
+                'fusion': report['fusion'], 'fusion_iou': best_iou
+            }, summary)
+        return report
+    
+    def evaluate_fen(self, model_names, datasets=None, split='test', conf=0.25, imgsz=None, rectify=False,
+                     limit=0, output="fen_report.json"):
+        """
+        Exactitude des FEN et débit de la chaîne de /predict (src/fen_accuracy.py)
         
-        print(f"  Plus rapide      : {faster.upper()}")
-        print(f"  Plus confiant    : {more_accurate.upper()}")
-        print("="*70 + "\n")
+        La FEN attendue est reconstruite depuis les annotations YOLO; chaque
+        image passe par décodage, modèle (ou ensemble), fusion et placement sur
+        les cases, comme une requête /predict.
         
-        return results
+        Args:
+            model_names: Un modèle, ou plusieurs fusionnés comme l'ensemble de l'API
+            datasets: Datasets de src/square_dataset.py (défaut : tous)
+            split: 'train', 'val' ou 'test'
+            conf: Seuil de confiance
+            imgsz: Taille d'entrée des modèles (défaut : celle du modèle)
+            rectify: Localiser et redresser l'échiquier avant la détection
+            limit: Nombre maximal d'images par dataset (0 = toutes)
+            output: Rapport JSON
+        
+        Returns:
+            dict: Résultats par dataset
+        """
+        from benchmark import model_registry, resolve_models
+        from fen_accuracy import evaluate_fen, load_samples
+        from square_dataset import DATASETS
+        
+        resolved = resolve_models(model_names, model_registry())
+        with stage('model_load', count=len(resolved)):
+            models = [(name, YOLO(str(weights))) for name, weights in resolved]
+        label = '+'.join(model_names)
+        report = {'models': label, 'split': split, 'conf': conf, 'imgsz': imgsz, 'rectify': rectify,
+                  'timestamp': datetime.now().isoformat(), 'datasets': {}}
+        
+        for dataset in datasets or list(DATASETS):
+            samples, skipped = load_samples(dataset, split, limit)
+            if not samples:
+                print(f"⚠️ {dataset} ({split}) : aucune image avec une FEN attendue")
+                continue
+            print(f"\n🔄 {dataset} ({split}) : {len(samples)} images ({skipped} sans FEN attendue)")
+            result = evaluate_fen(models, samples, conf, imgsz, rectify)
+            report['datasets'][dataset] = {'images': len(samples), 'skipped': skipped,
+                                           'metrics': result['metrics'], 'errors': result['errors']}
+            if self.history:
+                weights = resolved[0][1] if len(resolved) == 1 else None
+                self.history.record(self.run_id, 'evaluation', label, weights, {
+                    'dataset': dataset, 'split': split, 'conf': conf, 'imgsz': imgsz, 'rectify': rectify,
+                    'pipeline': 'fen'
+                }, result['metrics'], result['samples'])
+        
+        print("\n" + "="*86)
+        print(f"♟️  FEN DE BOUT EN BOUT : {label}" + (" (échiquier redressé)" if rectify else ""))
+        print("="*86)
+        print(f"{'Dataset':<22}{'Images':>8}{'FEN exactes':>13}{'Erreur/case':>13}{'Images/s':>10}{'p95 ms':>9}"
+              f"  Manquées/En trop/Fausses")
+        print("-"*86)
+        for dataset, r in report['datasets'].items():
+            m, e = r['metrics'], r['errors']
+            print(f"{dataset:<22}{r['images']:>8}{m['board_accuracy']:>12.2f}%{m['square_error_rate']:>12.3f}%"
+                  f"{m['images_per_second']:>10.2f}{m['latency_ms.p95']:>9.1f}  {e['missed']}/{e['extra']}/{e['wrong']}")
+        print("="*86 + "\n")
+        
+        if output:
+            report_path = self.base_dir / output
+            with open(report_path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"📄 Rapport sauvegardé : {report_path}\n")
+        return report
+    
+    def benchmark(self, image_path, conf=0.25, models=('haki', 'gear')):
+        """
+        Benchmark de latence sur une image ou un dossier d'images
+        
+        Délègue à src/benchmark.py (préchauffage, percentiles, débit, mémoire).
+        
+        Args:
+            image_path: Image ou dossier d'images de test
+            conf: Seuil de confiance
+            models: Modèles enregistrés à mesurer
+        
+        Returns:
+            dict: Rapport du benchmark (environnement et résultats)
+        """
+        from benchmark import (list_images, model_registry, print_report, record_history, resolve_models,
+                               run_benchmark)
+        
+        source = Path(image_path)
+        image_paths = [source] if source.is_file() else list_images(source, 64)
+        report = run_benchmark(resolve_models(models, model_registry()), image_paths, conf=conf)
+        print_report(report)
+        if self.history:
+            record_history(report, self.history)
+        return report
+
+
+def dataset_label(dataset_yaml):
+    """Nom court d'un dataset : dossier d'un data.yaml, sinon nom du fichier"""
+    path = Path(dataset_yaml)
+    return path.parent.name if path.stem == 'data' else path.stem
+
+
+def _evaluate_worker(config_path, model_key, dataset_yaml, threads):
+    """Évaluation d'un couple (modèle, dataset) dans un processus dédié"""
+    import time
+    import torch
+    
+    torch.set_num_threads(threads)
+    started = time.perf_counter()
+    evaluator = SenchessEvaluator(config_path, history=False)
+    # Dossier de sortie propre à chaque couple : pas de collision entre processus
+    name = f"{model_key}_{dataset_label(dataset_yaml) if dataset_yaml else 'default'}"
+    result = evaluator.evaluate_model(model_key, dataset_yaml, val_args={
+        'workers': 0, 'plots': False, 'project': str(evaluator.base_dir / 'runs/evaluate'),
+        'name': name, 'exist_ok': True
+    })
+    result['duration_s'] = round(time.perf_counter() - started, 1)
+    return result
 
 
 def main():
     parser = argparse.ArgumentParser(description="Évaluation des modèles Senchess AI")
-    parser.add_argument('--model', type=str, choices=['haki', 'gear'], 
-                       help="Modèle à évaluer (haki ou gear)")
+    parser.add_argument('--model', type=str, 
+                       help="Modèle à évaluer (haki, gear ou clé de MODEL_CONFIG.yaml)")
     parser.add_argument('--compare', action='store_true', 
-                       help="Comparer les 2 modèles")
+                       help="Comparer les modèles en parallèle (un processus par modèle et dataset)")
+    parser.add_argument('--models', nargs='+', 
+                       help="Modèles à comparer (défaut : tous ceux de MODEL_CONFIG.yaml avec des poids)")
+    parser.add_argument('--datasets', nargs='+', 
+                       help="Plusieurs data.yaml pour la comparaison (chaque modèle sur chacun)")
+    parser.add_argument('--workers', type=int, 
+                       help="Processus de la comparaison (défaut : un par évaluation, dans la limite des cœurs)")
     parser.add_argument('--benchmark', type=str, 
-                       help="Benchmarker sur une image spécifique")
+                       help="Benchmarker sur une image ou un dossier (balayages : src/benchmark.py)")
     parser.add_argument('--dataset', type=str, 
                        help="Chemin vers data.yaml pour l'évaluation")
     parser.add_argument('--detailed', action='store_true', 
                        help="Afficher les métriques détaillées par classe")
     parser.add_argument('--conf', type=float, default=0.25, 
-                       help="Seuil de confiance pour le benchmark")
+                       help="Seuil de confiance pour le benchmark et le balayage")
+    parser.add_argument('--sweep', nargs='+', metavar='MODEL',
+                       help="Métriques et balayages depuis le cache de prédictions (plusieurs modèles = ensemble)")
+    parser.add_argument('--fen', nargs='+', metavar='MODEL',
+                       help="Exactitude des FEN et débit de bout en bout (plusieurs modèles = ensemble)")
+    parser.add_argument('--rectify', action='store_true', 
+                       help="Évaluation FEN : localiser et redresser l'échiquier avant la détection")
+    parser.add_argument('--limit', type=int, default=0, 
+                       help="Évaluation FEN : images maximum par dataset (0 = toutes)")
+    parser.add_argument('--dataset-name', type=str, choices=['chess_decoder_1000', 'processed'],
+                       help="Dataset du balayage ou de l'évaluation FEN (défaut : celui du premier modèle / tous)")
+    parser.add_argument('--split', type=str, choices=['train', 'val', 'test'],
+                       help="Split du balayage (défaut : val) ou de l'évaluation FEN (défaut : test)")
+    parser.add_argument('--fusion', type=str, default='nms', choices=['serving', 'nms', 'nms-class'],
+                       help="Fusion de l'ensemble ('serving' : règle de l'API)")
+    parser.add_argument('--fusion-iou', type=float, nargs='+', default=[0.3, 0.4, 0.5, 0.6, 0.7],
+                       help="Seuils d'IoU de fusion balayés")
+    parser.add_argument('--imgsz', type=int, 
+                       help="Taille d'entrée des modèles (défaut : 640, 416 pour l'échiquier redressé)")
+    parser.add_argument('--no-history', action='store_true', 
+                       help="Ne pas ajouter les résultats à l'historique (runs/history)")
+    add_profile_argument(parser)
     
     args = parser.parse_args()
     
-    evaluator = SenchessEvaluator()
+    if args.profile and args.compare:
+        print("⚠️ --profile avec --compare : seul le processus principal est profilé "
+              "(profiler une évaluation avec --model)")
+    
+    with profiled('evaluate', args.profile):
+        run(args)
+
+
+def run(args):
+    evaluator = SenchessEvaluator(history=not args.no_history)
     
     if args.benchmark:
         evaluator.benchmark(args.benchmark, args.conf)
     
+    elif args.fen:
+        datasets = [args.dataset_name] if args.dataset_name else None
+        evaluator.evaluate_fen(args.fen, datasets, args.split or 'test',
+                               args.conf, args.imgsz, args.rectify, args.limit)
+    
+    elif args.sweep:
+        evaluator.sweep(args.sweep, args.dataset_name, args.split or 'val', args.conf, args.fusion,
+                        args.fusion_iou, args.imgsz or 640)
+    
     elif args.compare:
-        evaluator.compare_models(args.dataset)
+        evaluator.compare_models(args.dataset, models=args.models, datasets=args.datasets,
+                                 workers=args.workers)
     
     elif args.model:
         evaluator.evaluate_model(args.model, args.dataset, args.detailed)
@@ -266,6 +566,8 @@ def main():
         print("  python src/evaluate.py --compare")
         print("  python src/evaluate.py --benchmark imgTest/capture2.jpg")
         print("  python src/evaluate.py --model gear --detailed")
+        print("  python src/evaluate.py --sweep haki gear --dataset-name processed")
+        print("  python src/evaluate.py --fen gear --split test --rectify")
 
 
 if __name__ == '__main__':
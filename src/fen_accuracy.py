@@ -0,0 +1,137 @@
+"""
+Évaluation de bout en bout : exactitude des FEN et débit
+
+Ce que l'utilisateur reçoit, c'est la FEN, pas des boîtes : chaque image
+annotée passe par la chaîne de /predict et la FEN obtenue est comparée à la
+FEN reconstruite depuis les annotations YOLO (src/square_dataset.py) :
+- décodage des octets du fichier (api/inference.decode_image)
+- détection par un modèle, ou par plusieurs fusionnés comme l'ensemble de
+  l'API (merge_ensemble_detections)
+- avec `rectify` : localisation et redressement de l'échiquier (api/board.py)
+- placement des pièces sur les cases et FEN (api/fen.build_fen)
+
+Les images passent une à une, comme les requêtes /predict; la latence
+mesurée couvre toute la chaîne, décodage compris.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.append(str(BASE_DIR / 'api'))
+
+from board import RECTIFIED_IMGSZ, locate_board, map_detections, rectify_board  # noqa: E402
+from fen import build_fen, placement_to_symbols  # noqa: E402
+from inference import decode_image, merge_ensemble_detections, predict_batch_with_model  # noqa: E402
+from profiling import stage  # noqa: E402
+from square_dataset import board_to_placement, iter_annotated_images  # noqa: E402
+
+WARMUP_IMAGES = 3
+EMPTY = '1'  # Case vide (placement_to_symbols)
+
+
+def load_samples(dataset, split, limit=0):
+    """
+    Images dont la FEN attendue peut être reconstruite depuis les annotations
+
+    Returns:
+        tuple: ([(chemin, placement FEN attendu)], images écartées)
+    """
+    samples, skipped = [], 0
+    for path, _, location, board in iter_annotated_images(dataset, split):
+        if location is None or board is None:
+            skipped += 1
+            continue
+        samples.append((path, board_to_placement(board)))
+        if limit and len(samples) >= limit:
+            break
+    return samples, skipped
+
+
+def predict_placement(image_bytes, models, conf, imgsz=None, rectify=False):
+    """
+    Chaîne de /predict pour une image : octets -> partie placement de la FEN
+
+    Args:
+        models: [(nom, modèle YOLO)]; plusieurs = ensemble
+    """
+    with stage('decode'):
+        image = decode_image(image_bytes)
+    height, width = image.shape[:2]
+    with stage('preprocess'):
+        board = locate_board(image) if rectify else None
+        if board is not None:
+            source, warp = rectify_board(image, board)
+            imgsz = imgsz or RECTIFIED_IMGSZ
+        else:
+            source, warp = image, None
+
+    with stage('inference'):
+        per_model = [(name, predict_batch_with_model(model, [source], conf, imgsz)[0]) for name, model in models]
+    with stage('postprocess'):
+        detections = per_model[0][1] if len(per_model) == 1 else merge_ensemble_detections(per_model)
+        if warp is not None:
+            detections = map_detections(detections, warp)
+        fen_result = build_fen(detections, width, height, board.homography if board is not None else None)
+    return fen_result.fen.split()[0]
+
+
+def compare_placements(predicted, expected):
+    """Erreurs par case : (pièce manquée, pièce en trop, mauvaise pièce)"""
+    missed = extra = wrong = 0
+    for p, e in zip(placement_to_symbols(predicted), placement_to_symbols(expected)):
+        if p == e:
+            continue
+        if p == EMPTY:
+            missed += 1
+        elif e == EMPTY:
+            extra += 1
+        else:
+            wrong += 1
+    return missed, extra, wrong
+
+
+def evaluate_fen(models, samples, conf=0.25, imgsz=None, rectify=False, warmup=WARMUP_IMAGES):
+    """
+    Exactitude des FEN et débit de la chaîne complète
+
+    Returns:
+        dict: {'metrics', 'errors', 'samples'} — metrics en % (exactitude,
+              erreur par case) et images/s; samples : 0/1 par échiquier et
+              latences (ms) pour src/history.py
+    """
+    with stage('io', count=len(samples)):
+        payloads = [(path.read_bytes(), expected) for path, expected in samples]
+    for image_bytes, _ in payloads[:warmup]:
+        predict_placement(image_bytes, models, conf, imgsz, rectify)
+
+    exact, square_errors, latencies = [], [], []
+    errors = np.zeros(3, dtype=np.int64)
+    started = time.perf_counter()
+    for image_bytes, expected in payloads:
+        image_started = time.perf_counter()
+        predicted = predict_placement(image_bytes, models, conf, imgsz, rectify)
+        latencies.append((time.perf_counter() - image_started) * 1000)
+        image_errors = compare_placements(predicted, expected)
+        errors += image_errors
+        exact.append(int(predicted == expected))
+        square_errors.append(sum(image_errors) / 64)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'metrics': {
+            'board_accuracy': round(100 * float(np.mean(exact)), 3),
+            'square_error_rate': round(100 * float(np.mean(square_errors)), 4),
+            'images_per_second': round(len(payloads) / elapsed, 3),
+            'latency_ms.p50': round(float(np.percentile(latencies, 50)), 2),
+            'latency_ms.p95': round(float(np.percentile(latencies, 95)), 2),
+        },
+        'errors': dict(zip(('missed', 'extra', 'wrong'), errors.tolist())),
+        'samples': {
+            'board_accuracy': exact,
+            'latency_ms': [round(latency, 3) for latency in latencies],
+        },
+    }
@@ -0,0 +1,332 @@
+"""
+Historique des benchmarks et évaluations Senchess AI
+
+Chaque exécution de src/benchmark.py ou src/evaluate.py ajoute ses résultats
+à un fichier JSONL (runs/history/history.jsonl), jamais réécrit. Une ligne par
+modèle et configuration mesurés :
+- run_id : identifiant de l'exécution (toutes les lignes d'une même commande)
+- git_commit, model_hash (SHA-256 des poids), config et config_key
+- metrics : valeurs agrégées; samples : mesures brutes (latences, 0/1 par image)
+
+La commande `compare` rapproche deux exécutions (même modèle, même
+configuration) et signale les régressions :
+- échantillons continus (latences) : test de Mann-Whitney
+- échantillons 0/1 (exactitude par image) : test de deux proportions
+- valeur seule (mAP) : écart au-delà de la tolérance, sans test
+Une régression n'est signalée que si elle est significative (p < alpha) et
+dépasse l'écart minimal (min_change relatif pour la latence, min_drop points
+pour la précision) : le bruit de mesure ne suffit pas.
+
+Usage :
+    python src/history.py list
+    python src/history.py compare                      # avant-dernière vs dernière exécution
+    python src/history.py compare 3f2a1c9 latest --kind benchmark
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import socket
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).parent.parent
+HISTORY_PATH = BASE_DIR / 'runs/history/history.jsonl'
+
+# Seuil de significativité et écart minimal d'une régression : relatif pour la
+# latence et le débit, en points de pourcentage pour les métriques de précision
+ALPHA = 0.01
+MIN_CHANGE = 0.05
+MIN_DROP = 0.5
+# Échantillons minimum par côté pour un test statistique
+MIN_SAMPLES = 5
+# Métriques dont une baisse est une amélioration
+LOWER_IS_BETTER = ('latency', '_ms', 'rss', 'error_rate')
+# Métriques de précision, en pourcentage
+ACCURACY = ('map', 'precision', 'recall', 'accuracy', 'error_rate')
+
+_hash_cache = {}
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BASE_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def model_hash(weights):
+    """SHA-256 (12 caractères) des poids; un dossier (OpenVINO) est haché fichier par fichier"""
+    weights = Path(weights)
+    if not weights.exists():
+        return None
+    files = sorted(p for p in weights.rglob('*') if p.is_file()) if weights.is_dir() else [weights]
+    signature = tuple((str(p), p.stat().st_size, p.stat().st_mtime) for p in files)
+    if signature not in _hash_cache:
+        digest = hashlib.sha256()
+        for path in files:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        _hash_cache[signature] = digest.hexdigest()[:12]
+    return _hash_cache[signature]
+
+
+def config_key(config):
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:10]
+
+
+def new_run_id(kind):
+    commit = (git_commit() or 'nogit')[:7]
+    return f"{kind}-{datetime.now().strftime('%Y%m%dT%H%M%S')}-{commit}"
+
+
+class HistoryStore:
+    """Historique en ajout seul (JSONL)"""
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = Path(path)
+
+    def record(self, run_id, kind, model, weights, config, metrics, samples=None):
+        """Ajoute le résultat d'un modèle dans une configuration"""
+        entry = {
+            'run_id': run_id,
+            'kind': kind,
+            'timestamp': datetime.now().isoformat(),
+            'git_commit': git_commit(),
+            'hostname': socket.gethostname(),
+            'model': model,
+            'model_hash': model_hash(weights) if weights else None,
+            'config': config,
+            'config_key': config_key(config),
+            'metrics': metrics,
+            'samples': samples or {},
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        return entry
+
+    def entries(self, kind=None):
+        if not self.path.exists():
+            return []
+        with open(self.path) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        return [e for e in entries if kind is None or e['kind'] == kind]
+
+    def runs(self, kind=None):
+        """Exécutions dans l'ordre chronologique : [(run_id, [entrées])]"""
+        runs = {}
+        for entry in self.entries(kind):
+            runs.setdefault(entry['run_id'], []).append(entry)
+        return list(runs.items())
+
+    def find(self, spec, kind=None):
+        """
+        Exécution désignée par 'latest', 'previous', un préfixe de run_id ou de commit
+        (la plus récente à ce commit)
+        """
+        runs = self.runs(kind)
+        if not runs:
+            raise ValueError(f"Historique vide: {self.path}")
+        if spec in ('latest', 'previous'):
+            index = -1 if spec == 'latest' else -2
+            if len(runs) < -index:
+                raise ValueError("Moins de deux exécutions dans l'historique")
+            return runs[index]
+        for run_id, entries in reversed(runs):
+            if run_id.startswith(spec) or (entries[0]['git_commit'] or '').startswith(spec):
+                return run_id, entries
+        raise ValueError(f"Exécution introuvable: '{spec}'")
+
+
+def lower_is_better(metric):
+    return any(marker in metric for marker in LOWER_IS_BETTER)
+
+
+def is_accuracy(metric):
+    return any(marker in metric.lower() for marker in ACCURACY)
+
+
+def mann_whitney(a, b):
+    """p-valeur bilatérale du test de Mann-Whitney (approximation normale, ex aequo corrigés)"""
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    n1, n2 = len(a), len(b)
+    values = np.concatenate([a, b])
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    # Rang moyen de chaque valeur distincte
+    ends = np.cumsum(counts)
+    ranks = (ends - (counts - 1) / 2)[inverse]
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    ties = (counts ** 3 - counts).sum() / (n * (n - 1))
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - ties))
+    if sigma == 0:
+        return 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / sigma
+    return math.erfc(max(z, 0) / math.sqrt(2))
+
+
+def two_proportions(a, b):
+    """p-valeur bilatérale du test de deux proportions (échantillons 0/1)"""
+    n1, n2 = len(a), len(b)
+    p1, p2 = sum(a) / n1, sum(b) / n2
+    pooled = (sum(a) + sum(b)) / (n1 + n2)
+    sigma = math.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+    if sigma == 0:
+        return 1.0
+    return math.erfc(abs(p1 - p2) / sigma / math.sqrt(2))
+
+
+def compare_metric(metric, before, after, samples_before=None, samples_after=None, alpha=ALPHA,
+                   min_change=MIN_CHANGE, min_drop=MIN_DROP):
+    """
+    Compare une métrique entre deux exécutions
+
+    Les échantillons (s'il y en a) sont ceux de la métrique ou de sa famille
+    ('image_latency_ms' pour 'image_latency_ms.p95').
+
+    Returns:
+        dict: {'metric', 'before', 'after', 'change', 'unit', 'p_value', 'test', 'status'}
+              change : relatif, ou en points ('unit' = 'pts') pour la précision
+    """
+    if is_accuracy(metric):
+        change, unit, threshold = after - before, 'pts', min_drop
+    else:
+        change, unit, threshold = ((after - before) / abs(before) if before else 0.0), '%', min_change
+    worse = change > 0 if lower_is_better(metric) else change < 0
+
+    p_value, test = None, 'tolérance'
+    if samples_before is not None and samples_after is not None \
+            and min(len(samples_before), len(samples_after)) >= MIN_SAMPLES:
+        if set(samples_before) | set(samples_after) <= {0, 1}:
+            p_value, test = two_proportions(samples_before, samples_after), 'proportions'
+        else:
+            p_value, test = mann_whitney(samples_before, samples_after), 'mann-whitney'
+
+    significant = p_value is None or p_value < alpha
+    if abs(change) < threshold or not significant:
+        status = 'stable'
+    else:
+        status = 'regression' if worse else 'improvement'
+    return {
+        'metric': metric,
+        'before': before,
+        'after': after,
+        'change': round(change, 4),
+        'unit': unit,
+        'p_value': None if p_value is None else round(p_value, 6),
+        'test': test,
+        'status': status,
+    }
+
+
+def compare_runs(baseline, candidate, alpha=ALPHA, min_change=MIN_CHANGE, min_drop=MIN_DROP):
+    """
+    Compare deux exécutions, modèle par modèle et configuration par configuration
+
+    Returns:
+        list: Une ligne par (modèle, configuration) commune :
+              {'model', 'config', 'hashes', 'metrics': [comparaisons]}
+    """
+    before = {(e['kind'], e['model'], e['config_key']): e for e in baseline}
+    rows = []
+    for entry in candidate:
+        previous = before.get((entry['kind'], entry['model'], entry['config_key']))
+        if previous is None:
+            continue
+        comparisons = []
+        for metric, value in entry['metrics'].items():
+            old = previous['metrics'].get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)):
+                continue
+            family = metric.split('.')[0]
+            comparisons.append(compare_metric(
+                metric, old, value, previous['samples'].get(family), entry['samples'].get(family),
+                alpha, min_change, min_drop
+            ))
+        rows.append({
+            'model': entry['model'],
+            'config': entry['config'],
+            'hashes': (previous['model_hash'], entry['model_hash']),
+            'metrics': comparisons,
+        })
+    return rows
+
+
+def print_comparison(baseline_id, candidate_id, rows):
+    print("\n" + "=" * 96)
+    print(f"⚖️  {baseline_id}  →  {candidate_id}")
+    print("=" * 96)
+    if not rows:
+        print("⚠️ Aucun modèle ni configuration en commun")
+    icons = {'regression': '🔴', 'improvement': '🟢', 'stable': '  '}
+    for row in rows:
+        config = ' '.join(f"{k}={v}" for k, v in sorted(row['config'].items()))
+        hashes = row['hashes'][1] if row['hashes'][0] == row['hashes'][1] \
+            else f"{row['hashes'][0]} → {row['hashes'][1]}"
+        print(f"\n{row['model']} [{hashes}] {config}")
+        for c in row['metrics']:
+            p_value = '' if c['p_value'] is None else f"p={c['p_value']:.4f}"
+            change = f"{c['change']:+.2f} pts" if c['unit'] == 'pts' else f"{c['change']:+.1%}"
+            print(f"  {icons[c['status']]} {c['metric']:<28}{c['before']:>12.3f}{c['after']:>12.3f}"
+                  f"{change:>12}  {c['test']:<13}{p_value}")
+    print("=" * 96)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Historique des benchmarks et évaluations.")
+    parser.add_argument('--history', type=Path, default=HISTORY_PATH, help="Fichier JSONL de l'historique")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help="Lister les exécutions")
+    list_parser.add_argument('--kind', choices=['benchmark', 'evaluation'])
+
+    compare_parser = subparsers.add_parser('compare', help="Comparer deux exécutions")
+    compare_parser.add_argument('baseline', nargs='?', default='previous',
+                                help="Référence : run_id, commit, 'latest' ou 'previous'")
+    compare_parser.add_argument('candidate', nargs='?', default='latest', help="Exécution comparée")
+    compare_parser.add_argument('--kind', choices=['benchmark', 'evaluation'])
+    compare_parser.add_argument('--alpha', type=float, default=ALPHA, help="Seuil de significativité")
+    compare_parser.add_argument('--min-change', type=float, default=MIN_CHANGE,
+                                help="Écart relatif minimal d'une régression de latence (0.05 = 5%%)")
+    compare_parser.add_argument('--min-drop', type=float, default=MIN_DROP,
+                                help="Baisse minimale d'une métrique de précision (points de %%)")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.history)
+
+    if args.command == 'list':
+        for run_id, entries in store.runs(args.kind):
+            models = ', '.join(sorted({e['model'] for e in entries}))
+            print(f"{run_id:<44} {entries[0]['git_commit'] or '-':<14.14} {len(entries):>4} mesures  {models}")
+        return
+
+    try:
+        candidate_id, candidate = store.find(args.candidate, args.kind)
+        # Référence du même type que l'exécution comparée
+        baseline_id, baseline = store.find(args.baseline, args.kind or candidate[0]['kind'])
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+    rows = compare_runs(baseline, candidate, args.alpha, args.min_change, args.min_drop)
+    print_comparison(baseline_id, candidate_id, rows)
+
+    regressions = [c for row in rows for c in row['metrics'] if c['status'] == 'regression']
+    if regressions:
+        print(f"🔴 {len(regressions)} régression(s) significative(s)")
+        sys.exit(1)
+    print("✅ Aucune régression significative")
+
+
+if __name__ == '__main__':
+    main()
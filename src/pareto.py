@@ -0,0 +1,322 @@
+"""
+Explorateur latence / exactitude des configurations de service
+
+Chaque configuration (modèle ou ensemble, backend, imgsz, stratégie de
+fusion) est évaluée sans relancer l'API :
+- exactitude : FEN exactes et erreur par case, recalculées depuis le cache de
+  prédictions (src/prediction_cache.py) comme le chemin par défaut de
+  /predict (image entière, conf, fusion de l'ensemble, build_fen)
+- coût : latence par image mesurée par src/benchmark.py (historique, lot de 1);
+  une mesure manquante est lancée à la demande et ajoutée à l'historique. Un ensemble coûte la somme
+  de ses membres (une passe par modèle, comme predict_ensemble)
+
+La frontière de Pareto (aucune configuration à la fois plus rapide et plus
+exacte) est affichée, tracée (matplotlib, optionnel) et la configuration la
+plus exacte qui tient dans le budget de latence est écrite dans
+serving_config.json.
+
+Usage :
+    python src/pareto.py --models haki gear haki_onnx --imgsz 320 480 640 --ensembles gear+haki --budget-ms 150
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.append(str(BASE_DIR / 'api'))
+
+from benchmark import (backend_name, environment, list_images, model_registry, record_history,  # noqa: E402
+                       resolve_models, run_config)
+from fen import build_fen  # noqa: E402
+from fen_accuracy import compare_placements  # noqa: E402
+from history import HistoryStore, model_hash  # noqa: E402
+from prediction_cache import PredictionCache, fuse_predictions, to_detections  # noqa: E402
+from preprocess_cache import PreprocessedSplit  # noqa: E402
+from square_dataset import DATASETS, board_to_placement, iter_annotated_images  # noqa: E402
+
+# Nombre de lots mesurés quand une latence manque à l'historique
+MEASURE_ITERATIONS = 30
+# IoU des stratégies de fusion NMS
+FUSION_IOU = 0.5
+
+
+def load_boards(datasets, split, limit=0):
+    """Images annotées avec leur FEN attendue : [(chemin, largeur, hauteur, placement)]"""
+    samples = []
+    for dataset in datasets:
+        count = 0
+        for path, image, location, board in iter_annotated_images(dataset, split):
+            if location is None or board is None:
+                continue
+            samples.append((path, image.shape[1], image.shape[0], board_to_placement(board)))
+            count += 1
+            if limit and count >= limit:
+                break
+    return samples
+
+
+def placement_accuracy(predictions, samples, conf):
+    """FEN exactes et erreur par case (%) de prédictions {image: (boîtes, confiances, classes)}"""
+    exact, errors = 0, 0
+    for path, width, height, expected in samples:
+        boxes, scores, classes = predictions[path]
+        kept = scores >= conf
+        detections = to_detections(boxes[kept], scores[kept], [c for c, k in zip(classes, kept) if k])
+        placement = build_fen(detections, width, height).fen.split()[0]
+        exact += placement == expected
+        errors += sum(compare_placements(placement, expected))
+    return round(100 * exact / len(samples), 3), round(100 * errors / (64 * len(samples)), 4)
+
+
+def measured_latency(store, name, weights, imgsz, metric='image_latency_ms.p50'):
+    """
+    Dernière latence mesurée (lot de 1) d'un modèle, de ses poids actuels, à cet imgsz
+
+    Returns:
+        tuple: (latence ms, threads) ou None
+    """
+    weights_hash = model_hash(weights)
+    for entry in reversed(store.entries('benchmark')):
+        config = entry['config']
+        if entry['model'] == name and entry['model_hash'] == weights_hash and config.get('imgsz') == imgsz \
+                and config.get('batch_size') == 1 and metric in entry['metrics']:
+            return entry['metrics'][metric], config.get('threads') or os.cpu_count()
+    return None
+
+
+def pareto_front(rows):
+    """Configurations non dominées : triées par latence, exactitude strictement croissante"""
+    front, best = [], -1.0
+    for row in sorted(rows, key=lambda r: (r['latency_ms'], -r['board_accuracy'])):
+        if row['board_accuracy'] > best:
+            front.append(row)
+            best = row['board_accuracy']
+    return front
+
+
+def recommend(front, budget_ms):
+    """Configuration la plus exacte de la frontière dont la latence tient dans le budget"""
+    fitting = [row for row in front if row['latency_ms'] <= budget_ms]
+    return max(fitting, key=lambda r: r['board_accuracy']) if fitting else None
+
+
+def serving_config(row, budget_ms):
+    """Configuration de l'API pour une ligne de l'exploration"""
+    members = row['members']
+    return {
+        'MODEL_TYPE': members[0].split('_')[0] if len(members) == 1 else 'ensemble',
+        'members': {name: row['weights'][name] for name in members},
+        'backend': row['backend'],
+        'imgsz': row['imgsz'],
+        'fusion': row['fusion'],
+        'conf': row['conf'],
+        'budget_ms': budget_ms,
+        'expected': {key: row[key] for key in ('board_accuracy', 'square_error_rate', 'latency_ms',
+                                               'fens_per_cpu_second')},
+        'generated': datetime.now().isoformat(),
+    }
+
+
+def plot_front(rows, front, path):
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("⚠️ matplotlib non installé : pas de graphique")
+        return None
+    fig, ax = plt.subplots(figsize=(9, 6))
+    ax.scatter([r['latency_ms'] for r in rows], [r['board_accuracy'] for r in rows], color='lightgray',
+               label='Configurations')
+    ax.plot([r['latency_ms'] for r in front], [r['board_accuracy'] for r in front], 'o-', color='tab:red',
+            label='Frontière de Pareto')
+    for r in front:
+        ax.annotate(r['label'], (r['latency_ms'], r['board_accuracy']), fontsize=8,
+                    xytext=(4, -10), textcoords='offset points')
+    ax.set_xlabel('Latence par image (ms)')
+    ax.set_ylabel('FEN exactes (%)')
+    ax.grid(alpha=0.3)
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+    return path
+
+
+def explore(models, ensembles, imgsizes, fusions, samples, conf, measure=True, images_for_latency=None,
+            split_name='pareto'):
+    """
+    Évalue toute la grille
+
+    Args:
+        models: [(nom, poids)] modèles seuls
+        ensembles: [[(nom, poids), ...]] combinaisons (fusionnées par chaque stratégie)
+        imgsizes: Tailles d'entrée
+        fusions: Stratégies de fusion des ensembles (prediction_cache.FUSIONS)
+        samples: load_boards(...)
+        conf: Seuil de confiance
+        measure: Mesurer les latences absentes de l'historique
+        images_for_latency: Images du benchmark des latences manquantes
+        split_name: Nom du split prétraité partagé (src/preprocess_cache.py)
+
+    Returns:
+        list: Une ligne par configuration
+    """
+    cache = PredictionCache()
+    store = HistoryStore()
+    images = [path for path, *_ in samples]
+    members = {name: weights for name, weights in models}
+    for ensemble in ensembles:
+        members.update(ensemble)
+
+    predictions, latencies = {}, {}
+    for imgsz in imgsizes:
+        preprocessed = None
+        if any(cache.missing(weights, images, imgsz) for weights in members.values()):
+            preprocessed = PreprocessedSplit.build(images, imgsz, split_name)
+        for name, weights in members.items():
+            predictions[name, imgsz] = cache.predictions(weights, images, imgsz, preprocessed=preprocessed)
+            latency = measured_latency(store, name, weights, imgsz)
+            if latency is None and measure:
+                print(f"⏱️  Latence de {name} à imgsz={imgsz} absente de l'historique : mesure...")
+                result = run_config(weights, images_for_latency or images[:32], 1, imgsz, os.cpu_count(),
+                                    iterations=MEASURE_ITERATIONS)
+                if 'error' in result:
+                    print(f"   ❌ {result['error']}")
+                else:
+                    latency = (result['image_latency_ms']['p50'], os.cpu_count())
+                    record_history({
+                        'environment': environment(),
+                        'settings': {'images': len(images_for_latency or images[:32]), 'conf': 0.25},
+                        'results': [{'model': name, 'weights': str(weights), 'backend': backend_name(weights),
+                                     'imgsz': imgsz, 'batch_size': 1, 'threads': os.cpu_count(), **result}],
+                    }, store)
+            latencies[name, imgsz] = latency
+
+    rows = []
+    configurations = [([member], None) for member in models]
+    configurations += [(ensemble, fusion) for ensemble in ensembles for fusion in fusions]
+    for group, fusion in configurations:
+        names = [name for name, _ in group]
+        for imgsz in imgsizes:
+            costs = [latencies[name, imgsz] for name in names]
+            if any(cost is None for cost in costs):
+                print(f"⚠️ {'+'.join(names)} à imgsz={imgsz} ignoré : latence inconnue")
+                continue
+            if fusion is None:
+                merged = predictions[names[0], imgsz]
+                accuracy, square_errors = placement_accuracy(merged, samples, conf)
+            else:
+                merged = fuse_predictions({name: predictions[name, imgsz] for name in names}, fusion,
+                                          FUSION_IOU, conf)
+                accuracy, square_errors = placement_accuracy(merged, samples, 0.0)
+            latency_ms = sum(cost[0] for cost in costs)
+            cpu_seconds = sum(cost[0] * cost[1] for cost in costs) / 1000
+            label = '+'.join(names) + f"@{imgsz}" + (f" {fusion}" if fusion else '')
+            rows.append({
+                'label': label,
+                'members': names,
+                'weights': {name: str(weights) for name, weights in group},
+                'backend': '+'.join(sorted({backend_name(weights) for _, weights in group})),
+                'imgsz': imgsz,
+                'fusion': fusion,
+                'conf': conf,
+                'board_accuracy': accuracy,
+                'square_error_rate': square_errors,
+                'latency_ms': round(latency_ms, 2),
+                # FEN correctes par seconde de CPU (latence x threads de la mesure)
+                'fens_per_cpu_second': round(accuracy / 100 / cpu_seconds, 3) if cpu_seconds else None,
+            })
+    return rows
+
+
+def print_table(rows, front, recommended):
+    on_front = {row['label'] for row in front}
+    print("\n" + "=" * 98)
+    print(f"{'Configuration':<40}{'Backend':<14}{'Latence':>9}{'FEN %':>9}{'Err/case %':>12}{'FEN/CPU-s':>11}")
+    print("-" * 98)
+    for row in sorted(rows, key=lambda r: r['latency_ms']):
+        marker = '⭐' if recommended is row else ('◆' if row['label'] in on_front else ' ')
+        print(f"{marker} {row['label']:<38}{row['backend']:<14}{row['latency_ms']:>9.1f}"
+              f"{row['board_accuracy']:>9.2f}{row['square_error_rate']:>12.3f}{row['fens_per_cpu_second'] or 0:>11.2f}")
+    print("=" * 98)
+    print("◆ frontière de Pareto   ⭐ recommandée pour le budget")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frontière latence / exactitude des configurations de service.")
+    parser.add_argument('--models', nargs='+', default=['haki', 'gear'],
+                        help="Modèles seuls (noms enregistrés, poids ou nom=chemin; un backend = un poids)")
+    parser.add_argument('--ensembles', nargs='*', default=[],
+                        help="Ensembles à évaluer, membres séparés par '+' (ex: gear+haki)")
+    parser.add_argument('--imgsz', nargs='+', type=int, default=[320, 480, 640])
+    parser.add_argument('--fusion', nargs='+', default=['serving'], choices=['serving', 'nms', 'nms-class'],
+                        help="Stratégies de fusion des ensembles")
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS), choices=list(DATASETS))
+    parser.add_argument('--split', type=str, default='val', choices=['train', 'val', 'test'])
+    parser.add_argument('--limit', type=int, default=0, help="Images maximum par dataset (0 = toutes)")
+    parser.add_argument('--conf', type=float, default=0.25, help="Seuil de confiance")
+    parser.add_argument('--budget-ms', type=float, help="Budget de latence par image pour la recommandation")
+    parser.add_argument('--no-measure', action='store_true',
+                        help="Ne pas mesurer les latences absentes de l'historique (configurations ignorées)")
+    parser.add_argument('--output', type=str, default='pareto_report.json', help="Rapport JSON")
+    parser.add_argument('--plot', type=str, default='pareto.png', help="Graphique de la frontière")
+    parser.add_argument('--serving-config', type=str, default='serving_config.json',
+                        help="Configuration recommandée écrite pour le budget")
+    args = parser.parse_args()
+
+    registry = model_registry()
+    models = resolve_models(args.models, registry)
+    ensembles = [resolve_models(spec.split('+'), registry) for spec in args.ensembles]
+    missing = [str(w) for _, w in models + [m for e in ensembles for m in e] if not Path(w).exists()]
+    if missing:
+        print(f"❌ Poids introuvables : {', '.join(sorted(set(missing)))}")
+        sys.exit(1)
+
+    samples = load_boards(args.datasets, args.split, args.limit)
+    if not samples:
+        print("❌ Aucune image annotée avec une FEN attendue")
+        sys.exit(1)
+    print(f"📂 {len(samples)} échiquiers annotés ({', '.join(args.datasets)}, {args.split})")
+
+    rows = explore(models, ensembles, args.imgsz, args.fusion, samples, args.conf, not args.no_measure,
+                   list_images(BASE_DIR / 'data/processed/test/images', 32),
+                   f"pareto-{'-'.join(args.datasets)}-{args.split}")
+    if not rows:
+        print("❌ Aucune configuration évaluée")
+        sys.exit(1)
+    front = pareto_front(rows)
+    recommended = recommend(front, args.budget_ms) if args.budget_ms else None
+    print_table(rows, front, recommended)
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'datasets': args.datasets,
+        'split': args.split,
+        'images': len(samples),
+        'configurations': rows,
+        'pareto_front': [row['label'] for row in front],
+    }
+    (BASE_DIR / args.output).write_text(json.dumps(report, indent=2))
+    print(f"💾 Rapport : {BASE_DIR / args.output}")
+    if plot_front(rows, front, BASE_DIR / args.plot):
+        print(f"📈 Graphique : {BASE_DIR / args.plot}")
+
+    if args.budget_ms:
+        if recommended is None:
+            print(f"⚠️ Aucune configuration sous {args.budget_ms} ms "
+                  f"(la plus rapide : {front[0]['latency_ms']} ms)")
+        else:
+            config = serving_config(recommended, args.budget_ms)
+            (BASE_DIR / args.serving_config).write_text(json.dumps(config, indent=2))
+            print(f"✅ Budget {args.budget_ms} ms : {recommended['label']} "
+                  f"({recommended['board_accuracy']:.2f}% FEN exactes, {recommended['latency_ms']:.1f} ms)")
+            print(f"💾 Configuration de service : {BASE_DIR / args.serving_config}")
+
+
+if __name__ == '__main__':
+    main()
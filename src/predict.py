@@ -4,6 +4,8 @@ from ultralytics import YOLO
 import cv2
 import json
 
+from profiling import add_profile_argument, profiled, stage, timed_predict
+
 def predict_chess_pieces(model_path, image_path, conf_threshold=0.25, save_output=True):
     """
     Utilise le modèle entraîné pour détecter les pièces d'échecs sur une nouvelle image.
@@ -19,11 +21,13 @@ def predict_chess_pieces(model_path, image_path, conf_threshold=0.25, save_outpu
     """
     # Charger le modèle entraîné
     print(f"Chargement du modèle depuis : {model_path}")
-    model = YOLO(model_path)
+    with stage('model_load'):
+        model = YOLO(model_path)
     
     # Effectuer la prédiction
     print(f"Analyse de l'image : {image_path}")
-    results = model.predict(
+    results = timed_predict(
+        model,
         source=image_path,
         conf=conf_threshold,
         save=save_output,
@@ -33,33 +37,34 @@ def predict_chess_pieces(model_path, image_path, conf_threshold=0.25, save_outpu
     
     # Extraire les informations de détection
     detections = []
-    for result in results:
-        boxes = result.boxes
-        for i, box in enumerate(boxes):
-            # Coordonnées de la boîte englobante
-            x1, y1, x2, y2 = box.xyxy[0].tolist()
-            
-            # Classe et confiance
-            class_id = int(box.cls[0])
-            confidence = float(box.conf[0])
-            class_name = result.names[class_id]
-            
-            detection = {
-                'id': i + 1,
-                'class': class_name,
-                'confidence': round(confidence, 3),
-                'bounding_box': {
-                    'x1': round(x1, 2),
-                    'y1': round(y1, 2),
-                    'x2': round(x2, 2),
-                    'y2': round(y2, 2)
-                },
-                'center': {
-                    'x': round((x1 + x2) / 2, 2),
-                    'y': round((y1 + y2) / 2, 2)
+    with stage('postprocess', count=0):
+        for result in results:
+            boxes = result.boxes
+            for i, box in enumerate(boxes):
+                # Coordonnées de la boîte englobante
+                x1, y1, x2, y2 = box.xyxy[0].tolist()
+                
+                # Classe et confiance
+                class_id = int(box.cls[0])
+                confidence = float(box.conf[0])
+                class_name = result.names[class_id]
+                
+                detection = {
+                    'id': i + 1,
+                    'class': class_name,
+                    'confidence': round(confidence, 3),
+                    'bounding_box': {
+                        'x1': round(x1, 2),
+                        'y1': round(y1, 2),
+                        'x2': round(x2, 2),
+                        'y2': round(y2, 2)
+                    },
+                    'center': {
+                        'x': round((x1 + x2) / 2, 2),
+                        'y': round((y1 + y2) / 2, 2)
+                    }
                 }
-            }
-            detections.append(detection)
+                detections.append(detection)
     
     # Affichage des résultats
     print(f"\n{'='*60}")
@@ -77,7 +82,7 @@ def predict_chess_pieces(model_path, image_path, conf_threshold=0.25, save_outpu
     if save_output:
         output_json_path = os.path.join('predictions', 'chess_detection', 'detections.json')
         os.makedirs(os.path.dirname(output_json_path), exist_ok=True)
-        with open(output_json_path, 'w') as f:
+        with stage('io'), open(output_json_path, 'w') as f:
             json.dump(detections, f, indent=2)
         print(f"Résultats sauvegardés dans : {output_json_path}")
     
@@ -96,6 +101,7 @@ if __name__ == '__main__':
                         help="Seuil de confiance minimum (0-1).")
     parser.add_argument('--no-save', action='store_true',
                         help="Ne pas sauvegarder l'image annotée.")
+    add_profile_argument(parser)
     
     args = parser.parse_args()
     
@@ -111,9 +117,10 @@ if __name__ == '__main__':
         exit(1)
     
     # Lancer la prédiction
-    detections = predict_chess_pieces(
-        model_path=args.model_path,
-        image_path=args.image_path,
-        conf_threshold=args.conf,
-        save_output=not args.no_save
-    )
+    with profiled('predict', args.profile):
+        detections = predict_chess_pieces(
+            model_path=args.model_path,
+            image_path=args.image_path,
+            conf_threshold=args.conf,
+            save_output=not args.no_save
+        )
@@ -0,0 +1,184 @@
+"""
+Cache des prédictions brutes pour l'évaluation
+
+Chaque image d'évaluation n'est inférée qu'une fois par modèle : les
+prédictions à seuil très bas (RAW_CONF) sont gardées sur disque, indexées
+par empreinte des poids (src/history.py) et empreinte du contenu de l'image.
+Un changement de seuil de confiance, de stratégie de fusion ou de
+combinaison d'ensemble se recalcule ensuite depuis le cache en quelques
+secondes (src/detection_metrics.py), sans repasser par le modèle.
+
+Stockage : runs/predictions/<empreinte des poids>-<imgsz>-<RAW_CONF>.jsonl,
+une ligne par image ({"image": sha256, "boxes", "scores", "classes"}),
+en ajout seul : une évaluation interrompue reprend où elle s'est arrêtée.
+Les images à inférer peuvent être lues dans un split prétraité partagé par
+tous les modèles (src/preprocess_cache.py).
+"""
+
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.append(str(BASE_DIR / 'api'))
+
+from fusion import fuse_detections  # noqa: E402
+from history import model_hash  # noqa: E402
+from profiling import stage  # noqa: E402
+from inference import merge_ensemble_detections, predict_batch_with_model  # noqa: E402
+
+PREDICTIONS_DIR = BASE_DIR / 'runs/predictions'
+# Seuil des prédictions gardées (celui de la validation ultralytics)
+RAW_CONF = 0.001
+BATCH_SIZE = 16
+# Stratégies de fusion d'un ensemble
+FUSIONS = ('serving', 'nms', 'nms-class')
+
+_image_hashes = {}
+
+
+def image_hash(path):
+    path = Path(path)
+    signature = (str(path), path.stat().st_size, path.stat().st_mtime)
+    if signature not in _image_hashes:
+        _image_hashes[signature] = hashlib.sha256(path.read_bytes()).hexdigest()
+    return _image_hashes[signature]
+
+
+def to_arrays(detections):
+    """Détections (format API) -> (boîtes (N, 4), confiances (N,), classes)"""
+    boxes = np.float64([[d['bbox']['x1'], d['bbox']['y1'], d['bbox']['x2'], d['bbox']['y2']]
+                        for d in detections]).reshape(-1, 4)
+    return boxes, np.float64([d['confidence'] for d in detections]), [d['class'] for d in detections]
+
+
+def to_detections(boxes, scores, classes):
+    return [{
+        'id': i + 1,
+        'class': name,
+        'confidence': float(score),
+        'bbox': {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2, 'width': x2 - x1, 'height': y2 - y1}
+    } for i, ((x1, y1, x2, y2), score, name) in enumerate(zip(boxes.tolist(), scores, classes))]
+
+
+class PredictionCache:
+    """Prédictions brutes par (poids, imgsz) et par image"""
+
+    def __init__(self, root=PREDICTIONS_DIR, raw_conf=RAW_CONF, batch_size=BATCH_SIZE):
+        self.root = Path(root)
+        self.raw_conf = raw_conf
+        self.batch_size = batch_size
+
+    def _path(self, weights, imgsz):
+        return self.root / f"{model_hash(weights)}-{imgsz}-{self.raw_conf}.jsonl"
+
+    def _load(self, path):
+        cached = {}
+        if path.exists():
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        cached[entry['image']] = entry
+        return cached
+
+    def missing(self, weights, image_paths, imgsz=640):
+        """Images sans prédictions en cache pour ces poids"""
+        cached = self._load(self._path(weights, imgsz))
+        return [image for image in image_paths if image_hash(image) not in cached]
+
+    def predictions(self, weights, image_paths, imgsz=640, load_model=None, preprocessed=None):
+        """
+        Prédictions brutes de chaque image, inférées seulement si absentes du cache
+
+        Args:
+            weights: Chemin des poids
+            image_paths: Images à prédire
+            imgsz: Taille d'entrée du modèle
+            load_model: Fonction () -> modèle YOLO (défaut : ultralytics.YOLO(weights))
+            preprocessed: PreprocessedSplit (src/preprocess_cache.py) partagé entre
+                          les modèles : lots lus dans le tableau letterboxé au lieu
+                          de décoder les fichiers
+
+        Returns:
+            dict: {chemin image: (boîtes (N, 4), confiances (N,), classes)}
+        """
+        path = self._path(weights, imgsz)
+        with stage('io'):
+            cached = self._load(path)
+            hashes = {image: image_hash(image) for image in image_paths}
+        missing = [image for image in image_paths if hashes[image] not in cached]
+        if preprocessed is not None and preprocessed.imgsz != imgsz:
+            preprocessed = None
+
+        if missing:
+            print(f"🔄 {len(missing)}/{len(image_paths)} images à inférer ({Path(weights).name}, imgsz={imgsz})")
+            with stage('model_load'):
+                if load_model is None:
+                    from ultralytics import YOLO
+                    model = YOLO(str(weights))
+                else:
+                    model = load_model()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'a') as f:
+                for start in range(0, len(missing), self.batch_size):
+                    batch = missing[start:start + self.batch_size]
+                    shared = preprocessed is not None and all(image in preprocessed for image in batch)
+                    with stage('decode', count=len(batch)):
+                        sources = preprocessed.batch(batch) if shared else [str(image) for image in batch]
+                    # Pré et post-traitement d'ultralytics compris (et décodage des fichiers hors split prétraité)
+                    with stage('inference', count=len(batch)):
+                        results = predict_batch_with_model(model, sources, self.raw_conf, imgsz)
+                    for image, detections in zip(batch, results):
+                        boxes, scores, classes = to_arrays(detections)
+                        if shared:
+                            boxes = preprocessed.to_original(image, boxes)
+                        entry = {'image': hashes[image], 'boxes': boxes.round(2).tolist(),
+                                 'scores': scores.tolist(), 'classes': classes}
+                        cached[entry['image']] = entry
+                        f.write(json.dumps(entry) + '\n')
+        else:
+            print(f"⚡ {len(image_paths)} images en cache ({Path(weights).name}, imgsz={imgsz})")
+
+        return {
+            image: (np.float64(cached[hashes[image]]['boxes']).reshape(-1, 4),
+                    np.float64(cached[hashes[image]]['scores']),
+                    cached[hashes[image]]['classes'])
+            for image in image_paths
+        }
+
+
+def fuse_predictions(per_model, fusion='serving', iou=0.5, conf=RAW_CONF):
+    """
+    Combine les prédictions en cache de plusieurs modèles, image par image
+
+    Args:
+        per_model: {nom du modèle: {image: (boîtes, confiances, classes)}}
+        fusion: 'serving' (règle de l'API, Haki prioritaire sur les pièces
+                stratégiques; IoU fixe), 'nms' (sans distinction de classe)
+                ou 'nms-class' (par classe)
+        iou: Seuil d'IoU de la fusion NMS
+        conf: Seuil appliqué à chaque modèle avant la fusion
+
+    Returns:
+        dict: {image: (boîtes, confiances, classes)}
+    """
+    images = next(iter(per_model.values())).keys()
+    fused = {}
+    for image in images:
+        sources = []
+        for name, predictions in per_model.items():
+            boxes, scores, classes = predictions[image]
+            kept = scores >= conf
+            sources.append((name, to_detections(boxes[kept], scores[kept],
+                                                [c for c, k in zip(classes, kept) if k])))
+        if fusion == 'serving':
+            detections = merge_ensemble_detections(sources)
+        else:
+            detections = fuse_detections([d for _, dets in sources for d in dets], iou,
+                                         class_agnostic=fusion == 'nms')
+        fused[image] = to_arrays(detections)
+    return fused
@@ -0,0 +1,111 @@
+"""
+Cache des images d'évaluation décodées et letterboxées
+
+Comparer plusieurs modèles sur un même split fait décoder, redimensionner et
+compléter (letterbox) chaque image une fois par modèle. Le split est décodé
+et letterboxé une seule fois dans un tableau uint8 (N, imgsz, imgsz, 3)
+projeté en mémoire (.npy, np.load(mmap_mode='r')), accompagné d'un index des
+formes : taille d'origine, échelle et marges de chaque image. Tous les
+modèles et backends lisent leurs lots dans ce tableau; les boîtes sont
+ramenées aux coordonnées d'origine avec l'index.
+
+Le letterbox est celui d'ultralytics (centré, gris 114) : une image déjà
+au format imgsz x imgsz traverse le prétraitement du modèle sans
+redimensionnement.
+
+Stockage : runs/preprocessed/<nom>-<imgsz>.npy et .json; reconstruit si
+les images ont changé (taille ou date de modification).
+"""
+
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from profiling import stage
+
+BASE_DIR = Path(__file__).parent.parent
+PREPROCESSED_DIR = BASE_DIR / 'runs/preprocessed'
+PAD_VALUE = 114  # Gris du letterbox YOLO
+
+
+def letterbox(image, imgsz):
+    """
+    Redimensionne en conservant les proportions et complète en carré imgsz x imgsz
+
+    Returns:
+        tuple: (image letterboxée, échelle, marge gauche, marge haute)
+    """
+    height, width = image.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (imgsz - new_width) / 2, (imgsz - new_height) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                               value=(PAD_VALUE, PAD_VALUE, PAD_VALUE))
+    return image, scale, left, top
+
+
+def _signature(path):
+    stat = Path(path).stat()
+    return [str(path), stat.st_size, stat.st_mtime]
+
+
+class PreprocessedSplit:
+    """Images d'un split, letterboxées dans un tableau projeté en mémoire"""
+
+    def __init__(self, array_path, index):
+        self.imgsz = index['imgsz']
+        self.index = index['images']
+        self.images = np.load(array_path, mmap_mode='r')
+        self.position = {entry['path']: i for i, entry in enumerate(self.index)}
+
+    @classmethod
+    def build(cls, image_paths, imgsz, name, root=PREPROCESSED_DIR):
+        """Réutilise le cache s'il correspond aux images, sinon le construit"""
+        root = Path(root)
+        array_path, index_path = root / f'{name}-{imgsz}.npy', root / f'{name}-{imgsz}.json'
+        signatures = [_signature(path) for path in image_paths]
+        if array_path.exists() and index_path.exists():
+            index = json.loads(index_path.read_text())
+            if [entry['signature'] for entry in index['images']] == signatures:
+                print(f"⚡ Images prétraitées en cache : {array_path.name}")
+                return cls(array_path, index)
+
+        print(f"🔄 Prétraitement de {len(image_paths)} images ({name}, imgsz={imgsz})...")
+        root.mkdir(parents=True, exist_ok=True)
+        images = np.lib.format.open_memmap(array_path, mode='w+', dtype=np.uint8,
+                                           shape=(len(image_paths), imgsz, imgsz, 3))
+        entries = []
+        for i, (path, signature) in enumerate(zip(image_paths, signatures)):
+            with stage('decode'):
+                image = cv2.imread(str(path))
+            if image is None:
+                raise ValueError(f"Image illisible: {path}")
+            height, width = image.shape[:2]
+            with stage('preprocess'):
+                images[i], scale, left, top = letterbox(image, imgsz)
+            entries.append({'path': str(path), 'signature': signature, 'width': width, 'height': height,
+                            'scale': scale, 'left': left, 'top': top})
+        images.flush()
+        del images
+        index = {'imgsz': imgsz, 'images': entries}
+        index_path.write_text(json.dumps(index))
+        return cls(array_path, index)
+
+    def __contains__(self, path):
+        return str(path) in self.position
+
+    def batch(self, paths):
+        """Lot (B, imgsz, imgsz, 3) BGR copié depuis le tableau projeté"""
+        return [np.array(self.images[self.position[str(path)]]) for path in paths]
+
+    def to_original(self, path, boxes):
+        """Boîtes (N, 4) de l'image letterboxée -> coordonnées de l'image d'origine"""
+        entry = self.index[self.position[str(path)]]
+        boxes = (np.asarray(boxes, dtype=np.float64) - [entry['left'], entry['top']] * 2) / entry['scale']
+        return np.clip(boxes, 0, [entry['width'], entry['height']] * 2)
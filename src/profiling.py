@@ -0,0 +1,257 @@
+"""
+Profilage hors ligne des scripts (option --profile commune)
+
+Un run profilé écrit dans runs/profile/<script>-<date>/ :
+- profile.txt (+ profile.pstats) : rapport cProfile trié par temps cumulé,
+  ou profile.txt / profile.html de pyinstrument s'il est installé
+- stacks.folded : piles échantillonnées (toutes les SAMPLE_INTERVAL s) au
+  format « replié » (frame;frame;frame N), lisible par flamegraph.pl,
+  speedscope ou inferno
+- stages.json : temps par étape, affiché aussi en tableau en fin de run
+
+Étapes : chargement du modèle, décodage, prétraitement, inférence,
+post-traitement, E/S. Le code instrumenté appelle stage('...') ou
+timed_predict(...) : sans profilage actif, ces appels ne mesurent rien.
+Les temps de prétraitement / inférence / post-traitement d'une prédiction
+ultralytics viennent de `Results.speed`; le reste de l'appel (lecture et
+décodage des images, sauvegarde demandée à ultralytics) est compté en décodage.
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+PROFILE_DIR = BASE_DIR / 'runs/profile'
+STAGES = ('model_load', 'decode', 'preprocess', 'inference', 'postprocess', 'io')
+# Intervalle d'échantillonnage des piles (s)
+SAMPLE_INTERVAL = 0.005
+# Fonctions affichées dans le rapport cProfile
+REPORT_LINES = 40
+
+try:
+    from pyinstrument import Profiler as PyInstrumentProfiler
+except ImportError:
+    PyInstrumentProfiler = None
+
+_active = None
+
+
+def add_profile_argument(parser):
+    """Option --profile [DOSSIER] commune aux scripts"""
+    parser.add_argument('--profile', nargs='?', const=str(PROFILE_DIR), metavar='DOSSIER',
+                        help=f"Profiler le run (rapport, temps par étape, piles pour flamegraph; "
+                             f"défaut : {PROFILE_DIR.relative_to(BASE_DIR)})")
+
+
+@contextmanager
+def stage(name, count=1):
+    """Compte la durée du bloc dans l'étape `name` (rien sans profilage actif)"""
+    if _active is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _active.add(name, (time.perf_counter() - started) * 1000, count)
+
+
+def record_results(results, wall_ms):
+    """Répartit un appel model.predict entre les étapes (Results.speed, reste = décodage)"""
+    if _active is None:
+        return
+    measured = 0.0
+    for key in ('preprocess', 'inference', 'postprocess'):
+        total = sum((getattr(result, 'speed', None) or {}).get(key) or 0.0 for result in results)
+        _active.add(key, total, len(results))
+        measured += total
+    _active.add('decode', max(0.0, wall_ms - measured), len(results))
+
+
+def timed_predict(model, source, **kwargs):
+    """model.predict(source, **kwargs), réparti entre les étapes si le profilage est actif"""
+    started = time.perf_counter()
+    results = model.predict(source, **kwargs)
+    record_results(results, (time.perf_counter() - started) * 1000)
+    return results
+
+
+def watch_validation(model):
+    """
+    Répartit les model.val du modèle entre les étapes (callbacks du validateur)
+
+    validator.speed donne les ms par image de chaque étape; le reste de la
+    validation (chargement des images par le dataloader, métriques) est
+    compté en décodage.
+    """
+    if _active is None:
+        return
+    started = {}
+
+    def on_val_start(validator):
+        started['t'] = time.perf_counter()
+
+    def on_val_end(validator):
+        wall_ms = (time.perf_counter() - started.pop('t', time.perf_counter())) * 1000
+        seen = getattr(validator, 'seen', 0) or 0
+        speed = getattr(validator, 'speed', None) or {}
+        measured = 0.0
+        for key, target in (('preprocess', 'preprocess'), ('inference', 'inference'), ('loss', 'postprocess'),
+                            ('postprocess', 'postprocess')):
+            total = (speed.get(key) or 0.0) * seen
+            _active.add(target, total, seen if key != 'loss' else 0)
+            measured += total
+        _active.add('decode', max(0.0, wall_ms - measured), seen)
+
+    model.add_callback('on_val_start', on_val_start)
+    model.add_callback('on_val_end', on_val_end)
+
+
+class StackSampler:
+    """Échantillonne la pile du thread principal dans un thread de fond (format replié)"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.thread_id = threading.main_thread().ident
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """
+    Profile un run : rapport cProfile (ou pyinstrument), temps par étape, piles repliées
+
+    Usage :
+        with Profiler('predict', args.profile):
+            ...
+    """
+
+    def __init__(self, name, output_dir=PROFILE_DIR, interval=SAMPLE_INTERVAL):
+        self.name = name
+        self.output_dir = Path(output_dir) / f"{name}-{datetime.now().strftime('%Y%m%dT%H%M%S')}"
+        self.interval = interval
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, ms, count=1):
+        with self._lock:
+            total, calls = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (total + ms, calls + count)
+
+    def __enter__(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError("Un profilage est déjà actif")
+        _active = self
+        self.sampler = StackSampler(self.interval)
+        if PyInstrumentProfiler is not None:
+            self.profiler = PyInstrumentProfiler()
+            self.profiler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.sampler.start()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        wall_ms = (time.perf_counter() - self.started) * 1000
+        self.sampler.stop()
+        if PyInstrumentProfiler is not None:
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+        _active = None
+        self.write(wall_ms)
+        self.print_stages(wall_ms)
+        return False
+
+    def stage_rows(self, wall_ms):
+        rows = []
+        names = list(STAGES) + sorted(set(self.stages) - set(STAGES))
+        for name in names:
+            total, calls = self.stages.get(name, (0.0, 0))
+            rows.append({'stage': name, 'total_ms': round(total, 1), 'calls': calls,
+                         'mean_ms': round(total / calls, 3) if calls else 0.0,
+                         'share': round(100 * total / wall_ms, 1) if wall_ms else 0.0})
+        other = wall_ms - sum(total for total, _ in self.stages.values())
+        rows.append({'stage': 'other', 'total_ms': round(max(0.0, other), 1), 'calls': 0, 'mean_ms': 0.0,
+                     'share': round(100 * max(0.0, other) / wall_ms, 1) if wall_ms else 0.0})
+        return rows
+
+    def write(self, wall_ms):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if PyInstrumentProfiler is not None:
+            (self.output_dir / 'profile.txt').write_text(self.profiler.output_text(unicode=True))
+            (self.output_dir / 'profile.html').write_text(self.profiler.output_html())
+        else:
+            self.profiler.dump_stats(str(self.output_dir / 'profile.pstats'))
+            report = io.StringIO()
+            pstats.Stats(self.profiler, stream=report).sort_stats('cumulative').print_stats(REPORT_LINES)
+            (self.output_dir / 'profile.txt').write_text(report.getvalue())
+        self.sampler.write(self.output_dir / 'stacks.folded')
+        (self.output_dir / 'stages.json').write_text(json.dumps({
+            'script': self.name,
+            'command': sys.argv,
+            'timestamp': datetime.now().isoformat(),
+            'wall_ms': round(wall_ms, 1),
+            'profiler': 'pyinstrument' if PyInstrumentProfiler is not None else 'cProfile',
+            'samples': sum(self.sampler.stacks.values()),
+            'stages': self.stage_rows(wall_ms),
+        }, indent=2))
+
+    def print_stages(self, wall_ms):
+        print("\n" + "=" * 62)
+        print(f"⏱️  PROFIL : {self.name} ({wall_ms / 1000:.1f} s)")
+        print("=" * 62)
+        print(f"{'Étape':<14}{'Total (s)':>12}{'Appels':>10}{'Moy. (ms)':>13}{'Part':>10}")
+        print("-" * 62)
+        for row in self.stage_rows(wall_ms):
+            print(f"{row['stage']:<14}{row['total_ms'] / 1000:>12.2f}{row['calls']:>10}"
+                  f"{row['mean_ms']:>13.2f}{row['share']:>9.1f}%")
+        print("=" * 62)
+        print(f"📁 Rapport, piles (flamegraph.pl / speedscope) et étapes : {self.output_dir}")
+
+
+@contextmanager
+def profiled(name, output_dir=None):
+    """Profiler(name, output_dir) si output_dir (valeur de --profile), sinon rien"""
+    if not output_dir:
+        yield None
+        return
+    with Profiler(name, output_dir) as profiler:
+        yield profiler
@@ -0,0 +1,261 @@
+"""
+Dataset de cases dérivé automatiquement des annotations YOLO
+
+Chaque image annotée devient 64 imagettes étiquetées (vide ou pièce) pour
+le classifieur de cases (moteur 'squares' de l'API) :
+- data/chess_decoder_1000 : diagrammes 2D, l'échiquier occupe toute l'image
+- data/processed : photos, l'échiquier est localisé par api/board.py et les
+  pièces sont placées sur les cases via l'homographie
+
+Les fonctions labels -> échiquier sont aussi utilisées pour la vérité terrain
+des benchmarks (placement FEN attendu d'une image annotée).
+"""
+
+import argparse
+import sys
+from collections import Counter
+from pathlib import Path
+
+import cv2
+import numpy as np
+import yaml
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.append(str(BASE_DIR / 'api'))
+
+from board import BoardLocation, locate_board, square_crops  # noqa: E402
+from fen import assign_squares  # noqa: E402
+
+# 13 états d'une case (même ordre que api/square_classifier.py)
+CLASSES = [
+    'empty', 'white-king', 'white-queen', 'white-rook', 'white-bishop', 'white-knight', 'white-pawn',
+    'black-king', 'black-queen', 'black-rook', 'black-bishop', 'black-knight', 'black-pawn'
+]
+
+FEN_SYMBOLS = {
+    'white-king': 'K', 'white-queen': 'Q', 'white-rook': 'R',
+    'white-bishop': 'B', 'white-knight': 'N', 'white-pawn': 'P',
+    'black-king': 'k', 'black-queen': 'q', 'black-rook': 'r',
+    'black-bishop': 'b', 'black-knight': 'n', 'black-pawn': 'p',
+}
+
+# Datasets sources : images/labels par split et fichier des classes
+DATASETS = {
+    'chess_decoder_1000': {
+        'root': 'data/chess_decoder_1000',
+        'names': 'data/chess_decoder_1000/data.yaml',
+        'splits': {'train': 'images/train', 'val': 'images/val', 'test': 'images/test'},
+        'full_board': True,
+    },
+    'processed': {
+        'root': 'data/processed',
+        'names': 'data/chess_dataset.yaml',
+        'splits': {'train': 'train/images', 'val': 'valid/images', 'test': 'test/images'},
+        'full_board': False,
+    },
+}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def load_class_names(yaml_path):
+    """Noms des classes d'un data.yaml (liste ou dictionnaire), normalisés ('_' -> '-')"""
+    with open(yaml_path, 'r') as f:
+        names = yaml.safe_load(f)['names']
+    if isinstance(names, dict):
+        names = [names[i] for i in sorted(names)]
+    return [name.replace('_', '-').lower() for name in names]
+
+
+def read_yolo_labels(label_path, names, width, height):
+    """
+    Lit un fichier d'annotations YOLO (boîtes ou polygones)
+
+    Returns:
+        list: (classe, x1, y1, x2, y2) en pixels
+    """
+    boxes = []
+    if not Path(label_path).exists():
+        return boxes
+    for line in Path(label_path).read_text().splitlines():
+        values = line.split()
+        if len(values) < 5:
+            continue
+        name = names[int(values[0])]
+        coords = np.float32(values[1:])
+        if len(coords) == 4:  # cx cy w h
+            cx, cy, w, h = coords
+            x1, y1, x2, y2 = cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2
+        else:  # Polygone x1 y1 x2 y2 ...
+            xs, ys = coords[0::2], coords[1::2]
+            x1, y1, x2, y2 = xs.min(), ys.min(), xs.max(), ys.max()
+        boxes.append((name, x1 * width, y1 * height, x2 * width, y2 * height))
+    return boxes
+
+
+def boxes_to_board(boxes, homography, confidences=None):
+    """
+    Place des boîtes de pièces sur un échiquier 8x8
+
+    Même règle que l'API (api/fen.py) : centre de la boîte, ou base de la
+    pièce moins une demi-case pour les pièces hautes. En cas de conflit sur une
+    case, la boîte la plus confiante l'emporte.
+
+    Args:
+        boxes: (classe, x1, y1, x2, y2) en pixels
+        homography: Homographie image -> repère de l'échiquier (0..8)
+        confidences: Confiance de chaque boîte (optionnel)
+
+    Returns:
+        list: 8 rangées (rang 8 en premier) de 8 noms de classes ('empty' si vide)
+    """
+    board = [['empty'] * 8 for _ in range(8)]
+    best = [[-1.0] * 8 for _ in range(8)]
+    if not boxes:
+        return board
+
+    squares = assign_squares(np.float64([box[1:] for box in boxes]), homography)
+    for i, ((name, *_), square) in enumerate(zip(boxes, squares)):
+        row, col = divmod(int(square), 8)
+        confidence = confidences[i] if confidences is not None else 1.0
+        if confidence > best[row][col]:
+            board[row][col] = name
+            best[row][col] = confidence
+    return board
+
+
+def board_to_placement(board):
+    """Partie placement d'une FEN (ex: 'rnbqkbnr/pppppppp/8/...') à partir d'un échiquier 8x8"""
+    rows = []
+    for row in board:
+        fen_row, empty = '', 0
+        for name in row:
+            symbol = FEN_SYMBOLS.get(name)
+            if symbol is None:
+                empty += 1
+                continue
+            if empty:
+                fen_row += str(empty)
+                empty = 0
+            fen_row += symbol
+        rows.append(fen_row + (str(empty) if empty else ''))
+    return '/'.join(rows)
+
+
+def full_board_location(width, height):
+    """Échiquier occupant toute l'image (diagrammes)"""
+    return BoardLocation([[0, 0], [width, 0], [width, height], [0, height]], 'labels', 0.0)
+
+
+def split_dirs(dataset, split):
+    """Dossiers (images, labels) d'un split"""
+    config = DATASETS[dataset]
+    image_dir = BASE_DIR / config['root'] / config['splits'][split]
+    label_dir = image_dir.parent.parent / 'labels' / image_dir.name \
+        if config['splits'][split].startswith('images') else image_dir.parent / 'labels'
+    return image_dir, label_dir
+
+
+def split_images(dataset, split):
+    image_dir, _ = split_dirs(dataset, split)
+    return [p for p in sorted(image_dir.iterdir()) if p.suffix.lower() in IMAGE_EXTENSIONS]
+
+
+def iter_labeled_images(dataset, split):
+    """
+    Parcourt les annotations d'un split sans décoder les images (taille lue dans l'en-tête)
+
+    Yields:
+        tuple: (chemin image, largeur, hauteur, boîtes (classe, x1, y1, x2, y2) en pixels)
+    """
+    from PIL import Image
+
+    names = load_class_names(BASE_DIR / DATASETS[dataset]['names'])
+    _, label_dir = split_dirs(dataset, split)
+    for image_path in split_images(dataset, split):
+        with Image.open(image_path) as image:
+            width, height = image.size
+        yield image_path, width, height, read_yolo_labels(label_dir / f'{image_path.stem}.txt', names,
+                                                          width, height)
+
+
+def iter_annotated_images(dataset, split):
+    """
+    Parcourt les images annotées d'un split
+
+    Yields:
+        tuple: (chemin image, image BGR, BoardLocation ou None, échiquier 8x8 ou None)
+               l'échiquier vaut None si une annotation n'est pas une des 12 pièces
+    """
+    config = DATASETS[dataset]
+    names = load_class_names(BASE_DIR / config['names'])
+    _, label_dir = split_dirs(dataset, split)
+
+    for image_path in split_images(dataset, split):
+        image = cv2.imread(str(image_path))
+        if image is None:
+            continue
+        height, width = image.shape[:2]
+        boxes = read_yolo_labels(label_dir / f'{image_path.stem}.txt', names, width, height)
+
+        location = full_board_location(width, height) if config['full_board'] else locate_board(image)
+        board = None
+        if location is not None and all(name in FEN_SYMBOLS for name, *_ in boxes):
+            board = boxes_to_board(boxes, location.homography)
+        yield image_path, image, location, board
+
+
+def build_split(split, datasets=tuple(DATASETS)):
+    """
+    Construit les imagettes de cases d'un split
+
+    Returns:
+        tuple: (X uint8 (N, côté, côté, 3), y int64 (N,), sources (N,), statistiques)
+    """
+    crops, labels, sources = [], [], []
+    stats = Counter()
+    for dataset in datasets:
+        for image_path, image, location, board in iter_annotated_images(dataset, split):
+            if location is None:
+                stats[f'{dataset}: échiquier non localisé'] += 1
+                continue
+            if board is None:
+                stats[f'{dataset}: annotation ambiguë'] += 1
+                continue
+            crops.append(square_crops(image, location))
+            labels.extend(CLASSES.index(name) for row in board for name in row)
+            sources.extend([dataset] * 64)
+            stats[f'{dataset}: images'] += 1
+
+    if not crops:
+        return None, None, None, stats
+    return np.concatenate(crops), np.int64(labels), np.array(sources), stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dérive le dataset de cases à partir des annotations YOLO.")
+    parser.add_argument('--output', type=str, default='data/squares', help="Dossier de sortie des fichiers .npz")
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS), choices=list(DATASETS),
+                        help="Datasets sources")
+    args = parser.parse_args()
+
+    output = BASE_DIR / args.output
+    output.mkdir(parents=True, exist_ok=True)
+
+    for split in ('train', 'val', 'test'):
+        print(f"\n📦 Split '{split}'...")
+        X, y, sources, stats = build_split(split, args.datasets)
+        for key, count in sorted(stats.items()):
+            print(f"   {key}: {count}")
+        if X is None:
+            print("   ⚠️ Aucune image utilisable")
+            continue
+
+        np.savez_compressed(output / f'{split}.npz', X=X, y=y, sources=sources)
+        counts = np.bincount(y, minlength=len(CLASSES))
+        print(f"   ✅ {len(y)} cases -> {output / f'{split}.npz'}")
+        print("   " + ', '.join(f'{name}={count}' for name, count in zip(CLASSES, counts)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Entraînement du classifieur de cases (moteur 'squares' de l'API)
+
+Utilise les fichiers produits par src/square_dataset.py (data/squares/{train,val,test}.npz).
+Le meilleur checkpoint (précision sur val) est sauvegardé avec la liste des
+classes et la géométrie des imagettes, directement chargeable par
+api/square_classifier.SquareClassifier.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from torch import nn
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.append(str(BASE_DIR / 'api'))
+
+from board import SQUARE_CONTEXT, SQUARE_PX  # noqa: E402
+from square_classifier import CLASSES, SquareNet, crops_to_tensor  # noqa: E402
+
+
+def load_split(data_dir, split):
+    data = np.load(Path(data_dir) / f'{split}.npz')
+    return data['X'], data['y']
+
+
+def augment(batch):
+    """Augmentations légères : luminosité/contraste, décalage de quelques pixels, miroir horizontal"""
+    n = batch.shape[0]
+    contrast = torch.empty(n, 1, 1, 1).uniform_(0.7, 1.3)
+    brightness = torch.empty(n, 1, 1, 1).uniform_(-0.15, 0.15)
+    batch = ((batch - 0.5) * contrast + 0.5 + brightness).clamp_(0, 1)
+
+    shift_x, shift_y = np.random.randint(-2, 3, size=2)
+    batch = torch.roll(batch, shifts=(int(shift_y), int(shift_x)), dims=(2, 3))
+
+    flip = torch.rand(n) < 0.5
+    batch[flip] = batch[flip].flip(3)
+    return batch
+
+
+def evaluate(model, X, y, device, batch_size=1024):
+    """Précision globale et par classe"""
+    model.eval()
+    predictions = []
+    with torch.inference_mode():
+        for start in range(0, len(X), batch_size):
+            logits = model(crops_to_tensor(X[start:start + batch_size]).to(device))
+            predictions.append(logits.argmax(dim=1).cpu().numpy())
+    predictions = np.concatenate(predictions)
+    per_class = {
+        CLASSES[c]: float((predictions[y == c] == c).mean())
+        for c in range(len(CLASSES)) if (y == c).any()
+    }
+    return float((predictions == y).mean()), per_class
+
+
+def train(data_dir, epochs, batch_size, lr, output, device):
+    X_train, y_train = load_split(data_dir, 'train')
+    X_val, y_val = load_split(data_dir, 'val')
+    print(f"📊 {len(y_train)} cases d'entraînement, {len(y_val)} de validation")
+
+    # Pondération des classes (les cases vides dominent largement)
+    counts = np.bincount(y_train, minlength=len(CLASSES)).astype(np.float32)
+    weights = torch.tensor(counts.sum() / np.maximum(counts, 1) / len(CLASSES)).clamp_(max=10.0)
+
+    model = SquareNet(len(CLASSES)).to(device)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=1e-4)
+    scheduler = torch.optim.lr_scheduler.OneCycleLR(
+        optimizer, max_lr=lr, total_steps=epochs * ((len(y_train) + batch_size - 1) // batch_size)
+    )
+    criterion = nn.CrossEntropyLoss(weight=weights.to(device), label_smoothing=0.05)
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    best_accuracy = -1.0
+
+    for epoch in range(1, epochs + 1):
+        model.train()
+        started = time.time()
+        order = np.random.permutation(len(y_train))
+        total_loss = 0.0
+        for start in range(0, len(order), batch_size):
+            index = order[start:start + batch_size]
+            inputs = augment(crops_to_tensor(X_train[index])).to(device)
+            targets = torch.from_numpy(y_train[index]).to(device)
+
+            optimizer.zero_grad()
+            loss = criterion(model(inputs), targets)
+            loss.backward()
+            optimizer.step()
+            scheduler.step()
+            total_loss += loss.item() * len(index)
+
+        accuracy, per_class = evaluate(model, X_val, y_val, device)
+        print(f"Époque {epoch}/{epochs} - loss {total_loss / len(order):.4f} - "
+              f"val {accuracy:.4f} ({time.time() - started:.1f}s)")
+
+        if accuracy > best_accuracy:
+            best_accuracy = accuracy
+            torch.save({
+                'state_dict': model.state_dict(),
+                'classes': CLASSES,
+                'square_px': SQUARE_PX,
+                'context': SQUARE_CONTEXT,
+                'val_accuracy': accuracy,
+                'val_per_class': per_class,
+                'epoch': epoch,
+            }, output)
+
+    print(f"\n✅ Meilleure précision val: {best_accuracy:.4f}")
+    print(f"Le meilleur modèle est sauvegardé ici : {output}")
+
+    test_path = Path(data_dir) / 'test.npz'
+    if test_path.exists():
+        checkpoint = torch.load(output, map_location=device)
+        model.load_state_dict(checkpoint['state_dict'])
+        accuracy, per_class = evaluate(model, *load_split(data_dir, 'test'), device)
+        print(f"📈 Précision test: {accuracy:.4f}")
+        for name, value in per_class.items():
+            print(f"   {name:<14} {value:.4f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Entraînement du classifieur de cases d'échiquier.")
+    parser.add_argument('--data', type=str, default='data/squares',
+                        help="Dossier des .npz produits par src/square_dataset.py")
+    parser.add_argument('--epochs', type=int, default=15, help="Nombre d'époques")
+    parser.add_argument('--batch-size', type=int, default=256, help="Taille du batch")
+    parser.add_argument('--lr', type=float, default=3e-3, help="Taux d'apprentissage maximal")
+    parser.add_argument('--output', type=str, default='models/square_classifier/weights/best.pt',
+                        help="Chemin du checkpoint")
+    args = parser.parse_args()
+
+    data_dir = BASE_DIR / args.data
+    if not (data_dir / 'train.npz').exists():
+        print(f"Erreur : '{data_dir / 'train.npz'}' introuvable.")
+        print("Lancez d'abord : python src/square_dataset.py")
+    else:
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        print(f"Utilisation du device : {device}")
+        train(data_dir, args.epochs, args.batch_size, args.lr, BASE_DIR / args.output, device)
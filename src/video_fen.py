@@ -0,0 +1,164 @@
+"""
+Numérisation d'une partie filmée (caméra fixe) : chronologie des FEN
+
+Source : fichier vidéo ou dossier d'images (triées par nom). Les images sont
+décodées dans un thread producteur (file bornée) pendant que le suivi
+(api/tracking.BoardTracker) compare chaque image à la dernière image stable
+case par case. La détection n'est relancée que lorsque des cases changent :
+- moteur 'detection' : modèle YOLO sur l'échiquier redressé, seules les cases
+  modifiées sont reprises
+- moteur 'squares' : classifieur de cases sur les seules cases modifiées
+
+Sortie : chronologie [{time, frame, fen, changed}] (JSON) et statistiques
+(part des images ayant nécessité une détection).
+"""
+
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+
+import cv2
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.append(str(BASE_DIR / 'api'))
+
+from board import RECTIFIED_IMGSZ  # noqa: E402
+from tracking import BoardTracker, classifier_detector, rectified_detector  # noqa: E402
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+
+
+class FrameReader(threading.Thread):
+    """
+    Producteur : décode les images de la source au rythme `sample_fps`
+
+    Les images non retenues d'une vidéo sont sautées avec grab() (pas de
+    décodage complet). La file est bornée : le décodage attend le suivi.
+    """
+
+    def __init__(self, source, sample_fps, source_fps=30.0, queue_size=16):
+        super().__init__(daemon=True)
+        self.source = Path(source)
+        self.sample_fps = sample_fps
+        self.source_fps = source_fps
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.duration = 0.0
+
+    def run(self):
+        try:
+            if self.source.is_dir():
+                self._read_directory()
+            else:
+                self._read_video()
+        finally:
+            self.frames.put(None)
+
+    def _step(self, fps):
+        return max(1, int(round(fps / self.sample_fps))) if self.sample_fps else 1
+
+    def _read_video(self):
+        capture = cv2.VideoCapture(str(self.source))
+        if not capture.isOpened():
+            print(f"❌ Impossible d'ouvrir la vidéo: {self.source}")
+            return
+        fps = capture.get(cv2.CAP_PROP_FPS) or self.source_fps
+        step = self._step(fps)
+        index = 0
+        try:
+            while True:
+                if index % step:
+                    if not capture.grab():
+                        break
+                else:
+                    ok, frame = capture.read()
+                    if not ok:
+                        break
+                    self.frames.put((index / fps, frame))
+                index += 1
+        finally:
+            capture.release()
+        self.duration = index / fps
+
+    def _read_directory(self):
+        paths = sorted(p for p in self.source.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        step = self._step(self.source_fps)
+        for index in range(0, len(paths), step):
+            frame = cv2.imread(str(paths[index]))
+            if frame is not None:
+                self.frames.put((index / self.source_fps, frame))
+        self.duration = len(paths) / self.source_fps
+
+
+def detection_engine(weights, conf):
+    """Moteur YOLO : détection sur l'échiquier redressé"""
+    from ultralytics import YOLO
+    from inference import predict_batch_with_model
+
+    model = YOLO(str(weights))
+    return rectified_detector(lambda crop: predict_batch_with_model(model, [crop], conf, RECTIFIED_IMGSZ)[0])
+
+
+def squares_engine(weights, conf):
+    """Classifieur de cases : seules les cases modifiées sont classées"""
+    from square_classifier import SquareClassifier
+
+    return classifier_detector(SquareClassifier(str(weights)), conf)
+
+
+def process(source, detect, sample_fps, source_fps):
+    reader = FrameReader(source, sample_fps, source_fps)
+    tracker = BoardTracker(detect)
+    started = time.time()
+    reader.start()
+
+    while True:
+        item = reader.frames.get()
+        if item is None:
+            break
+        timestamp, frame = item
+        entry = tracker.update(frame, timestamp)
+        if entry:
+            print(f"⏱️ {entry['time']:>8.2f}s  {entry['fen']}  ({', '.join(entry['changed'][:6])})")
+
+    stats = tracker.stats()
+    stats['duration_s'] = round(reader.duration, 2)
+    stats['processing_s'] = round(time.time() - started, 2)
+    return tracker.timeline, stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Chronologie des FEN d'une partie filmée (caméra fixe).")
+    parser.add_argument('source', type=Path, help="Fichier vidéo ou dossier d'images")
+    parser.add_argument('--engine', choices=['detection', 'squares'], default='detection')
+    parser.add_argument('--weights', type=Path, help="Poids du modèle (défaut selon le moteur)")
+    parser.add_argument('--conf', type=float, default=0.25, help="Seuil de confiance")
+    parser.add_argument('--fps', type=float, default=5.0, help="Images analysées par seconde (0 = toutes)")
+    parser.add_argument('--source-fps', type=float, default=30.0,
+                        help="Cadence d'un dossier d'images (ou d'une vidéo sans métadonnées)")
+    parser.add_argument('--output', type=Path, help="Fichier JSON de la chronologie (optionnel)")
+    args = parser.parse_args()
+
+    if not args.source.exists():
+        print(f"❌ Source introuvable: {args.source}")
+        sys.exit(1)
+
+    if args.engine == 'squares':
+        weights = args.weights or BASE_DIR / 'models/square_classifier/weights/best.pt'
+        detect = squares_engine(weights, args.conf)
+    else:
+        weights = args.weights or BASE_DIR / 'models/senchess_haki_v1.0/weights/best.pt'
+        detect = detection_engine(weights, args.conf)
+
+    timeline, stats = process(args.source, detect, args.fps, args.source_fps)
+
+    print(f"\n✅ {stats['positions']} positions, {stats['frames']} images analysées, "
+          f"{stats['detections']} détections ({stats['detection_rate']:.1%} des images)")
+    print(f"   Durée de la source : {stats['duration_s']:.1f}s - traitement : {stats['processing_s']:.1f}s")
+
+    if args.output:
+        args.output.write_text(json.dumps({'timeline': timeline, 'stats': stats}, indent=2))
+        print(f"💾 Chronologie sauvegardée: {args.output}")
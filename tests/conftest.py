@@ -0,0 +1,73 @@
+"""
+Fixtures communes des tests de l'API
+
+Les modules de api/ sont importés directement (comme depuis src/ et scripts/);
+les tests réseau utilisent un serveur HTTP local sur 127.0.0.1.
+"""
+
+import http.server
+import io
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.append(str(BASE_DIR / 'api'))
+
+
+def png_bytes(width=8, height=8):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (120, 80, 40)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class LocalServer:
+    """Serveur HTTP local : `routes` associe un chemin à une fonction handler(requête)"""
+
+    def __init__(self, protocol='HTTP/1.1'):
+        self.routes = {}
+        self.requests = []
+        self.connections = 0
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = protocol
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                server.requests.append(self.path)
+                route = server.routes.get(self.path.split('?')[0])
+                if route is None:
+                    self.send_error(404)
+                    return
+                try:
+                    route(self)
+                except OSError:
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self._lock = threading.Lock()
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    local = LocalServer()
+    yield local
+    local.close()
@@ -0,0 +1,36 @@
+"""Cache des résultats (api/cache.py) : expiration et éviction LRU"""
+
+import cache
+from cache import ResultCache
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    results = ResultCache(max_entries=4, ttl_seconds=10, name='test_cache_ttl')
+
+    results.put('a', {'fen': '8/8/8/8/8/8/8/8'})
+    now[0] += 9
+    assert results.get('a') == {'fen': '8/8/8/8/8/8/8/8'}
+    now[0] += 2
+    assert results.get('a') is None
+    assert len(results._entries) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    results = ResultCache(max_entries=2, ttl_seconds=60, name='test_cache_lru')
+
+    results.put('a', 1)
+    results.put('b', 2)
+    assert results.get('a') == 1
+    results.put('c', 3)
+
+    assert results.get('b') is None
+    assert results.get('a') == 1
+    assert results.get('c') == 3
+
+
+def test_disabled_cache_stores_nothing():
+    results = ResultCache(max_entries=0, name='test_cache_disabled')
+    results.put('a', 1)
+    assert results.get('a') is None
@@ -0,0 +1,105 @@
+"""Téléchargement des images par URL (api/fetch.py) contre un serveur local"""
+
+import time
+
+import pytest
+
+import fetch
+from conftest import png_bytes
+from fetch import ImageFetcher
+from ingest import IngestError
+
+
+def send_body(body, content_length=True):
+    def handler(request):
+        request.send_response(200)
+        request.send_header('Content-Type', 'image/png')
+        if content_length:
+            request.send_header('Content-Length', str(len(body)))
+        else:
+            request.send_header('Connection', 'close')
+            request.close_connection = True
+        request.end_headers()
+        request.wfile.write(body)
+    return handler
+
+
+def test_fetch_decodes_image_and_reuses_connection(server):
+    image = png_bytes(16, 12)
+    server.routes['/a.png'] = send_body(image)
+    server.routes['/b.png'] = send_body(image)
+    fetcher = ImageFetcher(allow_private=True)
+
+    first = fetcher.fetch(server.url + '/a.png')
+    second = fetcher.fetch(server.url + '/b.png', decode=False)
+
+    assert first.image.size == (16, 12)
+    assert second.data == image
+    assert first.digest == second.digest
+    assert server.connections == 1
+
+
+@pytest.mark.parametrize('content_length', [True, False])
+def test_oversized_body_is_rejected(server, content_length):
+    server.routes['/big.png'] = send_body(png_bytes(64, 64) + b'\0' * 20000, content_length)
+    fetcher = ImageFetcher(allow_private=True, max_bytes=4096)
+
+    with pytest.raises(IngestError) as error:
+        fetcher.fetch(server.url + '/big.png')
+    assert error.value.status == 413
+
+
+def test_slow_body_is_cut_at_total_timeout(server):
+    def trickle(request):
+        request.send_response(200)
+        request.send_header('Content-Length', '4096')
+        request.end_headers()
+        request.wfile.write(png_bytes()[:16])
+        for _ in range(4080):
+            request.wfile.write(b'\0')
+            request.wfile.flush()
+            time.sleep(0.001)
+
+    server.routes['/slow.png'] = trickle
+    fetcher = ImageFetcher(allow_private=True, total_timeout=1.0)
+
+    started = time.perf_counter()
+    with pytest.raises(IngestError) as error:
+        fetcher.fetch(server.url + '/slow.png')
+    assert error.value.status == 504
+    assert time.perf_counter() - started < 2.0
+
+
+def test_redirect_to_private_address_is_rechecked(server, monkeypatch):
+    def redirect(request):
+        request.send_response(302)
+        request.send_header('Location', 'http://169.254.169.254/latest/meta-data')
+        request.send_header('Content-Length', '0')
+        request.end_headers()
+
+    server.routes['/redirect'] = redirect
+    checked = []
+    check_url = fetch.check_url
+
+    def check_public_stand_in(url, allow_private=False):
+        # Le serveur local tient lieu d'hôte public; les autres URLs sont vérifiées normalement
+        checked.append(url)
+        if url.startswith(server.url):
+            return '127.0.0.1'
+        return check_url(url, allow_private)
+
+    monkeypatch.setattr(fetch, 'check_url', check_public_stand_in)
+    fetcher = ImageFetcher(allow_private=False)
+
+    with pytest.raises(IngestError) as error:
+        fetcher.fetch(server.url + '/redirect')
+    assert error.value.status == 400
+    assert checked == [server.url + '/redirect', 'http://169.254.169.254/latest/meta-data']
+    assert server.requests == ['/redirect']
+
+
+def test_check_url_rejects_private_addresses():
+    for url in ('http://127.0.0.1/a.png', 'http://169.254.169.254/', 'http://10.0.0.1/', 'ftp://example.com/a'):
+        with pytest.raises(IngestError):
+            fetch.check_url(url, allow_private=False)
+    assert fetch.check_url('http://8.8.8.8/a.png', allow_private=False) == '8.8.8.8'
@@ -0,0 +1,71 @@
+"""Ingestion des images (api/ingest.py) : analyse des en-têtes et rejet précoce"""
+
+import base64
+import struct
+
+import pytest
+
+from conftest import png_bytes
+from ingest import IngestError, ImageIngestor, ingest_chunks, iter_base64, sniff_image_header
+
+
+def chunks(data, size=16):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def png_header(width, height):
+    ihdr = struct.pack('>II', width, height) + b'\x08\x02\0\0\0'
+    return b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + ihdr
+
+
+def test_sniff_reads_format_and_dimensions():
+    assert sniff_image_header(png_bytes(30, 20)[:32]) == ('PNG', 30, 20)
+    assert sniff_image_header(b'GIF89a' + struct.pack('<HH', 7, 9) + b'\0' * 22) == ('GIF', 7, 9)
+    assert sniff_image_header(b'\x89PNG\r\n\x1a\n') == ('PNG', None, None)
+    assert sniff_image_header(b'%PDF-1.7\n' + b'\0' * 32) is None
+
+
+def test_non_image_is_rejected_from_first_bytes():
+    ingestor = ImageIngestor()
+    with pytest.raises(IngestError) as error:
+        ingestor.feed(b'<html><body>not an image</body></html>')
+    assert error.value.status == 415
+    assert ingestor.nbytes < 64
+
+
+def test_oversized_dimensions_are_rejected_from_header():
+    ingestor = ImageIngestor()
+    with pytest.raises(IngestError) as error:
+        # En-tête seul : le reste du fichier n'est jamais lu
+        ingestor.feed(png_header(50000, 50000) + b'\0' * 4)
+    assert error.value.status == 413
+
+
+def test_oversized_file_is_rejected():
+    with pytest.raises(IngestError) as error:
+        ingest_chunks(chunks(png_bytes(64, 64) + b'\0' * 4096, 512), max_bytes=1024)
+    assert error.value.status == 413
+
+
+@pytest.mark.parametrize('decode', [True, False])
+def test_truncated_file_is_rejected(decode):
+    truncated = png_bytes(64, 64)[:20]
+    with pytest.raises(IngestError) as error:
+        ingest_chunks([truncated], decode=decode)
+    assert error.value.status == 400
+
+
+def test_empty_body_is_rejected():
+    with pytest.raises(IngestError) as error:
+        ingest_chunks([])
+    assert error.value.status == 400
+
+
+def test_chunked_and_base64_ingestion_give_same_digest():
+    image = png_bytes(24, 16)
+    raw = ingest_chunks(chunks(image, 7))
+    encoded = ingest_chunks(iter_base64('data:image/png;base64,' + base64.b64encode(image).decode()))
+
+    assert raw.image.size == (24, 16)
+    assert raw.format == 'PNG'
+    assert raw.digest == encoded.digest
@@ -0,0 +1,105 @@
+"""Stockage des jobs (api/jobs.py) : réclamation, bail, expiration"""
+
+import threading
+import time
+
+import pytest
+
+from jobs import JobRunner, JobStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'jobs.sqlite3')
+
+
+def create(store, count=2):
+    return store.create_job([(f'{i}.png', b'image') for i in range(count)], 'gear', 0.25)
+
+
+def test_concurrent_claims_take_each_job_once(db_path):
+    stores = [JobStore(db_path) for _ in range(4)]
+    job_ids = {create(stores[0]) for _ in range(20)}
+    claimed = []
+    lock = threading.Lock()
+
+    def claim_all(store):
+        while True:
+            job = store.claim_next_job()
+            if job is None:
+                return
+            with lock:
+                claimed.append(job['job_id'])
+
+    threads = [threading.Thread(target=claim_all, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(job_ids)
+
+
+def test_only_finished_jobs_expire(db_path):
+    store = JobStore(db_path, ttl_seconds=1)
+    finished, running, queued = create(store), create(store), create(store)
+    assert store.claim_next_job()['job_id'] == finished
+    assert store.claim_next_job()['job_id'] == running
+    store.finish_job(finished)
+    later = time.time() + 3600
+
+    assert store.evict_expired(later) == 1
+    assert store.get_job(finished) is None
+    assert store.get_job(running)['status'] == 'running'
+    assert store.get_job(running)['expires_at'] is None
+    assert store.get_job(queued)['status'] == 'queued'
+
+
+def test_requeue_takes_only_expired_leases(db_path):
+    live = JobStore(db_path, lease_seconds=300)
+    stopped = JobStore(db_path, lease_seconds=60)
+    live_job, stopped_job = create(live), create(live)
+    assert live.claim_next_job()['job_id'] == live_job
+    assert stopped.claim_next_job()['job_id'] == stopped_job
+
+    # Redémarrage : rien n'a expiré, aucun job n'est repris
+    assert JobStore(db_path).requeue_interrupted() == 0
+    # Le processus `stopped` ne renouvelle plus son bail
+    assert live.renew_lease(live_job)
+    assert live.requeue_interrupted(now=time.time() + 90) == 1
+    assert live.get_job(stopped_job)['status'] == 'queued'
+    assert live.get_job(live_job)['status'] == 'running'
+    assert not stopped.renew_lease(stopped_job)
+
+
+def test_reprocessed_items_are_counted_once(db_path):
+    first = JobStore(db_path, lease_seconds=60)
+    second = JobStore(db_path, lease_seconds=60)
+    job_id = create(first)
+    first.claim_next_job()
+    first.requeue_interrupted(now=time.time() + 90)
+    second.claim_next_job()
+
+    for store in (first, second):
+        store.store_results(job_id, [(0, {'fen': '8/8/8/8/8/8/8/8'}), (1, {'fen': '8/8/8/8/8/8/8/8'})])
+    assert not first.finish_job(job_id)
+    assert second.finish_job(job_id)
+
+    job = second.get_job(job_id)
+    assert job['status'] == 'done'
+    assert job['progress'] == {'done': 2, 'total': 2, 'percent': 100.0}
+
+
+def test_runner_processes_queued_job(db_path):
+    store = JobStore(db_path)
+    job_id = create(store, count=3)
+    runner = JobRunner(store, lambda images, model, conf, priority: [{'n': len(data)} for data in images],
+                       batch_size=2, poll_interval=0.05)
+    runner.start()
+    deadline = time.time() + 5
+    while store.get_job(job_id)['status'] != 'done' and time.time() < deadline:
+        time.sleep(0.02)
+
+    job = store.get_job(job_id)
+    assert job['status'] == 'done'
+    assert [entry['result'] for entry in job['results']] == [{'n': 5}] * 3